@@ -0,0 +1,336 @@
+"""
+Append-only action logs, and replaying them. While a log is recording, every action applied
+to the game (playing a card, attacking, blocking, passing, and the debug draws and switches)
+is appended to it as a few bytes. Together with the position the log started from and the
+seed of the game's random number generator, that's enough to play the game again exactly.
+
+Replays are silent and deterministic. Replayer keeps a snapshot of the game every
+checkpointInterval actions, so seeking to any action only replays from the checkpoint before
+it, instead of from the start of the game.
+
+Searches try moves on the game they're given, so the agents stop the log from recording
+while they search.
+
+Format, version 1 (all numbers little endian):
+    header - b"LORA", uint16 version, uint64 seed, uint32 length of the start position, then
+        the start position as a savestate.py save (which holds the order of both decks)
+    actions - one record per action, appended to the end of the file: uint8 action code,
+        uint8 argument count, then one uint8 per argument. A play without a target leaves
+        the target out, attacks and blocks store their index lists. Negative indices are
+        stored as the index from the start they stand for
+
+ActionLogError
+Raised for data which isn't an action log this version can read
+
+ActionLog
+The log of one game
+
+Replayer
+Plays a log back, and seeks to any action
+
+Usage:
+    python actionlog.py game.log ...        replays logs and reports the replay speed
+"""
+import argparse
+import random
+import struct
+import time
+import game
+import savestate
+import simulator
+
+MAGIC = b"LORA"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHQI")
+RECORD = struct.Struct("<BB")
+
+# Action codes
+PLAY = 0
+ATTACK = 1
+DEFEND = 2
+PASS = 3
+DRAW = 4
+SWITCH = 5
+
+ACTION_CODES = {
+    game.Game.play_card: PLAY,
+    game.Game.prepare_attack: ATTACK,
+    game.Game.prepare_defense: DEFEND,
+    game.Game.pass_turn: PASS,
+    game.Game.draw_card: DRAW,
+    game.Game.switch_active_player: SWITCH,
+}
+ACTION_FUNCTIONS = dict((code, function) for function, code in ACTION_CODES.items())
+
+class ActionLogError(ValueError):
+    pass
+
+class ActionLog:
+    """
+    ActionLog
+
+    Member variables:
+        seed - The seed of the game's random number generator when the log started
+        start - The position the log started from, as a savestate save
+        records - The encoded actions. Only ever appended to
+        count - The number of actions
+        written - How many bytes of the records have been written out by flush()
+    """
+    def __init__(self, start, seed):
+        self.seed = seed
+        self.start = start
+        self.records = bytearray()
+        self.count = 0
+        self.written = 0
+
+    def append(self, gameObject, function, arguments):
+        """
+        Encodes one action. Called by Game.record_action, before the action changes anything.
+        Negative indices are stored as the index they stand for, so they fit in a byte.
+        Nothing is appended if the action can't be encoded
+
+        Raises:
+            IndexError - An index is out of range of its zone, as the action would raise
+            ActionLogError - A value doesn't fit in a byte
+        """
+        code = ACTION_CODES[function]
+        player = gameObject.players[gameObject.activePlayer]
+        if (code == PLAY):
+            cardNumber = normalize_index(arguments[0], len(player.hand.list))
+            values = [cardNumber]
+            target = arguments[1]
+            if (target != None):
+                if (target < 0):
+                    target += len(player.hand.list[cardNumber].get_targets())
+                    if (target < 0):
+                        raise IndexError("target index out of range")
+                values.append(target)
+        elif (code == ATTACK):
+            values = []
+            # Only the attacking player can attack, for anyone else the action does nothing
+            if (gameObject.activePlayer == gameObject.attackingPlayer):
+                benchSize = len(player.bench.list)
+                values = [normalize_index(index, benchSize) for index in arguments[0]]
+        elif (code == DEFEND):
+            # Bench indices and frontline lanes, alternating
+            benchSize = len(gameObject.players[gameObject.defendingPlayer].bench.list)
+            sizes = (benchSize, gameObject.numAttackers)
+            values = [normalize_index(arguments[0][i], sizes[i % 2]) \
+                      for i in range(len(arguments[0]))]
+        else:
+            values = arguments
+        try:
+            record = RECORD.pack(code, len(values)) + bytes(values)
+        except (ValueError, struct.error):
+            raise ActionLogError("action %s%r can't be logged" % (function.__name__, \
+                                                                  tuple(arguments)))
+        self.records += record
+        self.count += 1
+
+    def header(self):
+        return HEADER.pack(MAGIC, VERSION, self.seed, len(self.start)) + self.start
+
+    def to_bytes(self):
+        return self.header() + bytes(self.records)
+
+    def save(self, fileName):
+        with open(fileName, "wb") as outFile:
+            outFile.write(self.to_bytes())
+
+    def flush(self, outFile):
+        """
+        Writes out everything which hasn't been written yet, so a file can be kept up to date
+        as the game goes on. The first flush writes the header too
+        """
+        if (self.written == 0):
+            outFile.write(self.header())
+        outFile.write(self.records[self.written:])
+        self.written = len(self.records)
+
+    def decode(self):
+        """
+        Returns the actions as a list of (function, arguments) tuples, so an action is
+        replayed with function(gameObject, *arguments)
+        """
+        actions = []
+        records = self.records
+        offset = 0
+        while (offset < len(records)):
+            try:
+                code, count = RECORD.unpack_from(records, offset)
+            except struct.error:
+                raise ActionLogError("corrupt action record")
+            offset += RECORD.size
+            values = list(records[offset:offset + count])
+            offset += count
+            if (len(values) != count or code not in ACTION_FUNCTIONS):
+                raise ActionLogError("corrupt action record")
+            if (code == ATTACK or code == DEFEND):
+                arguments = (values,)
+            else:
+                arguments = tuple(values)
+            actions.append((ACTION_FUNCTIONS[code], arguments))
+        return actions
+
+    pass
+
+def normalize_index(index, size):
+    """
+    The non-negative index of a list index, counting negative ones from the end like a list
+    """
+    if (index < 0):
+        index += size
+    if (index < 0 or index >= size):
+        raise IndexError("action index out of range")
+    return index
+
+def record_game(gameObject, seed = None):
+    """
+    Starts recording a game. The game gets a random number generator with the log's seed, so
+    a replay can seed it the same way
+
+    Parameters:
+        gameObject - The game to record, in the position the log starts from
+        seed - The seed, a random one if it's left out
+
+    Returns:
+        The ActionLog, which is also gameObject.actionLog until stop_recording()
+    """
+    if (seed == None):
+        seed = random.getrandbits(64)
+    gameObject.generator = random.Random(seed)
+    gameObject.actionLog = ActionLog(savestate.save_game(gameObject), seed)
+    return gameObject.actionLog
+
+def stop_recording(gameObject):
+    actionLog = gameObject.actionLog
+    gameObject.actionLog = None
+    return actionLog
+
+def load_log(data):
+    """
+    Reads an ActionLog from the bytes of a log file
+    """
+    if (len(data) < HEADER.size):
+        raise ActionLogError("not an action log")
+    magic, version, seed, startLength = HEADER.unpack_from(data, 0)
+    if (magic != MAGIC):
+        raise ActionLogError("not an action log")
+    if (version != VERSION):
+        raise ActionLogError("unsupported action log version %d" % version)
+    if (len(data) < HEADER.size + startLength):
+        raise ActionLogError("truncated action log")
+    start = bytes(data[HEADER.size:HEADER.size + startLength])
+    actionLog = ActionLog(start, seed)
+    actionLog.records = bytearray(data[HEADER.size + startLength:])
+    actionLog.written = len(actionLog.records)
+    offset = 0
+    while (offset < len(actionLog.records)):
+        if (offset + RECORD.size > len(actionLog.records)):
+            raise ActionLogError("corrupt action record")
+        offset += RECORD.size + actionLog.records[offset + 1]
+        actionLog.count += 1
+    return actionLog
+
+def read_log(fileName):
+    with open(fileName, "rb") as inFile:
+        return load_log(inFile.read())
+
+class Replayer:
+    """
+    Replayer
+    Replays a log on a game of its own. The position is the number of actions applied so far.
+
+    Member variables:
+        actionLog - The log being replayed
+        actions - The decoded actions
+        gameObject - The replayed game
+        position - How many actions have been applied
+        checkpointInterval - The number of actions between checkpoints
+        checkpoints - checkpoints[i] is (snapshot, generator state, finished) at position
+            i * checkpointInterval, for every checkpoint reached so far
+        finished - Whether the game ended by a player drawing from an empty deck
+    """
+    def __init__(self, actionLog, cardMap, checkpointInterval = 64):
+        self.actionLog = actionLog
+        self.actions = actionLog.decode()
+        self.gameObject = savestate.new_game(actionLog.start, cardMap)
+        self.gameObject.generator = random.Random(actionLog.seed)
+        self.position = 0
+        self.checkpointInterval = checkpointInterval
+        self.checkpoints = []
+        self.finished = False
+        self.save_checkpoint()
+
+    def save_checkpoint(self):
+        gameObject = self.gameObject
+        self.checkpoints.append((gameObject.snapshot(), gameObject.generator.getstate(), \
+                                 self.finished))
+
+    def step(self):
+        """
+        Applies the next action
+        """
+        gameObject = self.gameObject
+        function, arguments = self.actions[self.position]
+        try:
+            function(gameObject, *arguments)
+        except IndexError:
+            # Drawing from an empty deck ends the game, the same as agent.apply_move
+            if (all(len(player.deck) != 0 for player in gameObject.players)):
+                raise
+            self.finished = True
+        self.position += 1
+        if (self.position == len(self.checkpoints) * self.checkpointInterval):
+            self.save_checkpoint()
+
+    def replay(self):
+        """
+        Applies every action left, and returns the game
+        """
+        while (self.position < len(self.actions)):
+            self.step()
+        return self.gameObject
+
+    def seek(self, position):
+        """
+        Puts the game in the state after the first position actions, replaying from the last
+        checkpoint before it if that's closer than the current position
+
+        Returns:
+            The game
+        """
+        if (position < 0 or position > len(self.actions)):
+            raise IndexError("action index out of range")
+        checkpoint = min(position // self.checkpointInterval, len(self.checkpoints) - 1)
+        checkpointPosition = checkpoint * self.checkpointInterval
+        if (position < self.position or checkpointPosition > self.position):
+            snapshot, generatorState, self.finished = self.checkpoints[checkpoint]
+            self.gameObject.restore(snapshot)
+            self.gameObject.generator.setstate(generatorState)
+            self.position = checkpointPosition
+        while (self.position < position):
+            self.step()
+        return self.gameObject
+
+    pass
+
+def main():
+    parser = argparse.ArgumentParser(description = "Replays action logs")
+    parser.add_argument("logs", nargs = "+", help = "action log files")
+    arguments = parser.parse_args()
+
+    sim = simulator.Simulator()
+    start = time.perf_counter()
+    actionCount = 0
+    for fileName in arguments.logs:
+        replayer = Replayer(read_log(fileName), sim.cardMap)
+        replayer.replay()
+        actionCount += len(replayer.actions)
+    elapsed = time.perf_counter() - start
+    print("%d games, %d actions in %.2f s (%.0f actions/sec)" % \
+          (len(arguments.logs), actionCount, elapsed, actionCount / max(elapsed, 1e-9)))
+
+if __name__ == "__main__":
+    main()
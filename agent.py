@@ -0,0 +1,215 @@
+"""
+Building blocks shared by the game playing agents: the moves an agent can choose from, playing
+a move and telling when the game is over, evaluating a position, and timing decisions.
+
+Moves
+A move is a (commandName, function, arguments) tuple, the same as a command of a
+simulator.Script, so playing a move is function(gameObject, *arguments). The move list covers
+every card play (on every target) from Game.list_all_moves, passing, and a small set of attack
+and block declarations, since listing every subset of the bench isn't practical. One of the
+blocks is the best block by blocking.BlockSolver.
+
+Game over
+Game doesn't end games by itself, so agents use the same rules as batch.BatchedGame: a player
+whose nexus drops to 0 health loses, and so does a player who has to draw from an empty deck.
+If both happen at once, it's a tie.
+
+SearchStats
+Latency of every decision and the number of rollouts (or nodes), for agents which have to
+answer in real time
+"""
+import math
+import blocking
+import game
+
+TIE = -1
+
+BLOCK_SOLVER = blocking.BlockSolver()
+
+def list_moves(gameObject):
+    """
+    Lists the moves the acting player can choose from
+
+    Returns:
+        A list of (commandName, function, arguments) tuples
+    """
+    if (gameObject.awaiting_defense()):
+        return list_defenses(gameObject)
+
+    moves = [("pass", game.Game.pass_turn, ())]
+    decisionSpace = gameObject.list_all_moves()
+    hand = gameObject.players[gameObject.activePlayer].hand.list
+    playableCards = decisionSpace["playable cards"]
+    for cardNumber in range(len(playableCards)):
+        if (playableCards[cardNumber] == False):
+            continue
+        card = hand[cardNumber]
+        if (card.playEffect == None or card.count_playable_options() == 0):
+            moves.append(("play", game.Game.play_card, (cardNumber,)))
+            continue
+        # Same as main.py, only the first target of an option is used
+        for option in card.iter_playable_options():
+            moves.append(("play", game.Game.play_card, (cardNumber, option[0])))
+
+    player = gameObject.players[gameObject.activePlayer]
+    benchSize = len(player.bench.list)
+    if (gameObject.activePlayer == gameObject.attackingPlayer and gameObject.attackToken and \
+        gameObject.attackPhase == False and benchSize > 0):
+        moves.append(("attack", game.Game.prepare_attack, (list(range(benchSize)),)))
+        if (benchSize > 1):
+            for cardNumber in range(benchSize):
+                moves.append(("attack", game.Game.prepare_attack, ([cardNumber],)))
+    return moves
+
+def list_defenses(gameObject):
+    """
+    Lists the block declarations for the defender: no blocks, the solver's block, a greedy
+    block of every lane, and every single block which kills the attacker or survives it
+    """
+    attackers = gameObject.players[gameObject.attackingPlayer].frontline.list
+    bench = gameObject.players[gameObject.defendingPlayer].bench.list
+    moves = [("defend", game.Game.prepare_defense, ([],))]
+    if (len(bench) == 0):
+        return moves
+
+    solved = BLOCK_SOLVER.solve_game(gameObject)
+    if (len(solved) != 0):
+        moves.append(("defend", game.Game.prepare_defense, (solved,)))
+
+    # Greedy: the sturdiest unused blocker goes to each lane in turn
+    blockers = sorted(range(len(bench)), key = lambda i: bench[i].defense, reverse = True)
+    greedy = []
+    for lane in range(min(len(attackers), len(blockers))):
+        greedy += [blockers[lane], lane]
+    if (greedy != solved):
+        moves.append(("defend", game.Game.prepare_defense, (greedy,)))
+
+    for lane in range(len(attackers)):
+        attacker = attackers[lane]
+        if (attacker == None):
+            continue
+        for cardNumber in range(len(bench)):
+            blocker = bench[cardNumber]
+            if (blocker.attack >= attacker.defense or blocker.defense > attacker.attack):
+                moves.append(("defend", game.Game.prepare_defense, ([cardNumber, lane],)))
+    return moves
+
+def game_winner(gameObject):
+    """
+    Returns the winning player, TIE, or None while the game goes on
+    """
+    healths = [player.health for player in gameObject.players]
+    if (healths[0] <= 0 and healths[1] <= 0):
+        return TIE
+    if (healths[0] <= 0):
+        return 1
+    if (healths[1] <= 0):
+        return 0
+    return None
+
+def apply_move(gameObject, move):
+    """
+    Plays a move, and returns the result of the game: the winner, TIE, or None if the game
+    goes on. A new turn with an empty deck ends the game instead of raising
+    """
+    commandName, function, arguments = move
+    deckSizes = [len(player.deck) for player in gameObject.players]
+    try:
+        function(gameObject, *arguments)
+    except IndexError:
+        # Both players draw at the start of a turn, player 0 first
+        emptyDecks = [i for i in range(2) if deckSizes[i] == 0]
+        if (len(emptyDecks) == 0):
+            raise
+        if (len(emptyDecks) == 2):
+            return TIE
+        return 1 - emptyDecks[0]
+    return game_winner(gameObject)
+
+def evaluate(gameObject, playerNumber):
+    """
+    A heuristic value of the position for one player, between -1 (lost) and 1 (won). It reads
+    the nexus health, the stats on the board and the cards in hand, in that order of weight
+
+    Parameters:
+        gameObject - The game to evaluate
+        playerNumber - The player whose point of view is used
+
+    Returns:
+        The value, which is symmetric: evaluate(g, 0) == -evaluate(g, 1)
+    """
+    me = gameObject.players[playerNumber]
+    opponent = gameObject.players[1 - playerNumber]
+    health = (me.health - opponent.health) / game.Player.MAX_HP
+    board = 0
+    for card in me.bench.list:
+        board += card.attack + card.defense
+    for card in opponent.bench.list:
+        board -= card.attack + card.defense
+    hand = len(me.hand.list) - len(opponent.hand.list)
+    value = 0.5 * health + 0.3 * math.tanh(board / 10) + 0.2 * math.tanh(hand / 5)
+    return max(-1.0, min(1.0, value))
+
+def result_value(winner, playerNumber):
+    """
+    The value of a finished game for one player, on the same scale as evaluate
+    """
+    if (winner == TIE):
+        return 0.0
+    if (winner == playerNumber):
+        return 1.0
+    return -1.0
+
+class SearchStats:
+    """
+    SearchStats
+    Timings of the decisions made by an agent
+
+    Member variables:
+        latencies - The wall clock time of every decision, in seconds
+        rollouts - The total rollouts (or searched nodes) over all decisions
+    """
+    def __init__(self):
+        self.latencies = []
+        self.rollouts = 0
+
+    def record(self, latency, rollouts):
+        self.latencies.append(latency)
+        self.rollouts += rollouts
+
+    def decisions(self):
+        return len(self.latencies)
+
+    def mean_latency(self):
+        if (len(self.latencies) == 0):
+            return 0.0
+        return sum(self.latencies) / len(self.latencies)
+
+    def max_latency(self):
+        if (len(self.latencies) == 0):
+            return 0.0
+        return max(self.latencies)
+
+    def percentile_latency(self, percent):
+        """
+        Returns the latency which percent% of the decisions were faster than
+        """
+        if (len(self.latencies) == 0):
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+    def rollouts_per_second(self):
+        total = sum(self.latencies)
+        if (total == 0):
+            return 0.0
+        return self.rollouts / total
+
+    def format(self):
+        return "%d decisions, latency mean %.1f ms, p99 %.1f ms, max %.1f ms, " \
+               "%.0f rollouts/sec" % \
+               (self.decisions(), self.mean_latency() * 1e3, self.percentile_latency(99) * 1e3, \
+                self.max_latency() * 1e3, self.rollouts_per_second())
+
+    pass
@@ -0,0 +1,262 @@
+"""
+Alpha-beta search for the deterministic parts of the game: which cards attack, how to block,
+and in which order to cast burst spells. The search is a negamax over the moves from a move
+generator, rolled back with the game's undo log, so nothing is copied.
+
+The acting player doesn't always alternate (a burst spell keeps the turn, and the defender
+answers an attack), so a child's value is only negated when the acting player changes.
+
+Iterative deepening
+The search goes one ply deeper at a time until the deadline or the depth limit. Each pass
+starts with the best move of the pass before, and the transposition table holds the best move
+of every position searched so far, so the deeper passes cut off early. When the deadline hits
+in the middle of a pass, the best move of the last finished pass is returned.
+
+Move ordering
+The transposition table move goes first, then the rest by the history heuristic: moves which
+caused cutoffs before, anywhere in the tree, are tried earlier.
+
+AlphaBetaAgent
+The searcher. The evaluation function, the move generator and the position key are all
+pluggable
+
+Usage:
+    python alphabeta.py testing/multiple_burst     searches the position at the end of a script
+"""
+import argparse
+import itertools
+import time
+import agent
+import game
+import simulator
+
+# Worth more than any evaluation, so a forced win is always preferred
+WIN = 2.0
+
+# Transposition table bounds
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+class SearchTimeout(Exception):
+    pass
+
+def combat_moves(gameObject, maxAttackers = 6):
+    """
+    A move generator for choosing attackers: agent.list_moves, but with every subset of the
+    bench as an attack, as long as the bench isn't bigger than maxAttackers
+    """
+    moves = agent.list_moves(gameObject)
+    player = gameObject.players[gameObject.activePlayer]
+    benchSize = len(player.bench.list)
+    attacks = [move for move in moves if move[0] == "attack"]
+    if (len(attacks) == 0 or benchSize > maxAttackers):
+        return moves
+
+    moves = [move for move in moves if move[0] != "attack"]
+    for size in range(benchSize, 0, -1):
+        for attackers in itertools.combinations(range(benchSize), size):
+            moves.append(("attack", game.Game.prepare_attack, (list(attackers),)))
+    return moves
+
+def position_key(gameObject):
+    """
+    The default transposition table key. A snapshot holds the whole mutable state, and is
+    made of tuples, so it can be hashed as it is
+    """
+    return gameObject.snapshot()
+
+def hash_key(gameObject):
+    """
+    A cheaper transposition table key: the incremental state hash. The game must have hashing
+    enabled (Game.enable_hashing)
+    """
+    return gameObject.state_hash()
+
+def move_key(move):
+    """
+    A hashable name of a move, for the history table
+    """
+    commandName, function, arguments = move
+    return (commandName, repr(arguments))
+
+class AlphaBetaAgent:
+    """
+    AlphaBetaAgent
+
+    Member variables:
+        maxDepth - The deepest pass of iterative deepening, in plies
+        timeLimit - Seconds per decision, None for no deadline
+        evaluation - evaluation(gameObject, playerNumber) -> value from that player's point of
+            view, between -1 and 1. Defaults to agent.evaluate
+        moveGenerator - moveGenerator(gameObject) -> moves. Defaults to agent.list_moves
+        keyFunction - keyFunction(gameObject) -> hashable key of the position
+        table - The transposition table: key -> (depth, value, bound, move index)
+        history - The history heuristic scores: move key -> score
+        deadline - The perf_counter() time the current search must stop at
+        nodes - Positions visited by the current search
+        stats - agent.SearchStats of every decision, with nodes counted as rollouts
+        completedDepth - The depth of the last finished pass of the last search
+    """
+    def __init__(self, maxDepth = 8, timeLimit = 0.09, evaluation = agent.evaluate, \
+                 moveGenerator = agent.list_moves, keyFunction = position_key):
+        self.maxDepth = maxDepth
+        self.timeLimit = timeLimit
+        self.evaluation = evaluation
+        self.moveGenerator = moveGenerator
+        self.keyFunction = keyFunction
+        self.table = dict()
+        self.history = dict()
+        self.deadline = None
+        self.nodes = 0
+        self.stats = agent.SearchStats()
+        self.completedDepth = 0
+
+    def choose_move(self, gameObject):
+        """
+        Searches the position and returns the best move found before the deadline
+        """
+        start = time.perf_counter()
+        move, value = self.search(gameObject, start)
+        self.stats.record(time.perf_counter() - start, self.nodes)
+        return move
+
+    def play_move(self, gameObject):
+        return agent.apply_move(gameObject, self.choose_move(gameObject))
+
+    def search(self, gameObject, start = None):
+        """
+        Iterative deepening from the current position. The game is left as it was
+
+        Returns:
+            (move, value), the value is from the acting player's point of view
+        """
+        if (start == None):
+            start = time.perf_counter()
+        self.deadline = None
+        if (self.timeLimit != None):
+            self.deadline = start + self.timeLimit
+        self.nodes = 0
+        self.completedDepth = 0
+        # Values depend on the depth they were searched to, so the table is per decision
+        self.table = dict()
+
+        undoWasEnabled = gameObject.undoLog != None
+        if (undoWasEnabled == False):
+            gameObject.enable_undo()
+        # The moves tried while searching aren't part of the game, so they aren't logged
+        actionLog = gameObject.actionLog
+        gameObject.actionLog = None
+        marker = gameObject.mark()
+        moves = self.moveGenerator(gameObject)
+        bestMove, bestValue = moves[0], None
+        try:
+            for depth in range(1, self.maxDepth + 1):
+                value, moveIndex = self.negamax(gameObject, depth, -WIN - 1, WIN + 1)
+                bestMove, bestValue = moves[moveIndex], value
+                self.completedDepth = depth
+                if (abs(value) >= WIN):
+                    break
+        except SearchTimeout:
+            pass
+        finally:
+            gameObject.undo(marker)
+            gameObject.actionLog = actionLog
+            if (undoWasEnabled == False):
+                gameObject.disable_undo()
+        return bestMove, bestValue
+
+    def negamax(self, gameObject, depth, alpha, beta):
+        """
+        Returns (value, best move index) of the current position for the acting player
+        """
+        self.nodes += 1
+        if (self.deadline != None and time.perf_counter() >= self.deadline):
+            raise SearchTimeout()
+
+        player = gameObject.acting_player()
+        key = self.keyFunction(gameObject)
+        tableMove = None
+        entry = self.table.get(key)
+        if (entry != None):
+            entryDepth, entryValue, bound, tableMove = entry
+            if (entryDepth >= depth):
+                if (bound == EXACT or \
+                    (bound == LOWER and entryValue >= beta) or \
+                    (bound == UPPER and entryValue <= alpha)):
+                    return entryValue, tableMove
+
+        if (depth == 0):
+            return self.evaluation(gameObject, player), None
+
+        moves = self.moveGenerator(gameObject)
+        order = self.order_moves(moves, tableMove)
+        originalAlpha = alpha
+        bestValue = -WIN - 1
+        bestIndex = order[0]
+        for moveIndex in order:
+            move = moves[moveIndex]
+            marker = gameObject.mark()
+            winner = agent.apply_move(gameObject, move)
+            if (winner != None):
+                value = agent.result_value(winner, player) * WIN
+            elif (gameObject.acting_player() == player):
+                value = self.negamax(gameObject, depth - 1, alpha, beta)[0]
+            else:
+                value = -self.negamax(gameObject, depth - 1, -beta, -alpha)[0]
+            gameObject.undo(marker)
+
+            if (value > bestValue):
+                bestValue = value
+                bestIndex = moveIndex
+            if (value > alpha):
+                alpha = value
+            if (alpha >= beta):
+                historyKey = move_key(move)
+                self.history[historyKey] = self.history.get(historyKey, 0) + depth * depth
+                break
+
+        bound = EXACT
+        if (bestValue <= originalAlpha):
+            bound = UPPER
+        elif (bestValue >= beta):
+            bound = LOWER
+        self.table[key] = (depth, bestValue, bound, bestIndex)
+        return bestValue, bestIndex
+
+    def order_moves(self, moves, tableMove):
+        """
+        Returns the move indices in the order to search them
+        """
+        history = self.history
+        order = sorted(range(len(moves)), key = lambda i: -history.get(move_key(moves[i]), 0))
+        if (tableMove != None and tableMove < len(moves)):
+            order.remove(tableMove)
+            order.insert(0, tableMove)
+        return order
+
+    pass
+
+def main():
+    parser = argparse.ArgumentParser(description = "Alpha-beta search of a script position")
+    parser.add_argument("script", help = "command script, the position is where it ends")
+    parser.add_argument("-d", "--depth", type = int, default = 8)
+    parser.add_argument("-t", "--time", type = float, default = 0.09, \
+                        help = "seconds per decision")
+    parser.add_argument("--combat", action = "store_true", \
+                        help = "consider every subset of the bench as attackers")
+    arguments = parser.parse_args()
+
+    sim = simulator.Simulator()
+    gameObject = sim.run_script(simulator.parse_script(arguments.script))
+    moveGenerator = agent.list_moves
+    if (arguments.combat):
+        moveGenerator = combat_moves
+    searcher = AlphaBetaAgent(arguments.depth, arguments.time, moveGenerator = moveGenerator)
+    move = searcher.choose_move(gameObject)
+    print("best move: %s %s (depth %d, %d nodes)" % \
+          (move[0], move[2], searcher.completedDepth, searcher.nodes))
+    print(searcher.stats.format())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""
+Archives of many finished games in one file. Each game is kept as its action log and its
+outcome, packed into columnar chunks, with indexes by deck file, by card played and by
+winner. The archive is read through a memory map, so a query only touches the pages of the
+index and of the columns it needs, and never decodes the action logs. Like batch.py, this
+module needs NumPy, which the rest of the engine doesn't.
+
+Games are numbered in the order they were added. Queries return sorted arrays of game
+numbers, so they can be combined with np.intersect1d and np.union1d.
+
+Play events
+While a game is added it is replayed once, and every card play is written to the chunk as
+an event: the card, the player who played it, the turn and the action number. Turns are
+counted from the start of the log, starting at 1, and a new turn starts whenever the
+attacking player changes.
+
+Format, version 1 (all numbers little endian, every column starts on an 8 byte boundary):
+    header - b"LORC", uint16 version
+    chunks - up to chunkSize games each, one column after another:
+        winners int8, the winning player, TIE, or UNFINISHED
+        decks uint16 [games, 2], the deck of each player, by deck name index
+        seeds uint64, actionCounts uint32
+        logOffsets uint64 [games + 1], logData uint8, the action logs as actionlog.py saves
+        playOffsets uint32 [games + 1], the first event of each game, and the event
+            columns playCards uint16, playPlayers uint8, playTurns uint16, playActions uint32
+    indexes - for decks, cards played and winners, the offsets (uint64 [keys + 1]) and the
+        sorted game numbers (uint32) of every key
+    footer - JSON with the deck and card name tables and the offset, type and shape of every
+        column
+    trailer - uint64 footer offset, uint32 footer length, b"LORC"
+
+ArchiveError
+Raised for files which aren't an archive this version can read
+
+ArchiveWriter
+Adds games to a new archive
+
+Archive
+Reads and queries an archive
+
+Usage:
+    python archive.py games.lorc                           prints what's in an archive
+    python archive.py games.lorc --card "burst buff" --turn 1
+                                                           finds games by card, deck or winner
+"""
+import argparse
+import json
+import mmap
+import struct
+import numpy as np
+import actionlog
+import agent
+
+MAGIC = b"LORC"
+VERSION = 1
+
+HEADER = struct.Struct("<4sH")
+TRAILER = struct.Struct("<QI4s")
+ALIGNMENT = 8
+
+# The winner of a game which was archived before it ended
+UNFINISHED = -2
+# Keys of the winner index: player 0, player 1, TIE, UNFINISHED
+WINNERS = (0, 1, agent.TIE, UNFINISHED)
+
+class ArchiveError(ValueError):
+    pass
+
+def build_index(keys, games, keyCount):
+    """
+    Groups game numbers by key
+
+    Parameters:
+        keys - The key of every entry
+        games - The game number of every entry. Duplicate (key, game) entries are dropped
+        keyCount - The number of keys
+
+    Returns:
+        (offsets, games), where games[offsets[k]:offsets[k + 1]] are the sorted games of key k
+    """
+    keys = np.asarray(keys, dtype = np.int64)
+    games = np.asarray(games, dtype = np.int64)
+    pairs = np.unique(keys * (1 << 32) + games)
+    counts = np.bincount(pairs >> 32, minlength = keyCount)
+    offsets = np.zeros(keyCount + 1, dtype = np.uint64)
+    np.cumsum(counts, out = offsets[1:])
+    return offsets, (pairs & 0xFFFFFFFF).astype(np.uint32)
+
+class ArchiveWriter:
+    """
+    ArchiveWriter
+    Writes games to an archive as they're added. A chunk is written out every chunkSize games,
+    and the indexes and footer are written by close().
+
+    Member variables:
+        outFile - The archive file
+        cardMap - A filled card mapper, to replay the logs with
+        chunkSize - The number of games in each chunk
+        count - The number of games added
+        deckNames - Deck name -> index
+        cardNames - Card name -> index
+        chunks - The footer entry of every chunk written so far
+        pending - The columns of the chunk being filled, as lists
+        deckKeys, deckGames, cardKeys, cardGames, winnerKeys - The entries of the indexes
+    """
+    def __init__(self, fileName, cardMap, chunkSize = 4096):
+        self.outFile = open(fileName, "wb")
+        self.outFile.write(HEADER.pack(MAGIC, VERSION))
+        self.cardMap = cardMap
+        self.chunkSize = chunkSize
+        self.count = 0
+        self.deckNames = dict()
+        self.cardNames = dict()
+        self.chunks = []
+        self.pending = None
+        self.deckKeys = []
+        self.deckGames = []
+        self.cardKeys = []
+        self.cardGames = []
+        self.winnerKeys = []
+        self.start_chunk()
+
+    def start_chunk(self):
+        self.pending = dict((name, []) for name in ("winners", "decks", "seeds", \
+            "actionCounts", "logs", "playCounts", "playCards", "playPlayers", "playTurns", \
+            "playActions"))
+
+    def add_game(self, actionLog, decks, winner):
+        """
+        Adds a game, and replays it to find its card plays
+
+        Parameters:
+            actionLog - The game's ActionLog
+            decks - The deck file of each player
+            winner - The winning player, agent.TIE, or None for a game which hadn't ended
+
+        Returns:
+            The game number
+        """
+        if (winner == None):
+            winner = UNFINISHED
+        if (winner not in WINNERS):
+            raise ValueError("winner must be a player, agent.TIE or None")
+        gameNumber = self.count
+        pending = self.pending
+        pending["winners"].append(winner)
+        deckIndices = [self.deckNames.setdefault(deck, len(self.deckNames)) for deck in decks]
+        pending["decks"].append(deckIndices)
+        pending["seeds"].append(actionLog.seed)
+        pending["actionCounts"].append(actionLog.count)
+        pending["logs"].append(actionLog.to_bytes())
+        self.deckKeys += deckIndices
+        self.deckGames += [gameNumber, gameNumber]
+        self.winnerKeys.append(WINNERS.index(winner))
+
+        # No checkpoints, the log is only replayed once
+        replayer = actionlog.Replayer(actionLog, self.cardMap, actionLog.count + 1)
+        gameObject = replayer.gameObject
+        turn = 1
+        plays = 0
+        for position in range(len(replayer.actions)):
+            function, arguments = replayer.actions[position]
+            attackingPlayer = gameObject.attackingPlayer
+            if (actionlog.ACTION_CODES[function] == actionlog.PLAY):
+                playerNumber = gameObject.activePlayer
+                cardName = gameObject.players[playerNumber].hand.list[arguments[0]].name
+                cardIndex = self.cardNames.setdefault(cardName, len(self.cardNames))
+                pending["playCards"].append(cardIndex)
+                pending["playPlayers"].append(playerNumber)
+                pending["playTurns"].append(turn)
+                pending["playActions"].append(position)
+                self.cardKeys.append(cardIndex)
+                self.cardGames.append(gameNumber)
+                plays += 1
+            replayer.step()
+            if (gameObject.attackingPlayer != attackingPlayer):
+                turn += 1
+        pending["playCounts"].append(plays)
+
+        self.count += 1
+        if (len(pending["winners"]) == self.chunkSize):
+            self.write_chunk()
+        return gameNumber
+
+    def write_column(self, columns, name, values, dtype):
+        """
+        Writes an array at the next aligned offset, and adds it to a footer entry
+        """
+        values = np.ascontiguousarray(values, dtype = dtype)
+        offset = self.outFile.tell()
+        padding = -offset % ALIGNMENT
+        self.outFile.write(b"\0" * padding)
+        columns[name] = [offset + padding, values.dtype.str, list(values.shape)]
+        self.outFile.write(values.tobytes())
+
+    def write_chunk(self):
+        pending = self.pending
+        games = len(pending["winners"])
+        if (games == 0):
+            return
+        columns = dict()
+        self.write_column(columns, "winners", pending["winners"], "<i1")
+        self.write_column(columns, "decks", np.reshape(pending["decks"], (games, 2)), "<u2")
+        self.write_column(columns, "seeds", pending["seeds"], "<u8")
+        self.write_column(columns, "actionCounts", pending["actionCounts"], "<u4")
+        logOffsets = np.zeros(games + 1, dtype = np.uint64)
+        np.cumsum([len(log) for log in pending["logs"]], out = logOffsets[1:])
+        self.write_column(columns, "logOffsets", logOffsets, "<u8")
+        self.write_column(columns, "logData", np.frombuffer(b"".join(pending["logs"]), \
+                                                            dtype = np.uint8), "<u1")
+        playOffsets = np.zeros(games + 1, dtype = np.uint32)
+        np.cumsum(pending["playCounts"], out = playOffsets[1:])
+        self.write_column(columns, "playOffsets", playOffsets, "<u4")
+        self.write_column(columns, "playCards", pending["playCards"], "<u2")
+        self.write_column(columns, "playPlayers", pending["playPlayers"], "<u1")
+        self.write_column(columns, "playTurns", pending["playTurns"], "<u2")
+        self.write_column(columns, "playActions", pending["playActions"], "<u4")
+        self.chunks.append({"games": games, "columns": columns})
+        self.start_chunk()
+
+    def close(self):
+        """
+        Writes the last chunk, the indexes and the footer, and closes the file
+        """
+        self.write_chunk()
+        indexes = dict()
+        for name, keys, games, keyCount in \
+            (("deck", self.deckKeys, self.deckGames, len(self.deckNames)), \
+             ("card", self.cardKeys, self.cardGames, len(self.cardNames)), \
+             ("winner", self.winnerKeys, range(self.count), len(WINNERS))):
+            offsets, indexGames = build_index(keys, games, keyCount)
+            indexes[name] = dict()
+            self.write_column(indexes[name], "offsets", offsets, "<u8")
+            self.write_column(indexes[name], "games", indexGames, "<u4")
+
+        footer = json.dumps({"count": self.count, "chunkSize": self.chunkSize, \
+                             "decks": list(self.deckNames), "cards": list(self.cardNames), \
+                             "chunks": self.chunks, "indexes": indexes}).encode("utf-8")
+        footerOffset = self.outFile.tell()
+        self.outFile.write(footer)
+        self.outFile.write(TRAILER.pack(footerOffset, len(footer), MAGIC))
+        self.outFile.close()
+
+    pass
+
+class Archive:
+    """
+    Archive
+    A read-only view of an archive file. Columns are read straight out of the memory map, and
+    only the footer is parsed when the archive is opened.
+
+    Member variables:
+        inFile, data - The file and its memory map
+        count - The number of games
+        chunkSize - The number of games in every chunk but the last
+        deckNames, cardNames - The name tables
+        chunks - The footer entry of every chunk
+        indexes - The footer entries of the deck, card and winner indexes
+    """
+    def __init__(self, fileName):
+        self.inFile = open(fileName, "rb")
+        try:
+            self.data = mmap.mmap(self.inFile.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError as error:
+            self.inFile.close()
+            raise ArchiveError("not an archive") from error
+        try:
+            self.read_footer()
+        except Exception:
+            self.close()
+            raise
+
+    def read_footer(self):
+        data = self.data
+        if (len(data) < HEADER.size + TRAILER.size):
+            raise ArchiveError("not an archive")
+        magic, version = HEADER.unpack_from(data, 0)
+        footerOffset, footerLength, trailerMagic = TRAILER.unpack_from(data, \
+            len(data) - TRAILER.size)
+        if (magic != MAGIC or trailerMagic != MAGIC):
+            raise ArchiveError("not an archive")
+        if (version != VERSION):
+            raise ArchiveError("unsupported archive version %d" % version)
+        if (footerOffset + footerLength + TRAILER.size != len(data)):
+            raise ArchiveError("truncated or corrupt archive")
+        try:
+            footer = json.loads(data[footerOffset:footerOffset + footerLength].decode("utf-8"))
+        except ValueError as error:
+            raise ArchiveError("corrupt archive footer") from error
+        self.count = footer["count"]
+        self.chunkSize = footer["chunkSize"]
+        self.deckNames = footer["decks"]
+        self.cardNames = footer["cards"]
+        self.chunks = footer["chunks"]
+        self.indexes = footer["indexes"]
+
+    def close(self):
+        self.data.close()
+        self.inFile.close()
+
+    def column(self, columns, name):
+        """
+        A column of a footer entry, as an array backed by the memory map
+        """
+        offset, dtype, shape = columns[name]
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        if (offset + count * dtype.itemsize > len(self.data)):
+            raise ArchiveError("truncated or corrupt archive")
+        return np.frombuffer(self.data, dtype = dtype, count = count, offset = offset) \
+            .reshape(shape)
+
+    def lookup(self, indexName, key):
+        index = self.indexes[indexName]
+        offsets = self.column(index, "offsets")
+        start, end = int(offsets[key]), int(offsets[key + 1])
+        # A copy, so the result doesn't keep the memory map open
+        return self.column(index, "games")[start:end].astype(np.int64)
+
+    def locate(self, gameNumber):
+        """
+        Returns the footer entry of the chunk holding a game, and the game's row in it
+        """
+        if (gameNumber < 0 or gameNumber >= self.count):
+            raise IndexError("game number out of range")
+        return self.chunks[gameNumber // self.chunkSize], gameNumber % self.chunkSize
+
+    def games_with_deck(self, deckName):
+        """
+        The games in which either player used a deck file
+        """
+        if (deckName not in self.deckNames):
+            return np.zeros(0, dtype = np.int64)
+        return self.lookup("deck", self.deckNames.index(deckName))
+
+    def games_with_card(self, cardName):
+        """
+        The games in which a card was played, by either player
+        """
+        if (cardName not in self.cardNames):
+            return np.zeros(0, dtype = np.int64)
+        return self.lookup("card", self.cardNames.index(cardName))
+
+    def games_won_by(self, winner):
+        """
+        The games won by a player. Pass agent.TIE for ties, or None for unfinished games
+        """
+        if (winner == None):
+            winner = UNFINISHED
+        return self.lookup("winner", WINNERS.index(winner))
+
+    def games_with_play(self, cardName, turn = None, player = None):
+        """
+        The games in which a card was played, on a turn and by a player if they're given. Only
+        the event columns of the chunks which the card index points to are read
+
+        Parameters:
+            cardName - The name of the card
+            turn - The turn the card was played on, counted from 1
+            player - The player who played it
+
+        Returns:
+            A sorted array of game numbers
+        """
+        candidates = self.games_with_card(cardName)
+        if (len(candidates) == 0 or (turn == None and player == None)):
+            return candidates
+        cardIndex = self.cardNames.index(cardName)
+        results = []
+        for chunkNumber in np.unique(candidates // self.chunkSize):
+            columns = self.chunks[chunkNumber]["columns"]
+            mask = self.column(columns, "playCards") == cardIndex
+            if (turn != None):
+                mask &= self.column(columns, "playTurns") == turn
+            if (player != None):
+                mask &= self.column(columns, "playPlayers") == player
+            events = np.flatnonzero(mask)
+            if (len(events) == 0):
+                continue
+            rows = np.searchsorted(self.column(columns, "playOffsets"), events, \
+                                   side = "right") - 1
+            results.append(np.unique(rows) + int(chunkNumber) * self.chunkSize)
+        if (len(results) == 0):
+            return np.zeros(0, dtype = np.int64)
+        return np.concatenate(results).astype(np.int64)
+
+    def winner(self, gameNumber):
+        """
+        The winning player, agent.TIE, or None for an unfinished game
+        """
+        chunk, row = self.locate(gameNumber)
+        winner = int(self.column(chunk["columns"], "winners")[row])
+        if (winner == UNFINISHED):
+            return None
+        return winner
+
+    def decks(self, gameNumber):
+        chunk, row = self.locate(gameNumber)
+        return [self.deckNames[deck] for deck in self.column(chunk["columns"], "decks")[row]]
+
+    def plays(self, gameNumber):
+        """
+        The card plays of a game
+
+        Returns:
+            A list of (card name, player, turn, action number) tuples
+        """
+        chunk, row = self.locate(gameNumber)
+        columns = chunk["columns"]
+        offsets = self.column(columns, "playOffsets")
+        start, end = int(offsets[row]), int(offsets[row + 1])
+        return [(self.cardNames[cardIndex], int(playerNumber), int(turn), int(action)) \
+                for cardIndex, playerNumber, turn, action in \
+                zip(self.column(columns, "playCards")[start:end], \
+                    self.column(columns, "playPlayers")[start:end], \
+                    self.column(columns, "playTurns")[start:end], \
+                    self.column(columns, "playActions")[start:end])]
+
+    def get_log(self, gameNumber):
+        """
+        Decodes the action log of one game, which can be replayed with actionlog.Replayer
+        """
+        chunk, row = self.locate(gameNumber)
+        columns = chunk["columns"]
+        offsets = self.column(columns, "logOffsets")
+        start, end = int(offsets[row]), int(offsets[row + 1])
+        return actionlog.load_log(self.column(columns, "logData")[start:end].tobytes())
+
+    pass
+
+def main():
+    parser = argparse.ArgumentParser(description = "Queries a game archive")
+    parser.add_argument("archive", help = "archive file")
+    parser.add_argument("--card", help = "games in which this card was played")
+    parser.add_argument("--turn", type = int, help = "only plays of --card on this turn")
+    parser.add_argument("--player", type = int, choices = (0, 1), \
+                        help = "only plays of --card by this player")
+    parser.add_argument("--deck", help = "games in which either player used this deck file")
+    parser.add_argument("--winner", type = int, choices = (0, 1, agent.TIE), \
+                        help = "games won by this player, %d for ties" % agent.TIE)
+    parser.add_argument("--limit", type = int, default = 20, help = "game numbers to print")
+    arguments = parser.parse_args()
+
+    gameArchive = Archive(arguments.archive)
+    selections = []
+    if (arguments.card != None):
+        selections.append(gameArchive.games_with_play(arguments.card, arguments.turn, \
+                                                      arguments.player))
+    if (arguments.deck != None):
+        selections.append(gameArchive.games_with_deck(arguments.deck))
+    if (arguments.winner != None):
+        selections.append(gameArchive.games_won_by(arguments.winner))
+
+    if (len(selections) == 0):
+        print("%d games in %d chunks" % (gameArchive.count, len(gameArchive.chunks)))
+        for deckNumber in range(len(gameArchive.deckNames)):
+            deckName = gameArchive.deckNames[deckNumber]
+            print("\t%-32s %d games" % (deckName, len(gameArchive.games_with_deck(deckName))))
+        for winner in WINNERS:
+            print("\twinner %-25d %d games" % (winner, len(gameArchive.lookup("winner", \
+                WINNERS.index(winner)))))
+    else:
+        games = selections[0]
+        for selection in selections[1:]:
+            games = np.intersect1d(games, selection)
+        print("%d games" % len(games))
+        for gameNumber in games[:arguments.limit]:
+            print("\t%d: %s, winner %s" % (gameNumber, " vs ".join(gameArchive.decks(gameNumber)), \
+                                           gameArchive.winner(gameNumber)))
+    gameArchive.close()
+
+if __name__ == "__main__":
+    main()
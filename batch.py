@@ -0,0 +1,925 @@
+"""
+Batched versions of the game rules, for balance studies which play thousands of games at once.
+They use NumPy, which the rest of the engine doesn't need.
+
+CombatBatch
+The attacking and defending frontlines of many games, laid out as arrays of shape
+(games, lanes). Empty lanes are masked out.
+
+Combat resolution
+Game.perform_all_attacks goes lane by lane. Nothing in one lane can affect another lane
+(unless a card has a strike effect), so every lane of every game can be resolved at once
+with masked array operations:
+    Case 1: Defending lane is empty - the attacker hits the nexus
+    Case 2: Attacker has quick attack - the attacker strikes first, and the defender only
+        strikes back if it survived
+    Case 3: Both cards strike each other at the same time
+This only pays off when the frontlines already are arrays, as in BatchedGame. Reading them out
+of Game objects and writing the results back takes as much Python per card as
+Game.perform_all_attacks itself (see benchmark.py combat), so Game objects keep the scalar
+rules. A CombatBatch can still be built from Game objects, which is how the differential test
+checks resolve_combat against the scalar rules. can_batch tells which games the arrays can
+express (no strike effects, undo recording or state hashing, and no card in two lanes).
+
+BatchError
+Raised for a deck with a card the batched rules can't play
+
+CardTable
+The card database as arrays indexed by card id, so card stats can be looked up for every game
+at once
+
+Actions
+One action per game, filled in by the agents before every BatchedGame.step
+
+BatchedGame
+Many whole games stored as struct-of-arrays instead of Game objects, and stepped in lockstep.
+Every rule is applied to all the games which chose that action with one set of array
+operations. Combat goes through the same resolve_combat as the CombatBatch.
+
+Usage:
+    python batch.py              runs the differential tests against the Game rules
+"""
+import argparse
+import random
+import numpy as np
+import card
+import effect
+import game
+import simulator
+import targeting
+
+class CombatBatch:
+    """
+    CombatBatch
+    The frontlines of a list of games, as arrays. The arrays are indexed [game, lane].
+
+    Member variables:
+        games - The game objects, in batch order. Empty for a batch made from arrays
+        attackers - For each game, the list of attacking cards
+        defenders - For each game, the list of defending cards (None for empty lanes)
+        attackerPresent - Bool mask, there is an attacker in the lane
+        defenderPresent - Bool mask, there is a defender in the lane
+        attackerAttack, attackerDefense - Stats of the attackers
+        defenderAttack, defenderDefense - Stats of the defenders
+        quickAttack - Bool mask, the attacker has quick attack
+    """
+    def __init__(self, games):
+        self.games = games
+        self.attackers = []
+        self.defenders = []
+
+        lanes = 0
+        for gameObject in games:
+            lanes = max(lanes, len(gameObject.players[gameObject.attackingPlayer].frontline.list))
+
+        # Filled as flat lists first, numpy element assignment is much slower than this
+        size = len(games) * lanes
+        attackerPresent = [False] * size
+        defenderPresent = [False] * size
+        attackerAttack = [0] * size
+        attackerDefense = [0] * size
+        defenderAttack = [0] * size
+        defenderDefense = [0] * size
+        quickAttack = [False] * size
+
+        for g in range(len(games)):
+            gameObject = games[g]
+            attackingFrontline = gameObject.players[gameObject.attackingPlayer].frontline.list
+            defendingFrontline = gameObject.players[gameObject.defendingPlayer].frontline.list
+            # Copies, the game clears its frontlines in place after combat
+            self.attackers.append(list(attackingFrontline))
+            self.defenders.append(list(defendingFrontline))
+            index = g * lanes
+            for lane in range(len(attackingFrontline)):
+                attacker = attackingFrontline[lane]
+                attackerPresent[index] = True
+                attackerAttack[index] = attacker.attack
+                attackerDefense[index] = attacker.defense
+                quickAttack[index] = attacker.quickAttack
+                defender = defendingFrontline[lane]
+                if defender != None:
+                    defenderPresent[index] = True
+                    defenderAttack[index] = defender.attack
+                    defenderDefense[index] = defender.defense
+                index += 1
+
+        shape = (len(games), lanes)
+        self.attackerPresent = np.array(attackerPresent, dtype = bool).reshape(shape)
+        self.defenderPresent = np.array(defenderPresent, dtype = bool).reshape(shape)
+        self.attackerAttack = np.array(attackerAttack, dtype = np.int64).reshape(shape)
+        self.attackerDefense = np.array(attackerDefense, dtype = np.int64).reshape(shape)
+        self.defenderAttack = np.array(defenderAttack, dtype = np.int64).reshape(shape)
+        self.defenderDefense = np.array(defenderDefense, dtype = np.int64).reshape(shape)
+        self.quickAttack = np.array(quickAttack, dtype = bool).reshape(shape)
+
+    @classmethod
+    def from_arrays(cls, attackerPresent, defenderPresent, attackerAttack, attackerDefense, \
+                    defenderAttack, defenderDefense, quickAttack):
+        """
+        Builds a batch straight from arrays, for state which is already laid out that way
+        (see BatchedGame)
+        """
+        ret = cls([])
+        ret.attackerPresent = attackerPresent
+        ret.defenderPresent = defenderPresent
+        ret.attackerAttack = attackerAttack
+        ret.attackerDefense = attackerDefense
+        ret.defenderAttack = defenderAttack
+        ret.defenderDefense = defenderDefense
+        ret.quickAttack = quickAttack
+        return ret
+
+    pass
+
+class CombatResult:
+    """
+    CombatResult
+    The outcome of resolving a CombatBatch. Arrays are indexed [game, lane] unless noted.
+
+    Member variables:
+        attackerDefense, defenderDefense - Defense after combat
+        attackerStruck - The attacker struck (every attacker does)
+        nexusStruck - The attacker struck the nexus
+        defenderStruck - The defender struck back
+        attackerDies, defenderDies - The card died in combat
+        nexusDamage - Total damage to the defending nexus, indexed [game]
+    """
+    pass
+
+def resolve_combat(batch):
+    """
+    Resolves every lane of every game in the batch at once
+
+    Parameters:
+        batch - CombatBatch
+
+    Returns:
+        CombatResult
+    """
+    result = CombatResult()
+    fighting = batch.attackerPresent & batch.defenderPresent
+    nexusLanes = batch.attackerPresent & ~batch.defenderPresent
+    quickLanes = fighting & batch.quickAttack
+
+    # The attacker always strikes first (or at the same time)
+    defenderDefense = np.where(fighting, batch.defenderDefense - batch.attackerAttack, \
+                               batch.defenderDefense)
+    defenderDies = fighting & (defenderDefense <= 0)
+
+    # The defender strikes back unless a quick attack killed it
+    defenderStruck = fighting & ~(quickLanes & defenderDies)
+    attackerDefense = np.where(defenderStruck, batch.attackerDefense - batch.defenderAttack, \
+                               batch.attackerDefense)
+    attackerDies = defenderStruck & (attackerDefense <= 0)
+
+    result.attackerDefense = attackerDefense
+    result.defenderDefense = defenderDefense
+    result.attackerStruck = batch.attackerPresent
+    result.nexusStruck = nexusLanes
+    result.defenderStruck = defenderStruck
+    result.attackerDies = attackerDies
+    result.defenderDies = defenderDies
+    result.nexusDamage = np.where(nexusLanes, batch.attackerAttack, 0).sum(axis = 1)
+    return result
+
+def can_batch(gameObject):
+    """
+    Tells us whether a game's combat can be resolved by the batched path. Anything with side
+    effects the arrays can't express goes through the scalar rules instead
+    """
+    if (gameObject.undoLog != None or gameObject.hasher != None):
+        return False
+    attackingFrontline = gameObject.players[gameObject.attackingPlayer].frontline.list
+    defendingFrontline = gameObject.players[gameObject.defendingPlayer].frontline.list
+    if len(defendingFrontline) < len(attackingFrontline):
+        return False
+
+    cards = []
+    for lane in range(len(attackingFrontline)):
+        for frontlineCard in (attackingFrontline[lane], defendingFrontline[lane]):
+            if frontlineCard == None:
+                continue
+            if frontlineCard.strikeEffect != None:
+                return False
+            cards.append(frontlineCard)
+    if attackingFrontline.count(None) != 0:
+        return False
+    return len(set(cards)) == len(cards)
+
+class BatchError(ValueError):
+    pass
+
+class CardTable:
+    """
+    CardTable
+    The card database as arrays, indexed by card id. The ids are the positions of the card
+    names in the database. Only the effects BatchedGame knows how to apply are supported:
+    minions which summon themselves, and spells which buff a chosen card on a bench.
+
+    Member variables:
+        names - The card names, in id order
+        ids - A dict mapping card names to ids
+        manaCost, speed, attack, defense - The card definitions
+        isMinion - The card is summoned when played
+        isTargeted - The card's effect needs a target
+        targetsEnemy - The target is on the enemy's bench rather than ours
+        buffAttack, buffDefense - What the effect adds to the target's stats
+    """
+    def __init__(self, cardMap):
+        self.names = list(cardMap.cardDatabase)
+        self.ids = dict()
+        count = len(self.names)
+        self.manaCost = np.zeros(count, dtype = np.int32)
+        self.speed = np.zeros(count, dtype = np.int32)
+        self.attack = np.zeros(count, dtype = np.int32)
+        self.defense = np.zeros(count, dtype = np.int32)
+        self.isMinion = np.zeros(count, dtype = bool)
+        self.isTargeted = np.zeros(count, dtype = bool)
+        self.targetsEnemy = np.zeros(count, dtype = bool)
+        self.buffAttack = np.zeros(count, dtype = np.int32)
+        self.buffDefense = np.zeros(count, dtype = np.int32)
+
+        for cardId in range(count):
+            template = cardMap.cardDatabase[self.names[cardId]]
+            self.ids[template.name] = cardId
+            self.manaCost[cardId] = template.manaCost
+            self.speed[cardId] = template.speed.value
+            self.attack[cardId] = template.attack
+            self.defense[cardId] = template.defense
+            playEffect = template.playEffect
+            if isinstance(playEffect, effect.Summon):
+                self.isMinion[cardId] = True
+            elif isinstance(playEffect, effect.Buff) and \
+                 isinstance(playEffect.targeter.locationTargeter, targeting.Bench) and \
+                 isinstance(playEffect.selector, targeting.Player) and \
+                 playEffect.targeter.allegiance in ("allied", "enemy"):
+                self.isTargeted[cardId] = True
+                self.targetsEnemy[cardId] = playEffect.targeter.allegiance == "enemy"
+                self.buffAttack[cardId] = playEffect.attackBuff
+                self.buffDefense[cardId] = playEffect.defenseBuff
+            else:
+                # Only a problem if a deck actually uses the card, see BatchedGame
+                self.manaCost[cardId] = -1
+
+    def get_id(self, cardName):
+        cardId = self.ids[cardName]
+        if self.manaCost[cardId] == -1:
+            raise BatchError("BatchedGame can't play '" + cardName + "'")
+        return cardId
+
+    pass
+
+class Actions:
+    """
+    Actions
+    One action per game, as arrays, for BatchedGame.step. Allocate it once and refill it every
+    step.
+
+    Action types:
+        NONE - Do nothing this step
+        PASS - Game.pass_turn()
+        PLAY - Game.play_card(card, target). A target of -1 means no target
+        ATTACK - Game.prepare_attack(attackers). lanes[g] holds the bench index of the
+            attacker in each lane, padded with -1
+        DEFEND - Game.prepare_defense(defenders). lanes[g] holds the bench index of the
+            blocker in each lane, or -1 for an empty lane
+
+    Member variables:
+        actionType - The type of each game's action
+        card - The hand index of the card to play
+        target - The index of the target in the card's target list
+        lanes - Bench indices for ATTACK and DEFEND, shape (games, lanes)
+    """
+    NONE = -1
+    PASS = 0
+    PLAY = 1
+    ATTACK = 2
+    DEFEND = 3
+
+    def __init__(self, games, lanes):
+        self.actionType = np.full(games, Actions.NONE, dtype = np.int32)
+        self.card = np.zeros(games, dtype = np.int32)
+        self.target = np.full(games, -1, dtype = np.int32)
+        self.lanes = np.full((games, lanes), -1, dtype = np.int32)
+
+    def clear(self):
+        self.actionType.fill(Actions.NONE)
+        self.target.fill(-1)
+        self.lanes.fill(-1)
+
+    pass
+
+class BatchedGame:
+    """
+    BatchedGame
+    Many games held as struct-of-arrays, stepped in lockstep. Every array is indexed by game
+    first, and per-player arrays by [game, player]. Zones are fixed-size arrays of card ids
+    (-1 for empty slots) with a size array, and keep the same order as the zones of a Game:
+    the deck is drawn from the end, cards are played by hand index, and targets are bench
+    indices. The capacity of every zone is the size of the largest deck, since no zone can
+    hold more cards than that.
+
+    The rules are the same as Game.play_card, prepare_attack, prepare_defense and pass_turn,
+    including the parts that look odd (i.e. playing a card doesn't spend mana, and nothing
+    checks the card is playable). Actions which would raise an exception in Game (an index
+    out of range) are ignored instead.
+
+    Unlike Game, the batch also knows when a game is over. A game ends when a nexus drops to
+    0 health, or when a player has to draw from an empty deck. Finished games ignore any
+    further actions.
+
+    Only minions and the spells the CardTable understands can be batched. A deck with any
+    other card raises BatchError.
+
+    Member variables:
+        table - The CardTable the card ids refer to
+        games - The number of games
+        capacity - The size of every zone array
+        mana, maxMana, health - [game, player]
+        deck, deckSize - Card ids [game, player, slot], and the number of cards
+        hand, handSize - Likewise for the hand
+        bench, benchSize - Likewise for the bench
+        benchAttack, benchDefense, benchQuickAttack - Current stats of the benched cards
+        graveyard, graveyardSize - Likewise for the graveyard
+        attackerLanes - The bench index of the attacker in each lane, -1 for none
+        defenderLanes - The bench index of the blocker in each lane, -1 for none
+        numAttackers, passedTurn, attackToken, attackPhase - [game], as in Game
+        activePlayer, attackingPlayer - [game], as in Game. The defender is the other one
+        done - [game], the game is over
+        winner - [game], the winning player, -1 while the game runs or for a tie
+    """
+    def __init__(self, cardMap, decks, games):
+        """
+        Parameters:
+            cardMap - A filled CardMapper
+            decks - The deck files for player 0 and player 1, or a list of such pairs, one
+                per game
+            games - The number of games
+        """
+        self.table = CardTable(cardMap)
+        if isinstance(decks[0], str):
+            decks = [decks] * games
+
+        deckIds = dict()
+        for deckPair in decks:
+            for deckFile in deckPair:
+                if deckFile not in deckIds:
+                    with open(deckFile, "r") as file:
+                        deckIds[deckFile] = [self.table.get_id(line.rstrip()) for line in file]
+        self.games = games
+        self.capacity = max(len(ids) for ids in deckIds.values())
+        shape = (games, 2, self.capacity)
+
+        self.mana = np.full((games, 2), game.Player.STARTING_MANA, dtype = np.int32)
+        self.maxMana = np.full((games, 2), game.Player.STARTING_MANA, dtype = np.int32)
+        self.health = np.full((games, 2), game.Player.MAX_HP, dtype = np.int32)
+        self.deck = np.full(shape, -1, dtype = np.int32)
+        self.deckSize = np.zeros((games, 2), dtype = np.int32)
+        self.hand = np.full(shape, -1, dtype = np.int32)
+        self.handSize = np.zeros((games, 2), dtype = np.int32)
+        self.bench = np.full(shape, -1, dtype = np.int32)
+        self.benchSize = np.zeros((games, 2), dtype = np.int32)
+        self.benchAttack = np.zeros(shape, dtype = np.int32)
+        self.benchDefense = np.zeros(shape, dtype = np.int32)
+        self.benchQuickAttack = np.zeros(shape, dtype = bool)
+        self.graveyard = np.full(shape, -1, dtype = np.int32)
+        self.graveyardSize = np.zeros((games, 2), dtype = np.int32)
+
+        self.attackerLanes = np.full((games, self.capacity), -1, dtype = np.int32)
+        self.defenderLanes = np.full((games, self.capacity), -1, dtype = np.int32)
+        self.numAttackers = np.zeros(games, dtype = np.int32)
+        self.passedTurn = np.zeros(games, dtype = bool)
+        self.attackToken = np.ones(games, dtype = bool)
+        self.attackPhase = np.zeros(games, dtype = bool)
+        self.activePlayer = np.zeros(games, dtype = np.int32)
+        self.attackingPlayer = np.zeros(games, dtype = np.int32)
+        self.done = np.zeros(games, dtype = bool)
+        self.winner = np.full(games, -1, dtype = np.int32)
+
+        for g in range(games):
+            for p in range(2):
+                ids = deckIds[decks[g][p]]
+                self.deck[g, p, :len(ids)] = ids
+                self.deckSize[g, p] = len(ids)
+
+    def create_actions(self):
+        return Actions(self.games, self.capacity)
+
+# Actions
+    def step(self, actions):
+        """
+        Applies one action to every game which isn't over
+
+        Parameters:
+            actions - An Actions object
+        """
+        live = ~self.done
+        actionType = actions.actionType
+        self.play_card(live & (actionType == Actions.PLAY), actions.card, actions.target)
+        self.prepare_attack(live & (actionType == Actions.ATTACK), actions.lanes)
+        self.prepare_defense(live & (actionType == Actions.DEFEND), actions.lanes)
+        self.pass_turn(live & (actionType == Actions.PASS))
+        self.check_game_over()
+
+    def play_card(self, mask, cardIndex, target):
+        """
+        Game.play_card for the games in the mask
+        """
+        rows = np.nonzero(mask)[0]
+        players = self.activePlayer[rows]
+        cardIndex = cardIndex[rows]
+        valid = (cardIndex >= 0) & (cardIndex < self.handSize[rows, players])
+        rows, players, cardIndex, target = \
+            rows[valid], players[valid], cardIndex[valid], target[rows][valid]
+        if len(rows) == 0:
+            return
+
+        self.passedTurn[rows] = self.attackPhase[rows]
+        cardIds = self.hand[rows, players, cardIndex]
+
+        # Minions summon themselves to the end of the bench
+        minion = self.table.isMinion[cardIds]
+        summonRows, summonPlayers = rows[minion], players[minion]
+        summonIds = cardIds[minion]
+        slots = self.benchSize[summonRows, summonPlayers]
+        self.bench[summonRows, summonPlayers, slots] = summonIds
+        self.benchAttack[summonRows, summonPlayers, slots] = self.table.attack[summonIds]
+        self.benchDefense[summonRows, summonPlayers, slots] = self.table.defense[summonIds]
+        self.benchQuickAttack[summonRows, summonPlayers, slots] = False
+        self.benchSize[summonRows, summonPlayers] += 1
+
+        # Targeted spells buff a card on a bench. No target, or a bad one, does nothing
+        targetPlayers = np.where(self.table.targetsEnemy[cardIds], 1 - players, players)
+        buffed = self.table.isTargeted[cardIds] & (target >= 0) & \
+                 (target < self.benchSize[rows, targetPlayers])
+        buffRows, buffPlayers, buffSlots = rows[buffed], targetPlayers[buffed], target[buffed]
+        buffIds = cardIds[buffed]
+        self.benchAttack[buffRows, buffPlayers, buffSlots] += self.table.buffAttack[buffIds]
+        self.benchDefense[buffRows, buffPlayers, buffSlots] += self.table.buffDefense[buffIds]
+
+        self.remove_from_hand(rows, players, cardIndex)
+
+        # clear_dead_cards() after the card is played
+        dead = np.zeros(self.bench.shape, dtype = bool)
+        dead[buffRows, buffPlayers, buffSlots] = \
+            self.benchDefense[buffRows, buffPlayers, buffSlots] <= 0
+        self.kill_cards(dead)
+
+        burst = self.table.speed[cardIds] == card.Speed.BURST.value
+        self.passedTurn[rows[burst]] = False
+        switching = rows[~burst]
+        self.activePlayer[switching] = 1 - self.activePlayer[switching]
+
+    def prepare_attack(self, mask, lanes):
+        """
+        Game.prepare_attack for the games in the mask. Only the player with the attack token
+        can declare an attack
+        """
+        self.passedTurn[mask] = False
+        rows = np.nonzero(mask & (self.activePlayer == self.attackingPlayer))[0]
+        lanes = lanes[rows]
+        players = self.attackingPlayer[rows]
+        valid = np.all(lanes < self.benchSize[rows, players][:, None], axis = 1)
+        rows, lanes = rows[valid], lanes[valid]
+
+        self.attackPhase[rows] = True
+        self.attackToken[rows] = False
+        self.attackerLanes[rows] = lanes
+        self.numAttackers[rows] = np.sum(lanes >= 0, axis = 1)
+
+    def prepare_defense(self, mask, lanes):
+        """
+        Game.prepare_defense for the games in the mask. Blocks past the number of attackers
+        are ignored
+        """
+        rows = np.nonzero(mask)[0]
+        lanes = lanes[rows]
+        players = 1 - self.attackingPlayer[rows]
+        valid = np.all(lanes < self.benchSize[rows, players][:, None], axis = 1)
+        rows, lanes = rows[valid], lanes[valid]
+
+        laneNumbers = np.arange(self.capacity)[None, :]
+        lanes = np.where(laneNumbers < self.numAttackers[rows][:, None], lanes, -1)
+        self.defenderLanes[rows] = lanes
+
+    def pass_turn(self, mask):
+        """
+        Game.pass_turn for the games in the mask. The second pass in a row resolves combat
+        during the attack phase, and starts a new turn otherwise
+        """
+        passedTwice = mask & self.passedTurn
+        passedOnce = mask & ~self.passedTurn
+
+        attacking = passedTwice & self.attackPhase
+        self.passedTurn[passedTwice] = False
+        self.perform_all_attacks(attacking)
+        self.begin_new_turn(passedTwice & ~attacking)
+
+        self.passedTurn[passedOnce] = True
+        self.activePlayer[passedOnce] = 1 - self.activePlayer[passedOnce]
+
+# Automatic actions
+    def draw_card(self, rows, players):
+        """
+        Draws a card for each (row, player) pair. Players with an empty deck lose the game
+        """
+        empty = self.deckSize[rows, players] == 0
+        self.lose(rows[empty], players[empty])
+        rows, players = rows[~empty], players[~empty]
+
+        self.deckSize[rows, players] -= 1
+        slots = self.deckSize[rows, players]
+        cardIds = self.deck[rows, players, slots]
+        self.deck[rows, players, slots] = -1
+        self.hand[rows, players, self.handSize[rows, players]] = cardIds
+        self.handSize[rows, players] += 1
+
+    def begin_new_turn(self, mask):
+        """
+        Game.begin_new_turn for the games in the mask
+        """
+        rows = np.nonzero(mask)[0]
+        if len(rows) == 0:
+            return
+        self.maxMana[rows] = np.minimum(self.maxMana[rows] + 1, game.Player.MAX_MANA)
+        self.mana[rows] = self.maxMana[rows]
+        for p in range(2):
+            self.draw_card(rows, np.full(len(rows), p, dtype = np.int32))
+
+        self.attackingPlayer[rows] = 1 - self.attackingPlayer[rows]
+        self.activePlayer[rows] = self.attackingPlayer[rows]
+        self.attackToken[rows] = True
+
+    def perform_all_attacks(self, mask):
+        """
+        Game.perform_all_attacks for the games in the mask, using the same masked array
+        resolution as the CombatBatch. A lane whose attacker has already died is empty
+        """
+        rows = np.nonzero(mask)[0]
+        if len(rows) == 0:
+            return
+        attackers = self.attackingPlayer[rows][:, None]
+        defenders = 1 - attackers
+        rowIndex = rows[:, None]
+        attackerLanes = self.attackerLanes[rows]
+        defenderLanes = self.defenderLanes[rows]
+        attackerPresent = attackerLanes >= 0
+        defenderPresent = attackerPresent & (defenderLanes >= 0)
+        attackerSlots = np.maximum(attackerLanes, 0)
+        defenderSlots = np.maximum(defenderLanes, 0)
+
+        combatBatch = CombatBatch.from_arrays( \
+            attackerPresent, defenderPresent, \
+            self.benchAttack[rowIndex, attackers, attackerSlots], \
+            self.benchDefense[rowIndex, attackers, attackerSlots], \
+            self.benchAttack[rowIndex, defenders, defenderSlots], \
+            self.benchDefense[rowIndex, defenders, defenderSlots], \
+            self.benchQuickAttack[rowIndex, attackers, attackerSlots])
+        result = resolve_combat(combatBatch)
+
+        self.health[rows, defenders[:, 0]] -= result.nexusDamage.astype(np.int32)
+        for present, players, slots, defense in \
+                ((attackerPresent, attackers, attackerLanes, result.attackerDefense), \
+                 (defenderPresent, defenders, defenderLanes, result.defenderDefense)):
+            laneRows, lanes = np.nonzero(present)
+            self.benchDefense[rows[laneRows], players[laneRows, 0], slots[laneRows, lanes]] = \
+                defense[laneRows, lanes]
+
+        # Cards go to the graveyard in lane order
+        dead = np.zeros(self.bench.shape, dtype = bool)
+        order = np.zeros(self.bench.shape, dtype = np.int32)
+        for deaths, players, slots in ((result.attackerDies, attackers, attackerLanes), \
+                                        (result.defenderDies, defenders, defenderLanes)):
+            laneRows, lanes = np.nonzero(deaths)
+            dead[rows[laneRows], players[laneRows, 0], slots[laneRows, lanes]] = True
+            order[rows[laneRows], players[laneRows, 0], slots[laneRows, lanes]] = lanes
+        self.kill_cards(dead, order)
+
+        self.attackerLanes[rows] = -1
+        self.defenderLanes[rows] = -1
+        self.attackPhase[rows] = False
+
+    def kill_cards(self, dead, order = None):
+        """
+        Moves the cards marked dead from the bench to the graveyard, closing the gaps on the
+        bench and updating the frontline lanes which point at the bench
+
+        Parameters:
+            dead - Bool array [game, player, slot] of the cards to kill
+            order - The order the cards reach the graveyard in. Defaults to bench order
+        """
+        rows = np.nonzero(dead.any(axis = (1, 2)))[0]
+        if len(rows) == 0:
+            return
+        dead = dead[rows]
+        slots = np.arange(self.capacity)[None, None, :]
+        if order is None:
+            order = np.broadcast_to(slots, dead.shape)
+        else:
+            order = order[rows]
+
+        # Graveyard, in the requested order
+        deathOrder = np.argsort(np.where(dead, order, self.capacity), axis = 2, kind = "stable")
+        deadIds = np.take_along_axis(self.bench[rows], deathOrder, axis = 2)
+        deathCount = dead.sum(axis = 2)
+        g, p, k = np.nonzero(slots < deathCount[:, :, None])
+        graveyardSlots = self.graveyardSize[rows[g], p] + k
+        self.graveyard[rows[g], p, graveyardSlots] = deadIds[g, p, k]
+        self.graveyardSize[rows] += deathCount.astype(np.int32)
+
+        # Bench, survivors keep their order
+        alive = ~dead & (slots < self.benchSize[rows][:, :, None])
+        survivorOrder = np.argsort(~alive, axis = 2, kind = "stable")
+        newSize = alive.sum(axis = 2).astype(np.int32)
+        empty = slots >= newSize[:, :, None]
+        for zone, emptyValue in ((self.bench, -1), (self.benchAttack, 0), \
+                                 (self.benchDefense, 0), (self.benchQuickAttack, False)):
+            compacted = np.take_along_axis(zone[rows], survivorOrder, axis = 2)
+            compacted[empty] = emptyValue
+            zone[rows] = compacted
+        self.benchSize[rows] = newSize
+
+        # Lanes point at bench indices, which have just moved
+        newIndex = np.where(alive, np.cumsum(alive, axis = 2) - 1, -1)
+        for lanes, players in ((self.attackerLanes, self.attackingPlayer[rows]), \
+                               (self.defenderLanes, 1 - self.attackingPlayer[rows])):
+            playerIndex = newIndex[np.arange(len(rows)), players]
+            oldLanes = lanes[rows]
+            lanes[rows] = np.where(oldLanes >= 0, \
+                                   np.take_along_axis(playerIndex, np.maximum(oldLanes, 0), \
+                                                      axis = 1), -1)
+
+    def remove_from_hand(self, rows, players, cardIndex):
+        """
+        Removes one card from the hand of each (row, player) pair, shifting the later cards
+        down, like list.pop(cardIndex)
+        """
+        slots = np.arange(self.capacity)[None, :]
+        source = slots + (slots >= cardIndex[:, None])
+        hands = self.hand[rows, players]
+        shifted = np.take_along_axis(hands, np.minimum(source, self.capacity - 1), axis = 1)
+        shifted[source >= self.capacity] = -1
+        self.hand[rows, players] = shifted
+        self.handSize[rows, players] -= 1
+
+    def lose(self, rows, players):
+        """
+        Ends the games in rows, with the given players losing. If both players of a game
+        lose at once, it's a tie
+        """
+        for row, player in zip(rows.tolist(), players.tolist()):
+            if self.done[row] and self.winner[row] == player:
+                self.winner[row] = -1
+            elif not self.done[row]:
+                self.done[row] = True
+                self.winner[row] = 1 - player
+
+    def check_game_over(self):
+        """
+        Ends the games where a nexus has been destroyed
+        """
+        dead = (self.health <= 0) & ~self.done[:, None]
+        rows = np.nonzero(dead.any(axis = 1))[0]
+        if len(rows) == 0:
+            return
+        self.done[rows] = True
+        self.winner[rows] = np.where(dead[rows, 0] & dead[rows, 1], -1, \
+                                     np.where(dead[rows, 0], 1, 0))
+
+# Help actions
+    def playable_cards(self):
+        """
+        Card.is_playable for every card in the active player's hand, as a bool array
+        [game, slot]
+        """
+        rows = np.arange(self.games)
+        hands = self.hand[rows, self.activePlayer]
+        cardIds = np.maximum(hands, 0)
+        inHand = hands >= 0
+        enoughMana = self.table.manaCost[cardIds] <= self.mana[rows, self.activePlayer][:, None]
+        slow = self.table.speed[cardIds] == card.Speed.SLOW.value
+        return inHand & enoughMana & ~(self.attackPhase[:, None] & slow)
+
+    pass
+
+# Differential testing
+def random_combat(cardMap, generator, benchSize = 6):
+    """
+    Creates a game in the attack phase, with random benches, random stats, random quick
+    attackers and random blocks
+    """
+    gameObject = game.Game()
+    gameObject.verbose = False
+    gameObject.cardMap = cardMap
+    if generator.random() < 0.5:
+        gameObject.switch_attacking_player()
+
+    for player in gameObject.players:
+        for i in range(generator.randint(1, benchSize)):
+            newCard = cardMap.get_card(generator.choice(["dummy", "another dummy"]))
+            newCard.owner = player.playerNumber
+            newCard.attack = generator.randint(0, 5)
+            newCard.defense = generator.randint(1, 5)
+            newCard.quickAttack = generator.random() < 0.3
+            player.bench.append(newCard)
+
+    gameObject.activePlayer = gameObject.attackingPlayer
+    attackingBench = gameObject.players[gameObject.attackingPlayer].bench.list
+    defendingBench = gameObject.players[gameObject.defendingPlayer].bench.list
+    attackers = generator.sample(range(len(attackingBench)), \
+                                 generator.randint(1, len(attackingBench)))
+    gameObject.prepare_attack(attackers)
+
+    defenders = []
+    blockers = generator.sample(range(len(defendingBench)), \
+                                min(len(defendingBench), generator.randint(0, len(attackers))))
+    lanes = generator.sample(range(len(attackers)), len(blockers))
+    for i in range(len(blockers)):
+        defenders.append(blockers[i])
+        defenders.append(lanes[i])
+    gameObject.prepare_defense(defenders)
+    return gameObject
+
+def differential_test(games = 5000, seed = 0):
+    """
+    Resolves random combats with resolve_combat, plays them with Game.perform_all_attacks,
+    and returns the number of games where the results differ: the defense of every card,
+    which cards struck and died, and the nexus damage
+    """
+    sim = simulator.Simulator()
+    generator = random.Random(seed)
+    gameObjects = [random_combat(sim.cardMap, generator) for i in range(games)]
+    gameObjects = [gameObject for gameObject in gameObjects if can_batch(gameObject)]
+    batch = CombatBatch(gameObjects)
+    result = resolve_combat(batch)
+
+    mismatches = 0
+    for g in range(len(gameObjects)):
+        gameObject = gameObjects[g]
+        defendingPlayer = gameObject.players[gameObject.defendingPlayer]
+        health = defendingPlayer.health
+        gameObject.perform_all_attacks()
+        graveyards = [player.graveyard.list for player in gameObject.players]
+        actual = [health - defendingPlayer.health]
+        expected = [int(result.nexusDamage[g])]
+        for lane in range(len(batch.attackers[g])):
+            attacker = batch.attackers[g][lane]
+            defender = batch.defenders[g][lane]
+            actual.append((attacker.defense, attacker.nexusStrikeCount == 1, \
+                           attacker in graveyards[attacker.owner]))
+            expected.append((int(result.attackerDefense[g, lane]), \
+                             bool(result.nexusStruck[g, lane]), \
+                             bool(result.attackerDies[g, lane])))
+            if (defender != None):
+                actual.append((defender.defense, defender.strikeCount == 1, \
+                               defender in graveyards[defender.owner]))
+                expected.append((int(result.defenderDefense[g, lane]), \
+                                 bool(result.defenderStruck[g, lane]), \
+                                 bool(result.defenderDies[g, lane])))
+        if (actual != expected):
+            mismatches += 1
+    return mismatches
+
+def game_state(gameObject, table):
+    """
+    The state of a Game in the same form as batched_state, with cards as CardTable ids
+    """
+    ret = [gameObject.passedTurn, gameObject.attackToken, gameObject.attackPhase, \
+           gameObject.activePlayer, gameObject.attackingPlayer]
+    for player in gameObject.players:
+        ret.append((player.mana, player.maxMana, player.health))
+        for zone in (player.deck, player.hand.list, player.graveyard.list):
+            ret.append([table.ids[c.name] for c in zone])
+        ret.append([(table.ids[c.name], c.attack, c.defense) for c in player.bench.list])
+    for player in (gameObject.players[gameObject.attackingPlayer], \
+                   gameObject.players[gameObject.defendingPlayer]):
+        lanes = []
+        for c in player.frontline.list[:gameObject.numAttackers]:
+            lanes.append(-1 if c == None else player.bench.position(c))
+        ret.append(lanes + [-1] * (gameObject.numAttackers - len(lanes)))
+    return ret
+
+def batched_state(batchedGame, g):
+    """
+    The state of game g of a BatchedGame, in the same form as game_state
+    """
+    b = batchedGame
+    ret = [bool(b.passedTurn[g]), bool(b.attackToken[g]), bool(b.attackPhase[g]), \
+           int(b.activePlayer[g]), int(b.attackingPlayer[g])]
+    for p in range(2):
+        ret.append((int(b.mana[g, p]), int(b.maxMana[g, p]), int(b.health[g, p])))
+        ret.append(b.deck[g, p, :b.deckSize[g, p]].tolist())
+        ret.append(b.hand[g, p, :b.handSize[g, p]].tolist())
+        ret.append(b.graveyard[g, p, :b.graveyardSize[g, p]].tolist())
+        size = b.benchSize[g, p]
+        ret.append(list(zip(b.bench[g, p, :size].tolist(), b.benchAttack[g, p, :size].tolist(), \
+                            b.benchDefense[g, p, :size].tolist())))
+    numAttackers = int(b.numAttackers[g])
+    ret.append(b.attackerLanes[g, :numAttackers].tolist())
+    ret.append(b.defenderLanes[g, :numAttackers].tolist())
+    return ret
+
+def random_action(gameObject, generator, actions, g, defending):
+    """
+    Picks a random legal action for a Game, and writes it into row g of actions. Returns the
+    command to run on the Game as (function, arguments)
+    """
+    player = gameObject.players[gameObject.activePlayer]
+    if defending:
+        attackers = gameObject.numAttackers
+        bench = len(gameObject.players[gameObject.defendingPlayer].bench.list)
+        blockers = generator.sample(range(bench), min(bench, generator.randint(0, attackers)))
+        lanes = generator.sample(range(attackers), len(blockers))
+        defenders = []
+        actions.actionType[g] = Actions.DEFEND
+        for i in range(len(blockers)):
+            defenders += [blockers[i], lanes[i]]
+            actions.lanes[g, lanes[i]] = blockers[i]
+        return (game.Game.prepare_defense, (defenders,))
+
+    choice = generator.random()
+    playable = [i for i in range(len(player.hand.list)) \
+                if player.hand.list[i].is_playable(player.mana, gameObject.attackPhase)]
+    if choice < 0.6 and len(playable) > 0:
+        cardNumber = generator.choice(playable)
+        targets = len(player.hand.list[cardNumber].get_targets())
+        target = None
+        if targets > 0 and generator.random() < 0.9:
+            target = generator.randrange(targets)
+        actions.actionType[g] = Actions.PLAY
+        actions.card[g] = cardNumber
+        actions.target[g] = -1 if target == None else target
+        return (game.Game.play_card, (cardNumber, target))
+
+    bench = len(player.bench.list)
+    if choice < 0.8 and gameObject.activePlayer == gameObject.attackingPlayer and \
+       gameObject.attackToken and not gameObject.attackPhase and bench > 0:
+        attackers = generator.sample(range(bench), generator.randint(1, bench))
+        actions.actionType[g] = Actions.ATTACK
+        actions.lanes[g, :len(attackers)] = attackers
+        return (game.Game.prepare_attack, (attackers,))
+
+    actions.actionType[g] = Actions.PASS
+    return (game.Game.pass_turn, ())
+
+def differential_test_games(games = 200, steps = 400, seed = 0, \
+                            decks = ("decks/spell_speeds.deck", "decks/multi_burst.deck")):
+    """
+    Plays random games on Game objects and on a BatchedGame side by side, and returns the
+    number of games whose states differ. A game stops being compared once the batch says it's
+    over, or once the Game draws from an empty deck, which ends the game like in
+    agent.apply_move. Any other exception from the Game is raised, and a deck with a card
+    BatchedGame can't play raises BatchError before anything is played
+    """
+    sim = simulator.Simulator()
+    generator = random.Random(seed)
+    gameObjects = [sim.new_game(list(decks)) for i in range(games)]
+    batchedGame = BatchedGame(sim.cardMap, list(decks), games)
+    table = batchedGame.table
+    actions = batchedGame.create_actions()
+    live = [True] * games
+    defending = [False] * games
+    mismatches = set()
+
+    for step in range(steps):
+        actions.clear()
+        commands = [None] * games
+        for g in range(games):
+            if live[g]:
+                commands[g] = random_action(gameObjects[g], generator, actions, g, defending[g])
+        batchedGame.step(actions)
+
+        for g in range(games):
+            if not live[g]:
+                continue
+            function, arguments = commands[g]
+            deckSizes = [len(player.deck) for player in gameObjects[g].players]
+            try:
+                function(gameObjects[g], *arguments)
+            except IndexError:
+                # Drawing from an empty deck ends the game, the same as agent.apply_move
+                if (all(deckSize != 0 for deckSize in deckSizes)):
+                    raise
+                live[g] = False
+                continue
+            defending[g] = function == game.Game.prepare_attack and gameObjects[g].attackPhase
+            if batchedGame.done[g]:
+                live[g] = False
+            elif game_state(gameObjects[g], table) != batched_state(batchedGame, g):
+                mismatches.add(g)
+                live[g] = False
+    return len(mismatches)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Batched rules differential tests")
+    parser.add_argument("-n", "--games", type = int, default = 5000)
+    parser.add_argument("--seed", type = int, default = 0)
+    arguments = parser.parse_args()
+    mismatches = differential_test(arguments.games, arguments.seed)
+    print("combat: %d games, %d mismatches" % (arguments.games, mismatches))
+    games = max(1, arguments.games // 25)
+    mismatches = differential_test_games(games, seed = arguments.seed)
+    print("BatchedGame: %d games, %d mismatches" % (games, mismatches))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,731 @@
+"""
+Benchmarks for the parts of the engine which search and batch simulation lean on. Each
+benchmark builds its own game states from the command scripts in testing/, times the
+operations, and prints one line per measurement.
+
+Usage:
+    python benchmark.py                 runs every benchmark
+    python benchmark.py snapshot        runs only the named benchmarks
+"""
+import argparse
+import copy
+import itertools
+import pickle
+import time
+import tracemalloc
+import blocking
+import game
+import helper
+import simulator
+
+SCRIPT = "testing/multiple_burst"
+
+def time_function(function, repeats):
+    """
+    Calls function() repeatedly and returns the mean time per call, in seconds
+    """
+    start = time.perf_counter()
+    for i in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+def report(label, seconds, baseline = None):
+    line = "\t%-24s %10.2f us" % (label, seconds * 1e6)
+    if (baseline != None):
+        line += "  (%.1fx)" % (baseline / seconds)
+    print(line)
+
+def build_game(fileName = SCRIPT):
+    """
+    Plays a script headlessly and returns the resulting game object
+    """
+    sim = simulator.Simulator()
+    return sim.run_script(simulator.parse_script(fileName))
+
+def benchmark_snapshot(repeats = 2000):
+    """
+    Copying a game: Game.snapshot()/restore() against copy.deepcopy and pickle
+    """
+    gameObject = build_game()
+    print("snapshot (%s)" % SCRIPT)
+
+    deepcopyTime = time_function(lambda: copy.deepcopy(gameObject), repeats // 10)
+    report("deepcopy", deepcopyTime)
+    pickleTime = time_function(lambda: pickle.loads(pickle.dumps(gameObject)), repeats // 10)
+    report("pickle dumps+loads", pickleTime, deepcopyTime)
+
+    snapshotTime = time_function(gameObject.snapshot, repeats)
+    report("snapshot", snapshotTime, deepcopyTime)
+    snapshot = gameObject.snapshot()
+    restoreTime = time_function(lambda: gameObject.restore(snapshot), repeats)
+    report("restore", restoreTime, deepcopyTime)
+
+    def restore_and_rebuild():
+        gameObject.restore(snapshot)
+        gameObject.ensure_observers()
+    rebuildTime = time_function(restore_and_rebuild, repeats)
+    report("restore + rebuild", rebuildTime, deepcopyTime)
+
+def benchmark_decks(games = 200):
+    """
+    Building decks: shared card templates against deep copying a prototype card, which is
+    what CardMapper.get_card used to do
+    """
+    sim = simulator.Simulator()
+    deckFile = "decks/spell_speeds.deck"
+    with open(deckFile, "r") as file:
+        names = [line.rstrip() for line in file]
+    prototypes = dict()
+    for name in names:
+        prototypes[name] = sim.cardMap.get_card(name)
+    print("decks (%s, %d games)" % (deckFile, games))
+
+    def build_deepcopy():
+        return [[copy.deepcopy(prototypes[name]) for name in names] for i in range(2)]
+    def build_template():
+        return [[sim.cardMap.get_card(name) for name in names] for i in range(2)]
+
+    deepcopyTime = time_function(build_deepcopy, games)
+    report("deepcopy per game", deepcopyTime)
+    templateTime = time_function(build_template, games)
+    report("template per game", templateTime, deepcopyTime)
+
+    for label, function in (("deepcopy", build_deepcopy), ("template", build_template)):
+        tracemalloc.start()
+        decks = [function() for i in range(games)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print("\t%-24s %10.1f KiB per game" % (label + " memory", size / 1024 / games))
+
+def benchmark_targets(repeats = 20000):
+    """
+    Bench notifications: both hands full of targeted spells, then a minion enters and leaves
+    the bench. Every spell reads the same shared view, so the bench only notifies one observer
+    """
+    sim = simulator.Simulator()
+    gameObject = sim.new_game(["decks/default.deck", "decks/default.deck"])
+    for player in gameObject.players:
+        for i in range(10):
+            player.deck.append(sim.cardMap.get_card("burst buff"))
+            player.deck[-1].owner = player.playerNumber
+            player.draw_card(gameObject)
+    bench = gameObject.players[0].bench
+    minion = gameObject.players[0].deck[0]
+    print("targets (10 targeted spells in each hand)")
+    print("\t%-24s %10d" % ("bench observers", len(bench.targetObservers)))
+
+    def enter_and_leave():
+        bench.append(minion)
+        bench.remove_object(minion)
+    report("bench append + remove", time_function(enter_and_leave, repeats))
+
+def benchmark_zones(repeats = 20000):
+    """
+    Zone removal: removing and re-adding a card in the middle of an IndexedList against a
+    plain list, for growing zone sizes. The IndexedList should stay flat
+    """
+    print("zones (remove from the middle + append)")
+    for size in (10, 100, 1000):
+        values = [object() for i in range(size)]
+        middle = values[size // 2]
+        plainList = list(values)
+        indexedList = helper.IndexedList(values)
+
+        def plain_remove():
+            plainList.remove(middle)
+            plainList.append(middle)
+        def indexed_remove():
+            indexedList.remove(middle)
+            indexedList.append(middle)
+        plainTime = time_function(plain_remove, repeats)
+        report("list, %d cards" % size, plainTime)
+        report("IndexedList, %d cards" % size, time_function(indexed_remove, repeats), \
+               plainTime)
+
+def benchmark_moves(repeats = 20000):
+    """
+    Move queries: Game.list_all_moves asked again with nothing changed, which hits the cached
+    playable mask and target lists, against a query right after the hand changed
+    """
+    sim = simulator.Simulator()
+    print("moves (list_all_moves)")
+    for handSize in (10, 40):
+        gameObject = sim.new_game(["decks/default.deck", "decks/default.deck"])
+        player = gameObject.players[0]
+        for i in range(handSize):
+            player.deck.append(sim.cardMap.get_card(("burst buff", "dummy")[i % 2]))
+            player.deck[-1].owner = 0
+            player.draw_card(gameObject)
+        hand = player.hand.list
+
+        def changed():
+            hand.append(hand.pop())
+            gameObject.list_all_moves()
+        changedTime = time_function(changed, repeats)
+        report("changed, %d cards" % handSize, changedTime)
+        report("unchanged, %d cards" % handSize, \
+               time_function(gameObject.list_all_moves, repeats), changedTime)
+
+def benchmark_options(repeats = 200):
+    """
+    Playable options of a multi-target card: building the full list of combinations against
+    counting them and fetching one by index, which is what a random sampler needs
+    """
+    import random
+    import targeting
+    generator = random.Random(0)
+    print("options (pick 3 targets)")
+    for targetCount in (10, 40):
+        selector = targeting.Player(3)
+        targetArray = list(range(targetCount))
+        def sample():
+            count = selector.count_playable_options(targetArray)
+            return selector.get_playable_option(targetArray, generator.randrange(count))
+        listTime = time_function(lambda: selector.list_playable_options(targetArray), repeats)
+        report("list, %d targets" % targetCount, listTime)
+        report("count+unrank, %d targets" % targetCount, time_function(sample, repeats), \
+               listTime)
+
+def benchmark_observation(repeats = 20000, games = 256):
+    """
+    Observation encoding: one game into a preallocated Observation, and a batch of games
+    into the rows of one Observation
+    """
+    import observation
+    gameObject = build_game()
+    encoder = observation.ObservationEncoder(gameObject.cardMap)
+    buffers = encoder.create_observation()
+    print("observation (%s)" % SCRIPT)
+    report("encode", time_function(lambda: encoder.encode(gameObject, buffers), repeats))
+
+    gameObjects = [build_game() for i in range(games)]
+    batchBuffers = encoder.create_observation(games)
+    batchTime = time_function(lambda: encoder.encode_batch(gameObjects, batchBuffers), \
+                              repeats // games)
+    report("encode_batch per game", batchTime / games)
+
+def benchmark_hashing(games = 2000, repeats = 20000):
+    """
+    State hashing: replaying a script with hashing disabled and enabled, and the incremental
+    hash against recomputing it from scratch
+    """
+    sim = simulator.Simulator()
+    script = simulator.parse_script(SCRIPT)
+    print("hashing (%s)" % SCRIPT)
+
+    def replay(hashing):
+        gameObject = sim.new_game(script.decks)
+        if (hashing):
+            gameObject.enable_hashing()
+        for commandName, function, arguments in script.commands:
+            function(gameObject, *arguments)
+            if (hashing):
+                gameObject.state_hash()
+    disabledTime = time_function(lambda: replay(False), games)
+    report("replay, hashing off", disabledTime)
+    report("replay, hash every move", time_function(lambda: replay(True), games), disabledTime)
+
+    gameObject = build_game()
+    gameObject.enable_hashing()
+    computeTime = time_function(gameObject.compute_hash, repeats)
+    report("compute_hash", computeTime)
+    bench = gameObject.players[0].bench
+    minion = bench.list[0]
+    def change_and_hash():
+        minion.defense += 1
+        gameObject.hasher.touch(minion)
+        gameObject.state_hash()
+    report("one change + state_hash", time_function(change_and_hash, repeats), computeTime)
+
+def benchmark_saves(repeats = 2000):
+    """
+    Save files: savestate.save_game/load_game against pickle, in time and in size
+    """
+    import savestate
+    sim = simulator.Simulator()
+    gameObject = build_game()
+    print("saves (%s)" % SCRIPT)
+
+    pickleData = pickle.dumps(gameObject)
+    saveData = savestate.save_game(gameObject)
+    print("\t%-24s %10d bytes" % ("pickle size", len(pickleData)))
+    print("\t%-24s %10d bytes  (%.1fx)" % ("save size", len(saveData), \
+                                           len(pickleData) / len(saveData)))
+
+    pickleTime = time_function(lambda: pickle.dumps(gameObject), repeats)
+    report("pickle dumps", pickleTime)
+    report("save_game", time_function(lambda: savestate.save_game(gameObject), repeats), \
+           pickleTime)
+    pickleTime = time_function(lambda: pickle.loads(pickleData), repeats)
+    report("pickle loads", pickleTime)
+    report("new_game from save", \
+           time_function(lambda: savestate.new_game(saveData, sim.cardMap), repeats), \
+           pickleTime)
+    report("load_game into a game", \
+           time_function(lambda: savestate.load_game(saveData, gameObject), repeats), \
+           pickleTime)
+
+def benchmark_replay(games = 50, seeks = 200):
+    """
+    Action logs: recording random games, replaying them, and seeking to random actions with
+    checkpoints against replaying from the start every time. The replayed games are checked
+    against saves of the games as they were played
+    """
+    import actionlog
+    import agent
+    import random
+    import savestate
+    sim = simulator.Simulator()
+    generator = random.Random(0)
+    decks = ["decks/spell_speeds.deck", "decks/multi_burst.deck"]
+    print("replay (%d random games)" % games)
+
+    def play(seed, record, states = None):
+        # The same seeds are played with and without recording. states, if given, gets the
+        # save of the game after every action, by the number of actions logged
+        moveGenerator = random.Random(seed)
+        gameObject = sim.new_game(decks)
+        if (record):
+            actionlog.record_game(gameObject, seed)
+        if (states != None):
+            states[0] = savestate.save_game(gameObject)
+        for i in range(2000):
+            move = moveGenerator.choice(agent.list_moves(gameObject))
+            winner = agent.apply_move(gameObject, move)
+            if (states != None):
+                states[gameObject.actionLog.count] = savestate.save_game(gameObject)
+            if (winner != None):
+                break
+        return gameObject.actionLog
+    start = time.perf_counter()
+    for seed in range(games):
+        play(seed, False)
+    playTime = (time.perf_counter() - start) / games
+    report("play, not recording", playTime)
+    start = time.perf_counter()
+    logs = [play(seed, True) for seed in range(games)]
+    report("play, recording", (time.perf_counter() - start) / games, playTime)
+    actionCount = sum(actionLog.count for actionLog in logs)
+    print("\t%-24s %10.1f bytes per action" % \
+          ("log size", sum(len(actionLog.to_bytes()) for actionLog in logs) / actionCount))
+
+    start = time.perf_counter()
+    replayed = [actionlog.Replayer(actionLog, sim.cardMap).replay() for actionLog in logs]
+    replayTime = time.perf_counter() - start
+    report("replay per game", replayTime / games)
+    print("\t%-24s %10.0f actions/sec" % ("replay speed", actionCount / replayTime))
+
+    # The replays are checked against the games played again with a save after every action
+    mismatches = 0
+    for seed in range(games):
+        states = dict()
+        play(seed, True, states)
+        if (savestate.save_game(replayed[seed]) != states[logs[seed].count]):
+            mismatches += 1
+    if (mismatches != 0):
+        print("\tMISMATCH between %d replayed games and the games played" % mismatches)
+
+    longest = max(range(games), key = lambda seed: logs[seed].count)
+    actionLog = logs[longest]
+    states = dict()
+    play(longest, True, states)
+    positions = [generator.choice(list(states)) for i in range(seeks)]
+    for label, interval in (("seek from the start", actionLog.count + 1), \
+                            ("seek, checkpoints", 32)):
+        replayer = actionlog.Replayer(actionLog, sim.cardMap, interval)
+        replayer.replay()
+        start = time.perf_counter()
+        for position in positions:
+            replayer.seek(position)
+        report("%s" % label, (time.perf_counter() - start) / seeks)
+        mismatches = sum(savestate.save_game(replayer.seek(position)) != states[position] \
+                         for position in positions)
+        if (mismatches != 0):
+            print("\tMISMATCH between %d of the seeks and the games played" % mismatches)
+
+def benchmark_archive(games = 400):
+    """
+    Game archives: finding the games in which a card was played on a turn with the indexes
+    and the event columns, against decoding and replaying every game in the archive
+    """
+    import actionlog
+    import agent
+    import archive
+    import os
+    import random
+    import tempfile
+    sim = simulator.Simulator()
+    deckPairs = [["decks/spell_speeds.deck", "decks/multi_burst.deck"], \
+                 ["decks/buff.deck", "decks/default.deck"]]
+    print("archive (%d random games)" % games)
+    fileName = os.path.join(tempfile.mkdtemp(), "games.lorc")
+    writer = archive.ArchiveWriter(fileName, sim.cardMap, chunkSize = 64)
+    start = time.perf_counter()
+    for seed in range(games):
+        decks = deckPairs[seed % len(deckPairs)]
+        moveGenerator = random.Random(seed)
+        gameObject = sim.new_game(decks)
+        actionLog = actionlog.record_game(gameObject, seed)
+        winner = None
+        for i in range(2000):
+            move = moveGenerator.choice(agent.list_moves(gameObject))
+            winner = agent.apply_move(gameObject, move)
+            if (winner != None):
+                break
+        writer.add_game(actionLog, decks, winner)
+    writer.close()
+    report("play and add per game", (time.perf_counter() - start) / games)
+    print("\t%-24s %10.1f KB" % ("archive size", os.path.getsize(fileName) / 1024))
+
+    gameArchive = archive.Archive(fileName)
+    def decode_all():
+        found = []
+        for gameNumber in range(gameArchive.count):
+            replayer = actionlog.Replayer(gameArchive.get_log(gameNumber), sim.cardMap, \
+                                          games * 2000)
+            gameObject = replayer.gameObject
+            turn = 1
+            for function, arguments in replayer.actions:
+                attackingPlayer = gameObject.attackingPlayer
+                if (function == game.Game.play_card and turn == 2 and \
+                    gameObject.players[gameObject.activePlayer].hand.list[arguments[0]].name \
+                    == "burst buff"):
+                    found.append(gameNumber)
+                    break
+                replayer.step()
+                if (gameObject.attackingPlayer != attackingPlayer):
+                    turn += 1
+                if (turn > 2):
+                    break
+        return found
+    decodeTime = time_function(decode_all, 1)
+    report("decode and replay all", decodeTime)
+    queryTime = time_function(lambda: gameArchive.games_with_play("burst buff", 2), 200)
+    report("indexed query", queryTime, decodeTime)
+    found = gameArchive.games_with_play("burst buff", 2)
+    if (list(found) != decode_all()):
+        print("\tMISMATCH between the indexed query and decoding")
+    print("\t%-24s %10d games" % ("burst buff on turn 2", len(found)))
+    gameArchive.close()
+    os.remove(fileName)
+    os.rmdir(os.path.dirname(fileName))
+
+def benchmark_cardstats(games = 300):
+    """
+    Card statistics: random games with and without the collector, on the same seeds. The
+    combat counters are always updated, so this measures start_game and end_game
+    """
+    import agent
+    import cardstats
+    import random
+    sim = simulator.Simulator()
+    decks = ["decks/spell_speeds.deck", "decks/multi_burst.deck"]
+    stats = cardstats.CardStats(sim.cardMap.cardDatabase)
+    print("cardstats (%d random games)" % games)
+
+    def play(collect):
+        # Returns the time per game, and the part of it spent in the collector
+        start = time.perf_counter()
+        collectTime = 0.0
+        for seed in range(games):
+            moveGenerator = random.Random(seed)
+            gameObject = sim.new_game(decks)
+            collectStart = time.perf_counter()
+            if (collect):
+                stats.start_game(gameObject)
+            collectTime += time.perf_counter() - collectStart
+            winner = None
+            for i in range(2000):
+                winner = agent.apply_move(gameObject, \
+                                          moveGenerator.choice(agent.list_moves(gameObject)))
+                if (winner != None):
+                    break
+            collectStart = time.perf_counter()
+            if (collect):
+                stats.end_game(gameObject, winner)
+            collectTime += time.perf_counter() - collectStart
+        return (time.perf_counter() - start) / games, collectTime / games
+    playTime, unused = play(False)
+    report("play, not collecting", playTime)
+    totalTime, collectTime = play(True)
+    report("play, collecting", totalTime, playTime)
+    report("collector per game", collectTime)
+    print("\t%-24s %10.1f %%" % ("collector share", collectTime / totalTime * 100))
+
+def brute_force_block(solver, attackers, bench):
+    """
+    The best block by trying every one, to check blocking.BlockSolver against
+    """
+    bestValue = None
+    for block in itertools.product([None] + list(range(len(bench))), repeat = len(attackers)):
+        blockers = [cardNumber for cardNumber in block if cardNumber != None]
+        if (len(blockers) != len(set(blockers))):
+            continue
+        value = solver.block_value(attackers, bench, block)
+        if (bestValue == None or value > bestValue):
+            bestValue = value
+    return bestValue
+
+def benchmark_stopping(runs = 200, cap = 100000):
+    """
+    Tournament stop rules on made up pairs with known win, tie and loss chances, with and
+    without ties: how many games each rule plays before it decides, and how often it decides
+    other than the chances say. Some wrong decisions are expected, the error rates of the
+    rules, but every pair has to be decided before the cap
+    """
+    import agent
+    import random
+    import tournament
+    # (label, win, tie, loss, the decision expected with a 5% margin)
+    pairs = [("70% wins", 0.7, 0.0, 0.3, tournament.FIRST), \
+             ("30% wins", 0.3, 0.0, 0.7, tournament.SECOND), \
+             ("even, no ties", 0.5, 0.0, 0.5, tournament.EVEN), \
+             ("even, 98% ties", 0.0115, 0.9815, 0.007, tournament.EVEN), \
+             ("60% score, 60% ties", 0.4, 0.4, 0.2, tournament.FIRST)]
+    rules = [("ci", tournament.ConfidenceStop()), ("sprt", tournament.SPRTStop(minGames = 100))]
+    generator = random.Random(0)
+    print("stopping (%d runs per pair, at most %d games)" % (runs, cap))
+    for label, win, tie, loss, expected in pairs:
+        for ruleName, rule in rules:
+            games = 0
+            wrong = 0
+            undecided = 0
+            for run in range(runs):
+                result = tournament.MatchupResult(0)
+                decision = None
+                while (decision == None and result.games < cap):
+                    # Blocks of 20, as the tournament plays them
+                    for i in range(20):
+                        draw = generator.random()
+                        if (draw < win):
+                            result.record(0)
+                        elif (draw < win + tie):
+                            result.record(agent.TIE)
+                        else:
+                            result.record(1)
+                    decision = rule.decide(result)
+                games += result.games
+                if (decision == None):
+                    undecided += 1
+                elif (decision != expected):
+                    wrong += 1
+            print("\t%-20s %-4s %10.0f games %6.1f%% wrong" % \
+                  (label, ruleName, games / runs, 100.0 * wrong / runs))
+            if (undecided != 0):
+                print("\tUNDECIDED %d of %d runs after %d games" % (undecided, runs, cap))
+
+def benchmark_blocking(problems = 50):
+    """
+    Choosing blockers: blocking.BlockSolver, optimal and greedy, at a full bench and beyond,
+    and brute force where it's still practical. Each line is the time per block
+    """
+    import random
+    sim = simulator.Simulator()
+    generator = random.Random(0)
+    def random_minion():
+        minion = sim.cardMap.get_card(generator.choice(["dummy", "another dummy"]))
+        minion.attack = generator.randint(0, 6)
+        minion.defense = generator.randint(1, 6)
+        minion.quickAttack = generator.random() < 0.3
+        return minion
+
+    optimal = blocking.BlockSolver()
+    greedy = blocking.BlockSolver(method = blocking.GREEDY)
+    fullBench = game.Game.MAX_BENCHED_CARDS
+    for size in (fullBench, 2 * fullBench, 4 * fullBench):
+        cases = [([random_minion() for i in range(size)], \
+                  [random_minion() for i in range(size)]) for j in range(problems)]
+        print("blocking (%d attackers, %d on the bench)" % (size, size))
+        start = time.perf_counter()
+        blocks = [optimal.solve(attackers, bench) for attackers, bench in cases]
+        optimalTime = (time.perf_counter() - start) / problems
+        report("hungarian", optimalTime)
+        start = time.perf_counter()
+        greedyBlocks = [greedy.solve(attackers, bench) for attackers, bench in cases]
+        report("greedy", (time.perf_counter() - start) / problems, optimalTime)
+
+        gap = 0
+        for i in range(problems):
+            attackers, bench = cases[i]
+            gap += optimal.block_value(attackers, bench, blocks[i]) - \
+                   optimal.block_value(attackers, bench, greedyBlocks[i])
+        print("\t%-24s %10.2f" % ("greedy score gap", gap / problems))
+
+        if (size <= fullBench):
+            bruteProblems = max(1, problems // 10)
+            start = time.perf_counter()
+            mismatches = 0
+            for attackers, bench in cases[:bruteProblems]:
+                best = brute_force_block(optimal, attackers, bench)
+                if (best != optimal.block_value(attackers, bench, \
+                                                optimal.solve(attackers, bench))):
+                    mismatches += 1
+            report("brute force", (time.perf_counter() - start) / bruteProblems, optimalTime)
+            print("\t%-24s %10d" % ("hungarian not optimal", mismatches))
+
+def benchmark_prediction(games = 2000):
+    """
+    Combat prediction: combat.predict_combat against playing the combat with
+    Game.perform_all_attacks and restoring a snapshot, on random full frontlines
+    """
+    import batch
+    import combat
+    import random
+    sim = simulator.Simulator()
+    generator = random.Random(0)
+    gameObjects = [batch.random_combat(sim.cardMap, generator) for i in range(games)]
+    snapshots = [gameObject.snapshot() for gameObject in gameObjects]
+    frontlines = [(gameObject.players[gameObject.attackingPlayer].frontline.list, \
+                   gameObject.players[gameObject.defendingPlayer].frontline.list) \
+                  for gameObject in gameObjects]
+    print("prediction (%d random frontlines)" % games)
+
+    start = time.perf_counter()
+    for i in range(games):
+        gameObjects[i].perform_all_attacks()
+        gameObjects[i].restore(snapshots[i])
+    playTime = (time.perf_counter() - start) / games
+    report("play + restore", playTime)
+
+    start = time.perf_counter()
+    for attackingFrontline, defendingFrontline in frontlines:
+        combat.predict_combat(attackingFrontline, defendingFrontline)
+    report("predict_combat", (time.perf_counter() - start) / games, playTime)
+
+def benchmark_combat(games = 5000):
+    """
+    Combat: resolve_combat on frontlines which are already arrays, as BatchedGame keeps them,
+    against calling Game.perform_all_attacks on each game. Reading the frontlines out of the
+    Game objects is timed too, since a batched path for Game objects would pay it, and the
+    cost of writing every result back, on top of resolving. Needs NumPy, so batch is only
+    imported here
+    """
+    import batch
+    import random
+    sim = simulator.Simulator()
+    generator = random.Random(0)
+    gameObjects = [batch.random_combat(sim.cardMap, generator) for i in range(games)]
+    print("combat (%d random frontlines)" % games)
+
+    start = time.perf_counter()
+    combatBatch = batch.CombatBatch(gameObjects)
+    extractTime = (time.perf_counter() - start) / games
+
+    start = time.perf_counter()
+    for gameObject in gameObjects:
+        gameObject.perform_all_attacks()
+    scalarTime = (time.perf_counter() - start) / games
+    report("scalar per game", scalarTime)
+    report("resolve_combat per game", \
+           time_function(lambda: batch.resolve_combat(combatBatch), 20) / games, scalarTime)
+    report("reading Game objects", extractTime)
+
+def benchmark_lockstep(games = 2000, steps = 300):
+    """
+    Lockstep simulation: a BatchedGame stepping every game at once, against stepping Game
+    objects one at a time. Both play the same kind of random policy (play a random playable
+    card, sometimes attack with the whole bench, block the first lanes, otherwise pass)
+    """
+    import batch
+    import numpy as np
+    import random
+    sim = simulator.Simulator()
+    decks = ["decks/spell_speeds.deck", "decks/multi_burst.deck"]
+    print("lockstep (%d games, %d steps)" % (games, steps))
+
+    scalarGames = games // 20
+    generator = random.Random(0)
+    gameObjects = [sim.new_game(decks) for i in range(scalarGames)]
+    actions = batch.Actions(scalarGames, 32)
+    defending = [False] * scalarGames
+    start = time.perf_counter()
+    gameSteps = 0
+    for step in range(steps):
+        for g in range(scalarGames):
+            if gameObjects[g] == None:
+                continue
+            function, arguments = batch.random_action(gameObjects[g], generator, actions, g, \
+                                                      defending[g])
+            try:
+                function(gameObjects[g], *arguments)
+            except IndexError:
+                gameObjects[g] = None
+                continue
+            defending[g] = function == game.Game.prepare_attack and gameObjects[g].attackPhase
+            gameSteps += 1
+    scalarTime = (time.perf_counter() - start) / gameSteps
+    report("Game per step", scalarTime)
+
+    generator = np.random.default_rng(0)
+    batchedGame = batch.BatchedGame(sim.cardMap, decks, games)
+    actions = batchedGame.create_actions()
+    rows = np.arange(games)
+    lanes = np.arange(batchedGame.capacity)[None, :]
+    defending = np.zeros(games, dtype = bool)
+    start = time.perf_counter()
+    gameSteps = 0
+    for step in range(steps):
+        actions.clear()
+        choice = generator.random(games)
+        playable = batchedGame.playable_cards()
+        keys = np.where(playable, generator.random(playable.shape), -1.0)
+        actions.card[:] = np.argmax(keys, axis = 1)
+        benchSize = batchedGame.benchSize[rows, batchedGame.activePlayer]
+        targets = np.maximum(benchSize, batchedGame.benchSize[rows, 1 - batchedGame.activePlayer])
+        actions.target[:] = np.where(targets > 0, (choice * 997).astype(np.int32) % \
+                                     np.maximum(targets, 1), -1)
+        canAttack = (batchedGame.activePlayer == batchedGame.attackingPlayer) & \
+                    batchedGame.attackToken & ~batchedGame.attackPhase & (benchSize > 0)
+
+        actionType = np.full(games, batch.Actions.PASS, dtype = np.int32)
+        actionType[(choice < 0.8) & canAttack] = batch.Actions.ATTACK
+        actionType[(choice < 0.6) & playable.any(axis = 1)] = batch.Actions.PLAY
+        actionType[defending] = batch.Actions.DEFEND
+        actions.actionType[:] = actionType
+        attackLanes = lanes < benchSize[:, None]
+        actions.lanes[:] = np.where(attackLanes, lanes, -1)
+        defenseSize = batchedGame.benchSize[rows, 1 - batchedGame.attackingPlayer]
+        defenseLanes = (lanes < defenseSize[:, None]) & (lanes < (choice * 4)[:, None])
+        actions.lanes[defending] = np.where(defenseLanes, lanes, -1)[defending]
+
+        gameSteps += int(np.sum(~batchedGame.done))
+        batchedGame.step(actions)
+        defending = (actionType == batch.Actions.ATTACK) & batchedGame.attackPhase
+    batchedTime = (time.perf_counter() - start) / gameSteps
+    report("BatchedGame per step", batchedTime, scalarTime)
+    print("\t%-24s %10d of %d" % ("games finished", int(batchedGame.done.sum()), games))
+
+BENCHMARKS = {
+    "snapshot": benchmark_snapshot,
+    "decks": benchmark_decks,
+    "targets": benchmark_targets,
+    "zones": benchmark_zones,
+    "moves": benchmark_moves,
+    "options": benchmark_options,
+    "observation": benchmark_observation,
+    "hashing": benchmark_hashing,
+    "saves": benchmark_saves,
+    "replay": benchmark_replay,
+    "archive": benchmark_archive,
+    "cardstats": benchmark_cardstats,
+    "stopping": benchmark_stopping,
+    "blocking": benchmark_blocking,
+    "prediction": benchmark_prediction,
+    "combat": benchmark_combat,
+    "lockstep": benchmark_lockstep,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description = "Engine benchmarks")
+    parser.add_argument("names", nargs = "*", help = "benchmarks to run: " + \
+                        ", ".join(BENCHMARKS))
+    arguments = parser.parse_args()
+
+    names = arguments.names
+    if (len(names) == 0):
+        names = list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Choosing blockers. Player.prepare_defenders takes a list of (bench index, lane) pairs, and
+picking them is an assignment problem: every lane of the attack gets at most one blocker,
+and every bench card blocks at most one lane. There are far too many ways to block a full
+frontline to try them all, so the solver scores every (attacker, blocker) pair on its own,
+and finds the best assignment of the score matrix with the Hungarian algorithm in
+O(lanes^2 * (lanes + bench)) time.
+
+Score functions
+A score function is score(attacker, blocker) -> number, where blocker is None for a lane
+left unblocked. The value of a block is the sum of the scores of its lanes, so the scores
+must not depend on each other. Combat is predicted by block_outcome, with combat.py.
+    damage_prevented - the nexus damage each block saves
+    trade_value - the mana cost of the cards each block kills, minus the cards it loses
+    default_score - both of the above, damage first
+
+Lethal attacks
+Nexus damage isn't additive once it kills the defender, so when the best block by the score
+function still lets lethal damage through, the solver solves again with the damage prevented
+weighted above everything else.
+
+BlockSolver
+Solves blocks with a score function, either optimally or greedily
+"""
+import math
+import combat
+
+# Methods of BlockSolver
+OPTIMAL = "optimal"
+GREEDY = "greedy"
+
+# Damage prevented is weighted by this when the defender is facing lethal damage
+LETHAL_WEIGHT = 1000.0
+
+def block_outcome(attacker, blocker):
+    """
+    Predicts one lane of combat with combat.predict_lane
+
+    Parameters:
+        attacker - The attacking minion
+        blocker - The blocking minion, or None if the lane isn't blocked
+
+    Returns:
+        (attacker dies, blocker dies, nexus damage)
+    """
+    if (blocker == None):
+        return False, False, attacker.attack
+    defense, blockerDefense, damage = combat.predict_lane(attacker.attack, attacker.defense, \
+        attacker.quickAttack, blocker.attack, blocker.defense)
+    return defense <= 0, blockerDefense <= 0, damage
+
+def damage_prevented(attacker, blocker):
+    if (blocker == None):
+        return 0
+    return max(attacker.attack, 0)
+
+def trade_value(attacker, blocker):
+    attackerDies, blockerDies, nexusDamage = block_outcome(attacker, blocker)
+    value = 0
+    if (attackerDies):
+        value += attacker.manaCost
+    if (blockerDies):
+        value -= blocker.manaCost
+    return value
+
+def default_score(attacker, blocker):
+    return 10 * damage_prevented(attacker, blocker) + trade_value(attacker, blocker)
+
+def lethal_score(score):
+    """
+    Returns a score function which puts the damage prevented above score
+    """
+    return lambda attacker, blocker: \
+        LETHAL_WEIGHT * damage_prevented(attacker, blocker) + score(attacker, blocker)
+
+def maximum_assignment(matrix):
+    """
+    The Hungarian algorithm, for rectangular matrices with no more rows than columns
+
+    Parameters:
+        matrix - A list of rows, matrix[row][column] is the value of assigning row to column
+
+    Returns:
+        A list of the column assigned to each row, which maximizes the total value
+    """
+    rows = len(matrix)
+    if (rows == 0):
+        return []
+    columns = len(matrix[0])
+    if (rows > columns):
+        raise ValueError("maximum_assignment needs at least as many columns as rows")
+
+    # Minimizes the negated values. Rows and columns are numbered from 1, 0 is a sentinel
+    rowPotential = [0.0] * (rows + 1)
+    columnPotential = [0.0] * (columns + 1)
+    columnRow = [0] * (columns + 1)
+    way = [0] * (columns + 1)
+    for row in range(1, rows + 1):
+        columnRow[0] = row
+        column = 0
+        minimum = [math.inf] * (columns + 1)
+        used = [False] * (columns + 1)
+        while (True):
+            used[column] = True
+            currentRow = columnRow[column]
+            values = matrix[currentRow - 1]
+            delta = math.inf
+            nextColumn = 0
+            for j in range(1, columns + 1):
+                if (used[j]):
+                    continue
+                reduced = -values[j - 1] - rowPotential[currentRow] - columnPotential[j]
+                if (reduced < minimum[j]):
+                    minimum[j] = reduced
+                    way[j] = column
+                if (minimum[j] < delta):
+                    delta = minimum[j]
+                    nextColumn = j
+            for j in range(columns + 1):
+                if (used[j]):
+                    rowPotential[columnRow[j]] += delta
+                    columnPotential[j] -= delta
+                else:
+                    minimum[j] -= delta
+            column = nextColumn
+            if (columnRow[column] == 0):
+                break
+        # Flips the augmenting path
+        while (column != 0):
+            previous = way[column]
+            columnRow[column] = columnRow[previous]
+            column = previous
+
+    assignment = [None] * rows
+    for j in range(1, columns + 1):
+        if (columnRow[j] != 0):
+            assignment[columnRow[j] - 1] = j - 1
+    return assignment
+
+class BlockSolver:
+    """
+    BlockSolver
+    Chooses which bench cards block which lanes. A block is a list with the bench index of the
+    blocker of every lane, None for an unblocked lane (or an empty lane of the attack).
+
+    Member variables:
+        score - The score function, score(attacker, blocker) -> number
+        method - OPTIMAL for the Hungarian algorithm, GREEDY for the best pair first
+    """
+    def __init__(self, score = default_score, method = OPTIMAL):
+        if (method not in (OPTIMAL, GREEDY)):
+            raise ValueError("method must be '%s' or '%s'" % (OPTIMAL, GREEDY))
+        self.score = score
+        self.method = method
+
+    def solve(self, attackers, bench, health = None):
+        """
+        Finds the block with the highest total score
+
+        Parameters:
+            attackers - The attacking frontline, with None for an empty lane
+            bench - The defender's bench
+            health - The defender's nexus health. If given, a block which lets lethal damage
+                through is only returned if no block prevents it
+
+        Returns:
+            The block, a list with an entry for every lane
+        """
+        block = self.solve_with(self.score, attackers, bench)
+        if (health != None and self.nexus_damage(attackers, bench, block) >= health):
+            block = self.solve_with(lethal_score(self.score), attackers, bench)
+        return block
+
+    def solve_with(self, score, attackers, bench):
+        lanes = [lane for lane in range(len(attackers)) if attackers[lane] != None]
+        block = [None] * len(attackers)
+        if (len(lanes) == 0 or len(bench) == 0):
+            return block
+        # gains[i][j] - What blocking lanes[i] with bench[j] is worth, over not blocking it
+        gains = []
+        for lane in lanes:
+            attacker = attackers[lane]
+            unblocked = score(attacker, None)
+            gains.append([score(attacker, blocker) - unblocked for blocker in bench])
+
+        if (self.method == GREEDY):
+            pairs = self.greedy_pairs(gains)
+        else:
+            # One extra "no blocker" column per lane, worth nothing
+            matrix = [row + [0] * len(lanes) for row in gains]
+            assignment = maximum_assignment(matrix)
+            pairs = [(i, assignment[i]) for i in range(len(lanes)) \
+                     if assignment[i] < len(bench)]
+        for i, cardNumber in pairs:
+            # A blocker which isn't worth more than no blocker is left on the bench
+            if (gains[i][cardNumber] > 0):
+                block[lanes[i]] = cardNumber
+        return block
+
+    def greedy_pairs(self, gains):
+        """
+        Takes the pair with the highest gain, until no pair is worth anything
+        """
+        candidates = [(gains[i][j], i, j) for i in range(len(gains)) \
+                      for j in range(len(gains[i])) if gains[i][j] > 0]
+        candidates.sort(reverse = True)
+        usedLanes = set()
+        usedCards = set()
+        pairs = []
+        for gain, i, j in candidates:
+            if (i in usedLanes or j in usedCards):
+                continue
+            usedLanes.add(i)
+            usedCards.add(j)
+            pairs.append((i, j))
+        return pairs
+
+    def block_value(self, attackers, bench, block):
+        """
+        The total score of a block
+        """
+        value = 0
+        for lane in range(len(attackers)):
+            if (attackers[lane] == None):
+                continue
+            blocker = None
+            if (block[lane] != None):
+                blocker = bench[block[lane]]
+            value += self.score(attackers[lane], blocker)
+        return value
+
+    def nexus_damage(self, attackers, bench, block):
+        damage = 0
+        for lane in range(len(attackers)):
+            if (attackers[lane] != None and block[lane] == None):
+                damage += block_outcome(attackers[lane], None)[2]
+        return damage
+
+    def solve_game(self, gameObject):
+        """
+        Solves the block for the defender of a game which is awaiting defense
+
+        Returns:
+            The argument of Game.prepare_defense, [card, lane, card, lane...]
+        """
+        attackers = gameObject.players[gameObject.attackingPlayer].frontline.list
+        defender = gameObject.players[gameObject.defendingPlayer]
+        block = self.solve(attackers, defender.bench.list.as_list(), defender.health)
+        return defense_command(block)
+
+    pass
+
+def defense_command(block):
+    """
+    Turns a block into the [card, lane, card, lane...] list Game.prepare_defense takes
+    """
+    defenders = []
+    for lane in range(len(block)):
+        if (block[lane] != None):
+            defenders += [block[lane], lane]
+    return defenders
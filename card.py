@@ -2,6 +2,10 @@
 This module implements cards. It has a card base class from which all other types of cards
 inherit.
 
+CardTemplate
+The immutable definition of a card (name, cost, base stats, effect). Every copy of a card in
+every deck shares the same template, and only keeps its own state (current stats, owner, etc.)
+
 Card
 Base class for cards. Minion, hero, and spell cards inherit from this
 
@@ -18,7 +22,7 @@ CardMapper
 Maps all the cards from the JSON file, into a dictionary database. Factory for cards.
 """
 import json
-import copy
+import pickle
 import effect
 import pdb
 import enum
@@ -28,12 +32,57 @@ class Speed(enum.Enum):
     FAST = 1
     SLOW = 2
 
+class CardTemplate:
+    """
+    CardTemplate
+    The definition of a card, as read from the database. It is shared by every card instance
+    with the same name, so it must never be modified once the database is filled. This is
+    what lets us build decks without copying the whole effect/ targeter/ selector graph for
+    every card.
+
+    member variables:
+        cardClass - The class of the card instances (Minion, Spell, Hero)
+        name - The name of the card
+        manaCost - The mana cost of the card
+        speed - The speed of the card (burst, fast, slow)
+        attack - The base attack of the card, 0 for spells
+        defense - The base defense of the card, 0 for spells
+        playEffect - The effect definition. Each card instance gets its own binding of it,
+            see Effect.create_instance
+    """
+    def __init__(self, cardClass, name, manaCost, speed = Speed.SLOW, attack = 0, \
+                 defense = 0, playEffect = None):
+        self.cardClass = cardClass
+        self.name = name
+        self.manaCost = manaCost
+        self.speed = speed
+        self.attack = attack
+        self.defense = defense
+        self.playEffect = playEffect
+
+    def create_card(self):
+        """
+        Creates a new card instance from the template
+        """
+        return self.cardClass(self)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    pass
+
 class Card:
     """
     Card
     The base object for all cards: minions, heroes, spells, etc.
 
     member variables:
+        template
+            The shared definition of the card. name, manaCost and speed are read from it
+
         manaCost
             The mana cost of the card. Players expend this mana to play the card
 
@@ -41,7 +90,8 @@ class Card:
             The name of the card
 
         playEffect
-            The effect which occurs when the card is played
+            The effect which occurs when the card is played. This is the card's own binding
+            of the effect in the template, made the first time playEffect is read
 
         Owner
             The owner of the card (either 0 or 1, as it's a 1v1 game)
@@ -58,23 +108,81 @@ class Card:
             to play the card
 
     """
-    def __init__(self, name, manaCost):
-        self.manaCost = manaCost
-        self.name = name
-        self.playEffect = None
+    def __init__(self, template):
+        self.template = template
         self.owner = -1
-        self.speed = Speed.SLOW
         self.inPhase = True
         self.enoughMana = True
 
+    def __getattr__(self, name):
+        """
+        Only called for attributes the card doesn't have. Most cards spend the game in a deck,
+        where nothing reads their effect, so the binding is made when playEffect is first read
+        instead of when the card is made
+        """
+        if (name == "playEffect" and "template" in self.__dict__):
+            self.bind_effect()
+            return self.playEffect
+        raise AttributeError("%r object has no attribute %r" % (type(self).__name__, name))
+
+    def bind_effect(self):
+        """
+        Gives the card its own binding of the template's effect
+        """
+        self.playEffect = None
+        if (self.template.playEffect != None):
+            self.playEffect = self.template.playEffect.create_instance()
+
+    def __getstate__(self):
+        """
+        The card's effect only holds its targets, which are derived from the zones, so it
+        isn't pickled. An unpickled card makes a new binding when its effect is first read
+        """
+        state = self.__dict__.copy()
+        state.pop("playEffect", None)
+        return state
+
+    def __setstate__(self, state):
+        if ("template" not in state):
+            # Cards were pickled whole before they shared a CardTemplate
+            raise pickle.UnpicklingError("unsupported legacy pickle: the card %r has no " \
+                                         "template" % state.get("name"))
+        self.__dict__.update(state)
+
+    @property
+    def name(self):
+        return self.template.name
+
+    @property
+    def manaCost(self):
+        return self.template.manaCost
+
+    @property
+    def speed(self):
+        return self.template.speed
+
     def __copy__(self):
-        pass
-    
+        """
+        A copy of a card is a fresh card made from the same template
+        """
+        ret = self.template.create_card()
+        ret.owner = self.owner
+        return ret
+
     def get_targets(self):
-        return self.playEffect.targetArray
+        return self.playEffect.targeter.targetArray
 
     def list_playable_options(self):
-        self.playEffect.list_playable_options()
+        return self.playEffect.list_playable_options()
+
+    def count_playable_options(self):
+        return self.playEffect.count_playable_options()
+
+    def iter_playable_options(self):
+        return self.playEffect.iter_playable_options()
+
+    def get_playable_option(self, optionIndex):
+        return self.playEffect.get_playable_option(optionIndex)
 
     def play(self, gameObject, target = None):
         """
@@ -108,9 +216,41 @@ class Card:
             self.playEffect.subscribe(gameObject, self.owner)
         pass
 
+    def deactivate(self, gameObject):
+        """
+        deactivate()
+            parameters:
+                gameObject - the game object, which stores the game state
+        Tells the card to stop tracking its targets. Called whenever the card leaves the
+        hand, so played and dead cards stop receiving notifications
+        """
+        if (self.playEffect != None):
+            self.playEffect.unsubscribe(gameObject)
+
+    def reset_targets(self):
+        """
+        Forgets all of the targets the card has been tracking. Used when the observers are
+        rebuilt from scratch, i.e. after restoring a snapshot
+        """
+        if (self.playEffect != None):
+            self.playEffect.reset_targets()
+
     def info(self):
         pass
 
+    def get_state(self):
+        """
+        Returns the mutable part of the card as a tuple, for game snapshots. Plain cards
+        don't change while the game is played, so there is nothing to save.
+        """
+        return None
+
+    def set_state(self, state):
+        """
+        Restores the state returned by get_state
+        """
+        pass
+
     def is_playable(self, currentMana, attackPhase):
         """
         Tells us whether or not the card can be played or not 
@@ -135,9 +275,9 @@ class Minion(Card):
         defense - The defense/ hp of the minion
         playEffect - The effect which the card has (not all minions have effects)
 
-        Statistic variables (These might be removed)
-        totalDamageTaken - Total damage which the card has sustained
-        totalDamageDealt - Total damage which the card has dealt (in combat)
+        Statistic variables, updated by combat and summed up by cardstats.py
+        totalDamageTaken - Total damage which the card has sustained (in combat)
+        totalDamageDealt - Total damage which the card has dealt (in combat), nexus included
         strikeCount - How many times the card has attacked another card
         nexusStrikeCount - How many times the card has struck the nexus
         killCount - How many enemy cards the card has killed
@@ -148,11 +288,10 @@ class Minion(Card):
         stikeEffect
     """
 
-    def __init__(self, name, manaCost, attack, defense):
-        super().__init__(name, manaCost)
-        self.attack = attack
-        self.defense = defense
-        self.playEffect = effect.Summon()
+    def __init__(self, template):
+        super().__init__(template)
+        self.attack = template.attack
+        self.defense = template.defense
 
         self.totalDamageTaken = 0
         self.totalDamageDealt = 0
@@ -164,22 +303,28 @@ class Minion(Card):
         self.trigger = None
         self.strikeEffect = None
 
-    def __copy__(self):
-        ret = Minion(self.name, self.manaCost, self.attack, self.defense)
-        return ret
-
-    def attack_card(self, card):
+    def attack_card(self, gameObject, card):
         """
-        Causes this card to attack another card
+        Causes this card to attack another card. If the attack is lethal, the card is
+        queued to die at the game's next clear_dead_cards()
         """
         if card == None:
             return
-        card.defense -= self.attack
+        damage = self.attack
+        self.totalDamageDealt += damage
+        card.totalDamageTaken += damage
+        card.defense -= damage
+        if card.defense <= 0:
+            # Only the strike which took the card from alive to dead counts as the kill
+            if card.defense + damage > 0:
+                self.killCount += 1
+            gameObject.queue_death(card)
 
     def attack_nexus(self, player):
         """
         Attacks the nexus
         """
+        self.totalDamageDealt += self.attack
         player.health -= self.attack
 
     def activate_strike(self, gameObject, target):
@@ -195,6 +340,14 @@ class Minion(Card):
             return
         self.strikeEffect.activate(gameObject, self, target)
 
+    def get_state(self):
+        return (self.attack, self.defense, self.totalDamageTaken, self.totalDamageDealt, \
+                self.strikeCount, self.nexusStrikeCount, self.killCount, self.quickAttack)
+
+    def set_state(self, state):
+        (self.attack, self.defense, self.totalDamageTaken, self.totalDamageDealt, \
+         self.strikeCount, self.nexusStrikeCount, self.killCount, self.quickAttack) = state
+
     def info(self):
         """
         Returns information relevant to the card at hand
@@ -211,8 +364,8 @@ class Hero(Minion):
     """
     A minion which has another effect: it can level up
     """
-    def __init__(self, name, manaCost, attack, defense):
-        super().__init__(name, manaCost, attack, defense)
+    def __init__(self, template):
+        super().__init__(template)
         self.levelUpEffect = None
         pass
 
@@ -230,15 +383,9 @@ class Spell(Card):
             Fast: So fast, your opponent gets to react to it (wait, what?)
             Slow: So slow, it happens the next turn (or cycle?)
     """
-    def __init__(self, name, manaCost, playEffect, speed = None):
-        super().__init__(name, manaCost)
-        self.playEffect = playEffect
+    def bind_effect(self):
+        super().bind_effect()
         self.playEffect.set_owner(self)
-        self.speed = speed
-
-    def __copy__(self):
-        ret = Spell(self.name, self.manaCost, self.playEffect)
-        return ret
 
     pass
 
@@ -253,7 +400,7 @@ class CardMapper():
             parsed. It stores the parsed data in an array/ dict of sorts
 
         cardDatabase - A dictionary mapping the cards to their names. Each name will 
-            return a card object which corresponds to the respective card.
+            return the CardTemplate which all copies of the card are made from.
 
         effectMapper - It's similar to a card mapper, but it maps effects.
 
@@ -267,7 +414,11 @@ class CardMapper():
         pass
 
     def get_card(self, cardName):
-        ret = copy.deepcopy(self.cardDatabase[cardName])
+        """
+        Creates a new instance of the named card. The template is shared, so this only
+        allocates the card's own state, instead of deep copying the whole card
+        """
+        ret = self.cardDatabase[cardName].create_card()
         return ret
 
     def fill_effect_database(self, fileName = ""):
@@ -286,30 +437,32 @@ class CardMapper():
         databaseFile = open(fileName, 'r')
         self.cardsJSON = json.load(databaseFile)
         for JSONcard in self.cardsJSON:
-            newCard = self.create_card(JSONcard)
-            self.cardDatabase[JSONcard["name"]] = newCard
+            newTemplate = self.create_template(JSONcard)
+            self.cardDatabase[JSONcard["name"]] = newTemplate
 
-    def create_card(self, JSONcard):
+    def create_template(self, JSONcard):
         """
-        Creates a card based on the information in the JSON object.
+        Creates a card template based on the information in the JSON object.
 
         Parmaeters:
             JSONcard - The card information in JSON format
 
         Return:
-            The card which has been freshly made
+            The template which the copies of this card will be made from
         """ 
         if JSONcard["type"] == "minion":
-            newCard = Minion(JSONcard["name"], JSONcard["manaCost"], \
-                             JSONcard["attack"], JSONcard["defense"])
+            playEffect = effect.Summon()
             if self.effectMapper.effect_exists(JSONcard["name"]):
-                newCard.playEffect = self.effectMapper.get_effect(JSONcard["name"])
+                playEffect = self.effectMapper.get_effect(JSONcard["name"])
+            newTemplate = CardTemplate(Minion, JSONcard["name"], JSONcard["manaCost"], \
+                                       attack = JSONcard["attack"], \
+                                       defense = JSONcard["defense"], playEffect = playEffect)
             pass
 
         if JSONcard["type"] == "spell":
-            newCard = Spell(JSONcard["name"], JSONcard["manaCost"], \
-                            self.effectMapper.get_effect(JSONcard["name"]), \
-                            Speed[JSONcard["speed"]])
+            newTemplate = CardTemplate(Spell, JSONcard["name"], JSONcard["manaCost"], \
+                                       speed = Speed[JSONcard["speed"]], \
+                                       playEffect = self.effectMapper.get_effect(JSONcard["name"]))
             pass
 
-        return newCard
+        return newTemplate
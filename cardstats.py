@@ -0,0 +1,309 @@
+"""
+Card level statistics over many simulated games. Combat keeps the statistic variables of every
+minion up to date (strikes, nexus strikes, damage dealt and taken, kills), which is a few
+integer additions per strike. At the end of a game the collector adds them up per card name,
+together with what each player's deck held, what was played and who won, so nothing is
+tracked while the game is being played. Like batch.py, this module needs NumPy, which the rest
+of the engine doesn't.
+
+Win-rate contribution
+Every player's game counts once for every card in the player's deck. A card was played in that
+game if at least one copy ended the game outside the deck and the hand (a minion recalled to
+the hand doesn't count). The contribution of a card is its win rate in the games where it was
+played, minus its win rate in the games where it stayed in the deck or the hand. Ties count as
+half a win, and unfinished games only add to the combat columns.
+
+CardStats
+One row per card name, one column per statistic, in a single int64 table. Stats from separate
+runs are combined with merge(), and saved with save_npz() and save_csv()
+
+Usage:
+    python cardstats.py --games 500 --csv stats.csv   plays random games, and prints the stats
+    python cardstats.py run1.npz run2.npz             merges saved runs
+"""
+import argparse
+import csv
+import random
+import numpy as np
+import agent
+import card
+import simulator
+
+# Columns of CardStats.table. Game columns count player games, copies count cards
+DECKED = 0
+DECKED_WINS = 1
+DECKED_TIES = 2
+PLAYED = 3
+PLAYED_WINS = 4
+PLAYED_TIES = 5
+COPIES = 6
+COPIES_PLAYED = 7
+STRIKES = 8
+NEXUS_STRIKES = 9
+DAMAGE_DEALT = 10
+DAMAGE_TAKEN = 11
+KILLS = 12
+DEATHS = 13
+COLUMNS = ("decked", "deckedWins", "deckedTies", "played", "playedWins", "playedTies", \
+           "copies", "copiesPlayed", "strikes", "nexusStrikes", "damageDealt", \
+           "damageTaken", "kills", "deaths")
+# Finished games are added to the table in batches of this many
+FLUSH_INTERVAL = 256
+# The winner of a game which didn't end, in pendingWinners
+UNFINISHED = -2
+# Derived columns of win_rates()
+RATES = ("winRate", "playedWinRate", "unplayedWinRate", "contribution")
+
+def rate(wins, ties, games):
+    """
+    (wins + ties / 2) / games, elementwise, NaN where there are no games
+    """
+    games = np.asarray(games, dtype = np.float64)
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        return np.where(games > 0, (wins + 0.5 * ties) / games, np.nan)
+
+class CardStats:
+    """
+    CardStats
+    Per-card totals over every game recorded so far.
+
+    Member variables:
+        cardNames - The name of every row
+        cardIds - A dict of card name -> row
+        table - [card, column] int64 totals, the columns are COLUMNS
+        games - The number of games recorded
+        pendingCopies, pendingRemaining, pendingWinners - The [player, card] copies in each
+            deck at the start and in each deck and hand at the end, and the winner, of the
+            games since the last flush()
+        pendingRows, pendingValues - The combat counters of the minions of those games
+        starts - A dict of id(game) -> [player, card] copies in each deck when the game
+            started, for the games between start_game and end_game
+    """
+    def __init__(self, cardNames):
+        self.cardNames = list(cardNames)
+        self.cardIds = dict((self.cardNames[i], i) for i in range(len(self.cardNames)))
+        self.table = np.zeros((len(self.cardNames), len(COLUMNS)), dtype = np.int64)
+        self.games = 0
+        self.starts = dict()
+        self.pendingCopies = []
+        self.pendingRemaining = []
+        self.pendingWinners = []
+        self.pendingRows = []
+        self.pendingValues = []
+
+    def card_counts(self, cards):
+        """
+        The number of copies of every card in a list, as an array with one entry per row
+        """
+        cardIds = self.cardIds
+        return np.bincount([cardIds[countedCard.name] for countedCard in cards], \
+                           minlength = len(self.cardNames))
+
+    def start_game(self, gameObject):
+        """
+        Remembers what both decks hold. Call it before the first card is played
+        """
+        self.starts[id(gameObject)] = [self.card_counts(player.deck + \
+            player.hand.list.as_list()) for player in gameObject.players]
+
+    def end_game(self, gameObject, winner):
+        """
+        Adds up a finished game
+
+        Parameters:
+            gameObject - The game, which was passed to start_game
+            winner - The winning player, agent.TIE, or None for a game which didn't end
+        """
+        cardIds = self.cardIds
+        players = gameObject.players
+        self.pendingCopies.append(self.starts.pop(id(gameObject)))
+        self.pendingRemaining.append([self.card_counts(player.deck + \
+            player.hand.list.as_list()) for player in players])
+        if (winner == None):
+            winner = UNFINISHED
+        self.pendingWinners.append(winner)
+
+        rows = self.pendingRows
+        values = self.pendingValues
+        for player in players:
+            graveyard = player.graveyard.list
+            for zone in (player.hand.list, player.bench.list, graveyard):
+                for zoneCard in zone:
+                    if (not isinstance(zoneCard, card.Minion)):
+                        continue
+                    rows.append(cardIds[zoneCard.name])
+                    values.append((zoneCard.strikeCount, zoneCard.nexusStrikeCount, \
+                                   zoneCard.totalDamageDealt, zoneCard.totalDamageTaken, \
+                                   zoneCard.killCount, zone is graveyard))
+        self.games += 1
+        if (self.games % FLUSH_INTERVAL == 0):
+            self.flush()
+
+    def flush(self):
+        """
+        Adds the buffered games to the table, with a handful of array operations for the whole
+        batch. Everything which reads the table calls it first
+        """
+        table = self.table
+        if (len(self.pendingWinners) != 0):
+            copies = np.array(self.pendingCopies)
+            played = copies - np.array(self.pendingRemaining)
+            winners = np.array(self.pendingWinners)
+            # [game, player] outcome masks, broadcast over the cards
+            finished = (winners != UNFINISHED)[:, None, None]
+            wins = (winners[:, None] == np.arange(copies.shape[1]))[:, :, None]
+            ties = (winners == agent.TIE)[:, None, None]
+            decked = (copies > 0) & finished
+            playedGame = (played > 0) & finished
+            table[:, COPIES] += copies.sum(axis = (0, 1))
+            table[:, COPIES_PLAYED] += played.sum(axis = (0, 1))
+            table[:, DECKED] += decked.sum(axis = (0, 1))
+            table[:, DECKED_WINS] += (decked & wins).sum(axis = (0, 1))
+            table[:, DECKED_TIES] += (decked & ties).sum(axis = (0, 1))
+            table[:, PLAYED] += playedGame.sum(axis = (0, 1))
+            table[:, PLAYED_WINS] += (playedGame & wins).sum(axis = (0, 1))
+            table[:, PLAYED_TIES] += (playedGame & ties).sum(axis = (0, 1))
+        if (len(self.pendingRows) != 0):
+            np.add.at(table, (self.pendingRows, slice(STRIKES, DEATHS + 1)), \
+                      self.pendingValues)
+        self.pendingCopies = []
+        self.pendingRemaining = []
+        self.pendingWinners = []
+        self.pendingRows = []
+        self.pendingValues = []
+
+    def column(self, name):
+        self.flush()
+        return self.table[:, COLUMNS.index(name)]
+
+    def win_rates(self):
+        """
+        Returns:
+            A dict of the RATES columns, as float arrays with NaN where there are no games
+        """
+        self.flush()
+        table = self.table
+        winRate = rate(table[:, DECKED_WINS], table[:, DECKED_TIES], table[:, DECKED])
+        playedWinRate = rate(table[:, PLAYED_WINS], table[:, PLAYED_TIES], table[:, PLAYED])
+        unplayedWinRate = rate(table[:, DECKED_WINS] - table[:, PLAYED_WINS], \
+                               table[:, DECKED_TIES] - table[:, PLAYED_TIES], \
+                               table[:, DECKED] - table[:, PLAYED])
+        return {"winRate": winRate, "playedWinRate": playedWinRate, \
+                "unplayedWinRate": unplayedWinRate, \
+                "contribution": playedWinRate - unplayedWinRate}
+
+    def merge(self, other):
+        """
+        Adds the totals of another CardStats, for example from another process or run. Cards
+        this one hasn't seen get new rows
+        """
+        self.flush()
+        other.flush()
+        for name in other.cardNames:
+            if (name not in self.cardIds):
+                self.cardIds[name] = len(self.cardNames)
+                self.cardNames.append(name)
+        if (len(self.cardNames) > len(self.table)):
+            grown = np.zeros((len(self.cardNames), len(COLUMNS)), dtype = np.int64)
+            grown[:len(self.table)] = self.table
+            self.table = grown
+        rows = [self.cardIds[name] for name in other.cardNames]
+        self.table[rows] += other.table
+        self.games += other.games
+
+    def save_npz(self, fileName):
+        self.flush()
+        np.savez(fileName, cardNames = np.array(self.cardNames), columns = np.array(COLUMNS), \
+                 table = self.table, games = self.games)
+
+    def save_csv(self, fileName):
+        """
+        Writes one row per card, with the totals and the win rates
+        """
+        rates = self.win_rates()
+        with open(fileName, "w", newline = "") as outFile:
+            writer = csv.writer(outFile)
+            writer.writerow(("card",) + COLUMNS + RATES)
+            for row in range(len(self.cardNames)):
+                writer.writerow([self.cardNames[row]] + self.table[row].tolist() + \
+                                ["" if np.isnan(rates[name][row]) else "%.4f" % rates[name][row] \
+                                 for name in RATES])
+
+    def format(self):
+        """
+        A table of the cards which were in a deck, by contribution
+        """
+        rates = self.win_rates()
+        table = self.table
+        rows = [row for row in range(len(self.cardNames)) if table[row, DECKED] > 0]
+        rows.sort(key = lambda row: -np.nan_to_num(rates["contribution"][row], nan = -np.inf))
+        lines = ["%d games" % self.games, \
+                 "\t%-20s %8s %8s %8s %8s %8s %8s" % ("card", "played", "win", "played", \
+                                                      "contrib", "damage", "kills")]
+        for row in rows:
+            lines.append("\t%-20s %8d %8.3f %8.3f %+8.3f %8d %8d" % \
+                         (self.cardNames[row], table[row, PLAYED], rates["winRate"][row], \
+                          rates["playedWinRate"][row], rates["contribution"][row], \
+                          table[row, DAMAGE_DEALT], table[row, KILLS]))
+        return "\n".join(lines)
+
+    pass
+
+def load_npz(fileName):
+    """
+    Reads a CardStats saved with save_npz
+    """
+    with np.load(fileName) as data:
+        if (tuple(data["columns"].tolist()) != COLUMNS):
+            raise ValueError("%s was saved with different columns" % fileName)
+        stats = CardStats(data["cardNames"].tolist())
+        stats.table[:] = data["table"]
+        stats.games = int(data["games"])
+    return stats
+
+def play_random_game(sim, decks, generator, stats, maxMoves = 2000):
+    """
+    Plays one game with random moves for both players and records it
+
+    Returns:
+        The winner, TIE, or None if the game ran past maxMoves
+    """
+    gameObject = sim.new_game(decks)
+    stats.start_game(gameObject)
+    winner = None
+    for i in range(maxMoves):
+        winner = agent.apply_move(gameObject, generator.choice(agent.list_moves(gameObject)))
+        if (winner != None):
+            break
+    stats.end_game(gameObject, winner)
+    return winner
+
+def main():
+    parser = argparse.ArgumentParser(description = "Card statistics over simulated games")
+    parser.add_argument("runs", nargs = "*", help = "saved .npz stats to merge")
+    parser.add_argument("-n", "--games", type = int, default = 0, help = "random games to play")
+    parser.add_argument("--decks", nargs = 2, default = ["decks/spell_speeds.deck", \
+                                                         "decks/multi_burst.deck"])
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--csv", help = "write the stats to a CSV file")
+    parser.add_argument("--npz", help = "save the stats, to merge them later")
+    arguments = parser.parse_args()
+
+    sim = simulator.Simulator()
+    stats = CardStats(sim.cardMap.cardDatabase)
+    for fileName in arguments.runs:
+        stats.merge(load_npz(fileName))
+    generator = random.Random(arguments.seed)
+    for i in range(arguments.games):
+        # Alternates the sides of the decks
+        decks = arguments.decks[::-1] if i % 2 else arguments.decks
+        play_random_game(sim, decks, generator, stats)
+
+    print(stats.format())
+    if (arguments.csv != None):
+        stats.save_csv(arguments.csv)
+    if (arguments.npz != None):
+        stats.save_npz(arguments.npz)
+
+if __name__ == "__main__":
+    main()
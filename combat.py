@@ -0,0 +1,109 @@
+"""
+Predicting combat without playing it. The predictions follow the three cases of
+Game.perform_all_attacks lane by lane, but only read the cards, so agents and previews can try
+as many attackers and blocks as they like without touching the game, or copying it.
+
+Strike effects aren't predicted, since they can do anything. Cards without one (most of them)
+are predicted exactly.
+
+predict_lane
+One lane of combat, from the attack and defense numbers
+
+predict_combat
+Every lane of a pair of frontlines, as a CombatPrediction
+
+CombatPrediction
+The deaths, the nexus damage and the stats after combat
+"""
+
+def predict_lane(attack, defense, quickAttack, blockerAttack, blockerDefense):
+    """
+    Predicts one lane of combat. Pass None as blockerAttack for a lane which isn't blocked
+
+    Returns:
+        (attacker defense, blocker defense, nexus damage) after combat
+    """
+    # Case 1, the attacker hits the nexus
+    if (blockerAttack == None):
+        return defense, None, attack
+    blockerDefense -= attack
+    # Case 2, a quick attacker kills its blocker before it strikes back
+    if (quickAttack and blockerDefense <= 0):
+        return defense, blockerDefense, 0
+    # Case 2 (the blocker survived) and case 3
+    return defense - blockerAttack, blockerDefense, 0
+
+class CombatPrediction:
+    """
+    CombatPrediction
+    The predicted result of combat. Lanes are indexed the same as the frontlines, and the stats
+    of an empty lane are None.
+
+    Member variables:
+        nexusDamage - The damage the defending nexus takes
+        attackerDeaths - The lanes whose attacker dies
+        defenderDeaths - The lanes whose blocker dies
+        attackerStats - (attack, defense) of the attacker of every lane after combat
+        defenderStats - (attack, defense) of the blocker of every lane after combat
+    """
+    def __init__(self):
+        self.nexusDamage = 0
+        self.attackerDeaths = []
+        self.defenderDeaths = []
+        self.attackerStats = []
+        self.defenderStats = []
+
+    def survivors(self, frontline, deaths):
+        """
+        The cards of a frontline which survive combat. Pass attackerDeaths with the attacking
+        frontline, or defenderDeaths with the defending one
+        """
+        return [frontline[lane] for lane in range(len(frontline)) \
+                if frontline[lane] != None and lane not in deaths]
+
+    pass
+
+def predict_combat(attackingFrontline, defendingFrontline):
+    """
+    Predicts perform_all_attacks for a pair of frontlines, without changing the cards
+
+    Parameters:
+        attackingFrontline - The attackers, a list of cards with None for an empty lane
+        defendingFrontline - The blockers of each lane, with None for an unblocked lane. It
+            can be shorter than the attacking frontline, i.e. empty before blocks are declared
+
+    Returns:
+        A CombatPrediction
+    """
+    prediction = CombatPrediction()
+    defendingLanes = len(defendingFrontline)
+    for lane in range(len(attackingFrontline)):
+        attacker = attackingFrontline[lane]
+        blocker = None
+        if (lane < defendingLanes):
+            blocker = defendingFrontline[lane]
+        if (attacker == None):
+            # An attacker which died before combat. Its blocker doesn't fight
+            prediction.attackerStats.append(None)
+            if (blocker == None):
+                prediction.defenderStats.append(None)
+            else:
+                prediction.defenderStats.append((blocker.attack, blocker.defense))
+            continue
+
+        if (blocker == None):
+            defense, blockerDefense, damage = \
+                predict_lane(attacker.attack, attacker.defense, attacker.quickAttack, None, None)
+            prediction.defenderStats.append(None)
+        else:
+            defense, blockerDefense, damage = \
+                predict_lane(attacker.attack, attacker.defense, attacker.quickAttack, \
+                             blocker.attack, blocker.defense)
+            prediction.defenderStats.append((blocker.attack, blockerDefense))
+            if (blockerDefense <= 0):
+                prediction.defenderDeaths.append(lane)
+        prediction.attackerStats.append((attacker.attack, defense))
+        if (defense <= 0):
+            prediction.attackerDeaths.append(lane)
+        prediction.nexusDamage += damage
+    return prediction
@@ -66,6 +66,27 @@ class Effect():
         self.parent = card
         pass
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["playableOptions"] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.targeter.set_parent(self)
+
+    def create_instance(self):
+        """
+        Binds the effect to a single card. The definition of the effect (name, selector,
+        buff values, etc.) is shared with the original, only the targeter, which keeps track
+        of the card's valid targets, is new
+        """
+        instance = object.__new__(self.__class__)
+        instance.__dict__.update(self.__dict__)
+        instance.targeter = self.targeter.create_instance()
+        instance.targeter.set_parent(instance)
+        return instance
+
     def get_targets(self, target = None):
         """
         Retrieves the target from the selector. If input is 'None', we can assume that
@@ -77,6 +98,12 @@ class Effect():
     def subscribe(self, gameObject, cardOwner):
         self.targeter.subscribe(gameObject, cardOwner)
 
+    def unsubscribe(self, gameObject):
+        self.targeter.unsubscribe(gameObject)
+
+    def reset_targets(self):
+        self.targeter.reset()
+
     def list_playable_options(self):
         """
         Lists how the card can be played. For example, the card might have 1 target, 2
@@ -85,6 +112,15 @@ class Effect():
         playableOptions = self.selector.list_playable_options(self.targeter.targetArray)
         return playableOptions
 
+    def count_playable_options(self):
+        return self.selector.count_playable_options(self.targeter.targetArray)
+
+    def iter_playable_options(self):
+        return self.selector.iter_playable_options(self.targeter.targetArray)
+
+    def get_playable_option(self, optionIndex):
+        return self.selector.get_playable_option(self.targeter.targetArray, optionIndex)
+
     pass
 
 class Summon(Effect):
@@ -102,7 +138,9 @@ class Summon(Effect):
         """
         Summons the card to the appropriate player's field
         """
-        gameObject.players[card.owner].bench.append(card)
+        bench = gameObject.players[card.owner].bench
+        bench.append(card)
+        gameObject.record_undo(bench.list.pop)
         return True
 
 class Buff(Effect):
@@ -134,8 +172,11 @@ class Buff(Effect):
         targetCard = self.get_targets(target)
         if (targetCard == None):
             return True
+        gameObject.record_attributes(targetCard, "attack", "defense")
         targetCard.attack += self.attackBuff
         targetCard.defense += self.defenseBuff
+        if (targetCard.defense <= 0):
+            gameObject.queue_death(targetCard)
         return True
 
     def __copy__(self):
@@ -156,9 +197,17 @@ class Recall(Effect):
         Returns: N/A
         """
         targetCard = self.get_targets(target)
-        gameObject.players[targetCard.owner].hand.append(targetCard)
-        gameObject.players[targetCard.owner].frontline.remove_from_front_line(targetCard)
-        gameObject.players[targetCard.owner].bench.remove_object(targetCard)
+        player = gameObject.players[targetCard.owner]
+        if (gameObject.undoLog != None):
+            gameObject.record_undo(player.hand.list.pop)
+            gameObject.record_undo(player.bench.list.insert, \
+                                   player.bench.position(targetCard), targetCard)
+        player.hand.append(targetCard)
+        lane = player.frontline.remove_from_frontline(targetCard)
+        if (lane != None):
+            gameObject.record_undo(player.frontline.set_defender, targetCard, lane)
+        player.bench.remove_object(targetCard)
+        targetCard.activate(gameObject)
         pass
     pass
 
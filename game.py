@@ -29,6 +29,8 @@ The primary game object
 import card
 import copy
 import helper
+import targeting
+import zobrist
 
 class ObservableList:
     """
@@ -46,19 +48,33 @@ class ObservableList:
     when a new card is summoned to your side of the field. We therefore, needed a class
     which expanded upon lists in the sense that it handled observers.
 
+    The cards are kept in a helper.IndexedList, so every card has a stable handle, and
+    membership, removal and position lookups don't depend on the size of the zone.
+
     Member variables:
-        list - The list which we are wrapping
+        list - The IndexedList which we are wrapping. It reads like a list, but it should
+            only be modified through the ObservableList, so the observers hear about it
         targetObservers - A list of observers which need to keep track of valid targets for
-            targeted abilities. I.e. buff an ally monster by 1/1
+            targeted abilities. I.e. buff an ally monster by 1/1. These are the shared target
+            views, not the individual cards
         triggerObservers - A lit of observers whch keeps track of valid targets for their
             triggers. I.e. when an ally takes damage
     """
     def __init__(self):
-        self.list = []
+        self.list = helper.IndexedList()
         self.targetObservers = []
         self.triggerObservers = []
         pass
 
+    def __getstate__(self):
+        """
+        The observers are derived from the cards in hand, so they aren't pickled. The game
+        rebuilds them when it's unpickled
+        """
+        state = self.__dict__.copy()
+        state["targetObservers"] = []
+        return state
+
     def add_target_observer(self, observer):
         self.targetObservers.append(observer)
         observer.receive_list(self.list)
@@ -68,14 +84,16 @@ class ObservableList:
 
     def append(self, newObject):
         """
-        Adds a new object to the end of the list, but also notifies observers of the change
+        Adds a new object to the end of the list, but also notifies observers of the change.
+        Returns the handle of the new object
         """
-        self.list.append(newObject)
+        handle = self.list.append(newObject)
         for observer in self.targetObservers:
             observer.add_object(newObject)
+        return handle
 
     def pop (self):
-        self.list.pop()
+        return self.list.pop()
 
     def remove_object(self, delObject):
         """
@@ -83,7 +101,28 @@ class ObservableList:
         """
         self.list.remove(delObject)
         for observer in self.targetObservers:
-            observer.remove_target(delObject)
+            observer.remove_object(delObject)
+
+    def remove_handle(self, handle):
+        """
+        Removes the object with the given handle, notifies observers, and returns the object
+        """
+        delObject = self.list.remove_handle(handle)
+        for observer in self.targetObservers:
+            observer.remove_object(delObject)
+        return delObject
+
+    def contains(self, searchObject):
+        return searchObject in self.list
+
+    def position(self, searchObject):
+        """
+        Returns the index of an object in the list
+        """
+        return self.list.index(searchObject)
+
+    def get_handle(self, searchObject):
+        return self.list.handle(searchObject)
 
     def add_object(self, newObject):
         pass
@@ -98,12 +137,19 @@ class ObservableList:
         """
         Removes all objects from the list, and notifies all observers of the change
         """
-        while self.list:
-            if self.list[0] != None:
-                self.remove_object(self.list[0])
-            else:
-                self.list.remove(None)
+        oldObjects = self.list.as_list()
+        self.list.clear()
+        for delObject in oldObjects:
+            for observer in self.targetObservers:
+                observer.remove_object(delObject)
         pass
+
+    def restore(self, savedObjects):
+        """
+        Puts back the contents saved by a snapshot or the undo log. The observers are not
+        notified, the game rebuilds them afterwards
+        """
+        self.list.reset(savedObjects)
     pass
 
 class Hand(ObservableList):
@@ -117,6 +163,8 @@ class Hand(ObservableList):
         """
         self.list[cardNumber].play(gameObject, target)
         cardPlayed = self.list.pop(cardNumber)
+        gameObject.record_undo(self.list.insert, cardNumber, cardPlayed)
+        cardPlayed.deactivate(gameObject)
         return cardPlayed
     pass
 
@@ -130,23 +178,94 @@ class Frontline(ObservableList):
     Cards attack each other, get attacked, die, etc. All of these need different ways to
     notify the subscribers. Again, combat is very weird with a lot of edge cases, this
     class is subjet to change in the future.
+
+    Unlike the other zones, the frontline is a plain list of lanes, and an empty lane is
+    None. The lane of every card is kept in a dict, so a card can be taken off the
+    frontline without scanning it.
+
+    Member variables:
+        lanes - A dict mapping each card on the frontline to the index of its lane
+        watcher - Told about every card which enters or leaves a lane, like the watcher of
+            an IndexedList. None unless the game is hashing its state
     """
+    def __init__(self):
+        super().__init__()
+        self.list = []
+        self.lanes = dict()
+        self.watcher = None
+
     def add_strike_trigger(self, observer):
         pass
 
+    def append(self, newObject):
+        self.list.append(newObject)
+        self.lanes[newObject] = len(self.list) - 1
+        if self.watcher != None:
+            self.watcher.moved(newObject)
+        for observer in self.targetObservers:
+            observer.add_object(newObject)
+        return self.lanes[newObject]
+
     def remove_from_frontline(self, delObject):
-        for i in range(len(self.list)):
-            if self.list[i] == delObject:
-                self.list[i] = None
+        """
+        Empties the lane of a card, and returns the lane (None if it wasn't on the frontline)
+        """
+        lane = self.lanes.pop(delObject, None)
+        if lane == None:
+            return None
+        self.list[lane] = None
+        if self.watcher != None:
+            self.watcher.moved(delObject)
 
         for observer in self.targetObservers:
-            observer.remove_target(delObject)
+            observer.remove_object(delObject)
+        return lane
+
+    def contains(self, searchObject):
+        return searchObject in self.lanes
+
+    def position(self, searchObject):
+        return self.lanes[searchObject]
 
     def set_defender(self, defender, position):
+        if (position < 0):
+            # The lane is kept as the index it stands for, the same as in an action log
+            position += len(self.list)
         self.list[position] = defender
+        self.lanes[defender] = position
+        if self.watcher != None:
+            self.watcher.moved(defender)
 
     def create_empty(self, size):
+        self.notify_watcher()
         self.list = [None]*size
+        self.lanes = dict()
+
+    def clear(self):
+        self.notify_watcher()
+        oldObjects = list(self.lanes)
+        self.list.clear()
+        self.lanes.clear()
+        for delObject in oldObjects:
+            for observer in self.targetObservers:
+                observer.remove_object(delObject)
+
+    def restore(self, savedLanes):
+        self.notify_watcher()
+        self.list = list(savedLanes)
+        self.lanes = dict()
+        for lane in range(len(self.list)):
+            if self.list[lane] != None:
+                self.lanes[self.list[lane]] = lane
+        self.notify_watcher()
+
+    def notify_watcher(self):
+        """
+        Tells the watcher that every card in a lane is about to move
+        """
+        if self.watcher != None:
+            for laneCard in self.lanes:
+                self.watcher.moved(laneCard)
 
 class Graveyard(ObservableList):
     """
@@ -169,6 +288,9 @@ class Player:
         hand - The cards in the player's hand, an array of cards
         deck - The player's deck, an array of cards
         frontline - The player's cards which are involved in combat
+        playableCards, playableKey - The cached result of playable_cards, and the mana, phase
+            and hand version it was computed for
+        targetLists, targetKey - Likewise for target_lists
 
 
 
@@ -203,6 +325,9 @@ class Player:
         self.bench = Bench()
         self.frontline = Frontline()
         self.playableCards = []
+        self.playableKey = None
+        self.targetLists = []
+        self.targetKey = None
         self.hand = Hand()
         self.deck = []
         self.graveyard = Graveyard()
@@ -211,6 +336,17 @@ class Player:
         Player.playerCount += 1
         Player.playerCount = Player.playerCount % 2
 
+    def __getstate__(self):
+        """
+        The cached playable mask and target lists are left out of pickles
+        """
+        state = self.__dict__.copy()
+        state["playableCards"] = []
+        state["playableKey"] = None
+        state["targetLists"] = []
+        state["targetKey"] = None
+        return state
+
     def create_deck(self, cardMap, deckFile = ""):
         """
         create_deck
@@ -239,6 +375,7 @@ class Player:
         """
         Each new turn, the player draws a card, has their mana replenished, etc.
         """
+        gameObject.record_attributes(self, "maxMana", "mana")
         self.increment_max_mana()
         self.mana = self.maxMana
         self.draw_card(gameObject)
@@ -250,7 +387,9 @@ class Player:
 
     def draw_card(self, gameObject):
         newCard = self.deck.pop()
+        gameObject.record_undo(self.deck.append, newCard)
         self.hand.append(newCard)
+        gameObject.record_undo(self.hand.list.pop)
         newCard.activate(gameObject)
 
     def play_card(self, gameObject, cardNumber, target = None):
@@ -290,12 +429,32 @@ class Player:
 
     def playable_cards(self, attackPhase):
         """
+        Returns a list of bools, whether each card in hand can be played. Playability only
+        depends on the mana, the phase and the hand, so the list is cached and only rebuilt
+        when one of those has changed. The list is shared, it must not be modified
         """
-        self.playableCards = []
-        for card in self.hand.list:
-            self.playableCards.append(card.is_playable(self.mana, attackPhase))
+        key = (self.mana, attackPhase, self.hand.list.version)
+        if (key != self.playableKey):
+            self.playableKey = key
+            self.playableCards = []
+            for card in self.hand.list:
+                self.playableCards.append(card.is_playable(self.mana, attackPhase))
         return self.playableCards
 
+    def target_lists(self, observerEpoch):
+        """
+        Returns the target list of each card in hand. The target lists are the cards' target
+        views, which the zones keep up to date themselves, so this only needs rebuilding when
+        the hand changes or the observers have been rebuilt (observerEpoch)
+        """
+        key = (observerEpoch, self.hand.list.version)
+        if (key != self.targetKey):
+            self.targetKey = key
+            self.targetLists = []
+            for card in self.hand.list:
+                self.targetLists.append(card.get_targets())
+        return self.targetLists
+
 
 class Game:
     """
@@ -313,6 +472,8 @@ class Game:
             own cardMap, so it only imports the necessary cards. We don't want to import the 
             whole database all the time. Of course, this may change depending on future 
             design decisions.
+        verbose
+            Whether the game prints its progress to the console. Headless runs turn it off
 
     functions
         setup
@@ -347,7 +508,44 @@ class Game:
 
         # Observers
         self.strikeObservers = []
+        self.targetViews = dict()
+
+        # Cards which took lethal damage, killed at the next clear_dead_cards()
+        self.pendingDeaths = []
+
+        # Console output, headless runs switch this off
+        self.verbose = True
+
+        # Set when the zone observers have been thrown away, i.e. after a restore
+        self.observersDirty = False
+        # Counts how many times the observers have been thrown away, for caches of targets
+        self.observerEpoch = 0
+
+        # Inverse operations for undo(), None while undo is disabled
+        self.undoLog = None
+        # Keeps state_hash() up to date, None while hashing is disabled
+        self.hasher = None
+        # Records every action for replays, see actionlog.py. None while not recording
+        self.actionLog = None
+        # The random.Random for anything random in the game, so replays match. Set by the
+        # action log, None while not recording
+        self.generator = None
+
+    def __getstate__(self):
+        """
+        Pickles the game without its observers. The zones and the cards leave out everything
+        derived from them too (see ObservableList, Card and BaseTargeter), so a pickle holds
+        the game state and the card templates, and not the observer graph
+        """
+        state = self.__dict__.copy()
+        state["targetViews"] = dict()
+        return state
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # The targets are rebuilt the first time they're needed, as after restore()
+        self.observersDirty = True
+        self.observerEpoch += 1
 
     def setup(self):
         pass
@@ -383,16 +581,21 @@ class Game:
         Returns:
             N/A
         """
+        # The log reads the targets, so the observers are brought up to date first
+        self.ensure_observers()
+        self.record_action(Game.play_card, cardNumber, target)
+        self.record_attributes(self, "passedTurn")
         if (self.attackPhase == True):
             self.passedTurn = True
         else:
             self.passedTurn = False
 
         cardPlayed = self.players[self.activePlayer].play_card(self, cardNumber, target)
+        self.clear_dead_cards()
         if (cardPlayed.is_burst()):
             self.passedTurn = False
             return
-        self.switch_active_player()
+        self.toggle_active_player()
 
     def prepare_attack(self, attackers):
         """
@@ -401,17 +604,27 @@ class Game:
         Parameters:
             attackers - the attackers which the player wishes to attack with
         """
+        self.record_action(Game.prepare_attack, attackers)
+        self.record_attributes(self, "passedTurn")
         self.passedTurn = False
         if (self.activePlayer != self.attackingPlayer):
-            print("You must be assigned the attack token to declare an attack!")
+            if (self.verbose):
+                print("You must be assigned the attack token to declare an attack!")
             return
 
+        self.record_attributes(self, "attackPhase", "attackToken", "numAttackers")
+        frontline = self.players[self.attackingPlayer].frontline
+        self.record_undo(frontline.restore, list(frontline.list))
+
         self.attackPhase = True
         self.attackToken = False
         self.numAttackers = len(attackers)
         self.players[self.attackingPlayer].prepare_attackers(attackers)
 
     def prepare_defense(self, defenders):
+        self.record_action(Game.prepare_defense, defenders)
+        frontline = self.players[self.defendingPlayer].frontline
+        self.record_undo(frontline.restore, frontline.list)
         self.players[self.defendingPlayer].prepare_defenders(defenders, self.numAttackers)
         pass
 
@@ -422,6 +635,8 @@ class Game:
 
         Return: N/A
         """
+        self.record_action(Game.pass_turn)
+        self.record_attributes(self, "passedTurn")
         if (self.passedTurn == True):
             self.passedTurn = False
 
@@ -436,11 +651,12 @@ class Game:
         else:
             self.passedTurn = True
 
-        self.switch_active_player()
+        self.toggle_active_player()
         pass
 
 # Automatic actions
     def draw_card(self, playerNumber):
+        self.record_action(Game.draw_card, playerNumber)
         self.players[playerNumber].draw_card(self)
 
     def perform_all_attacks(self):
@@ -473,7 +689,21 @@ class Game:
         defendingPlayer = self.players[self.defendingPlayer]
         defendingFrontline = defendingPlayer.frontline.list
 
+        if (self.undoLog != None):
+            self.record_attributes(self, "attackPhase")
+            self.record_attributes(defendingPlayer, "health")
+            for frontlineCard in attackingFrontline + defendingFrontline:
+                if frontlineCard != None:
+                    self.record_undo(frontlineCard.set_state, frontlineCard.get_state())
+        if (self.hasher != None):
+            for frontlineCard in attackingFrontline + defendingFrontline:
+                self.hasher.touch(frontlineCard)
+
         for i in range(len(attackingFrontline)):
+            # The attacker died after it was declared, i.e. to a fast spell
+            if attackingFrontline[i] == None:
+                continue
+
             # Case 1
             if defendingFrontline[i] == None:
                 attackingFrontline[i].attack_nexus(defendingPlayer)
@@ -482,35 +712,47 @@ class Game:
 
             # Case 2
             elif attackingFrontline[i].quickAttack == True:
-                attackingFrontline[i].attack_card(defendingFrontline[i])
+                attackingFrontline[i].attack_card(self, defendingFrontline[i])
                 attackingFrontline[i].activate_strike(self, defendingFrontline[i])
                 self.clear_dead_cards()
 
                 if defendingFrontline[i] != None:
-                    defendingFrontline[i].attack_card(attackingFrontline[i])
+                    defendingFrontline[i].attack_card(self, attackingFrontline[i])
                     defendingFrontline[i].activate_strike(self, attackingFrontline[i])
                     self.clear_dead_cards()
 
             # Case 3
             else:
-                attackingFrontline[i].attack_card(defendingFrontline[i])
-                defendingFrontline[i].attack_card(attackingFrontline[i])
+                attackingFrontline[i].attack_card(self, defendingFrontline[i])
+                defendingFrontline[i].attack_card(self, attackingFrontline[i])
                 attackingFrontline[i].activate_strike(self, defendingFrontline[i])
                 defendingFrontline[i].activate_strike(self, attackingFrontline[i])
                 self.clear_dead_cards()
 
         for player in self.players:
+            self.record_undo(player.frontline.restore, list(player.frontline.list))
             player.frontline.clear()
 
         self.attackPhase = False
 
+    def queue_death(self, card):
+        """
+        Adds a card whose defense dropped to 0 or below to the pending deaths. Anything that
+        damages a card calls this, and the card is killed at the next clear_dead_cards()
+        """
+        self.pendingDeaths.append(card)
+
     def clear_dead_cards(self):
         """
-        Clears all deads cards from the field
+        Clears all deads cards from the field. Only the cards in the pending-death queue are
+        looked at, so this doesn't rescan the benches. A queued card is skipped if it has
+        been healed, or has already left the bench
         """
-        for player in self.players:
-            for card in player.bench.list:
-                if card.defense <= 0:
+        while (len(self.pendingDeaths) != 0):
+            pendingDeaths = self.pendingDeaths
+            self.pendingDeaths = []
+            for card in pendingDeaths:
+                if card.defense <= 0 and self.players[card.owner].bench.contains(card):
                     self.kill_card(card)
 
     def kill_card(self, card):
@@ -518,11 +760,27 @@ class Game:
         Kills a card on the field. Maybe it can be expanded to deal with cards being
         discarded from the hand too
         """
-        self.players[card.owner].frontline.remove_from_frontline(card)
-        self.players[card.owner].bench.remove_object(card)
-        self.players[card.owner].graveyard.append(card)
+        player = self.players[card.owner]
+        if (self.undoLog != None):
+            self.record_undo(player.bench.list.insert, player.bench.position(card), card)
+        lane = player.frontline.remove_from_frontline(card)
+        if (lane != None):
+            self.record_undo(player.frontline.set_defender, card, lane)
+        player.bench.remove_object(card)
+        player.graveyard.append(card)
+        self.record_undo(player.graveyard.list.pop)
+        card.deactivate(self)
 
     def switch_active_player(self):
+        self.record_action(Game.switch_active_player)
+        self.toggle_active_player()
+
+    def toggle_active_player(self):
+        """
+        Hands the initiative to the other player, as part of an action. Unlike
+        switch_active_player, this isn't an action of its own, so it isn't recorded
+        """
+        self.record_attributes(self, "activePlayer")
         self.activePlayer = helper.switch_zero_one(self.activePlayer)
 
     def resolve_skirmish(self, attackingCard, defendingCard):
@@ -534,7 +792,10 @@ class Game:
         the attacking token changes hands, and the player with the attacking token is given
         initiative.
         """
-        print("BEGINNING A NEW TURN")
+        if (self.verbose):
+            print("BEGINNING A NEW TURN")
+        self.record_attributes(self, "attackingPlayer", "defendingPlayer", "activePlayer", \
+                               "attackToken")
         for player in self.players:
             player.new_turn(self)
         
@@ -585,20 +846,277 @@ class Game:
         defendingPlayer.health -= attackingCard.attack
 
 # Help actions
+    def awaiting_defense(self):
+        """
+        An attack has been declared, and the defender hasn't set up their frontline yet
+        """
+        defendingFrontline = self.players[self.defendingPlayer].frontline.list
+        return self.attackPhase and self.numAttackers > 0 and len(defendingFrontline) == 0
+
+    def acting_player(self):
+        """
+        Returns the number of the player who has to act next. That's the active player,
+        except right after an attack is declared, when the defender has to declare blockers
+        """
+        if (self.awaiting_defense()):
+            return self.defendingPlayer
+        return self.activePlayer
+
     def list_playable_cards(self):
         return self.players[self.activePlayer].playable_cards(self.attackPhase)
 
     def list_all_moves(self):
+        """
+        Returns the playable cards and the target list of each card in the active player's
+        hand. Both lists are cached by the player, so asking again when nothing has changed
+        costs the same no matter how big the hand is
+        """
+        self.ensure_observers()
+        player = self.players[self.activePlayer]
         decisionSpace = dict()
-        playableCards = self.players[self.activePlayer].playable_cards(self.attackPhase)
-        targetList = []
-        for card in self.players[self.activePlayer].hand.list:
-            targetList.append(card.get_targets())
-        decisionSpace["playable cards"] = playableCards
-        decisionSpace["target list"] = targetList
+        decisionSpace["playable cards"] = player.playable_cards(self.attackPhase)
+        decisionSpace["target list"] = player.target_lists(self.observerEpoch)
         return decisionSpace
 
+# Snapshots
+    def snapshot(self):
+        """
+        Takes a compact snapshot of the mutable game state: the turn flags, each player's
+        health and mana, the contents of every zone, and the stats of every card. Observers
+        and targeters are not saved, they are derived from the zones and get rebuilt.
+
+        The snapshot holds references to this game's cards, so it can only be restored into
+        the game it was taken from. It is much cheaper than copy.deepcopy or pickle, which
+        both walk the whole observer graph.
+
+        Returns:
+            A tuple of (flags, players, cardStates)
+        """
+        flags = (self.numAttackers, self.passedTurn, self.attackToken, self.attackPhase, \
+                 self.activePlayer, self.inactivePlayer, self.attackingPlayer, \
+                 self.defendingPlayer)
+        players = []
+        cardStates = []
+        for player in self.players:
+            zones = (tuple(player.deck), tuple(player.hand.list), tuple(player.bench.list), \
+                     tuple(player.frontline.list), tuple(player.graveyard.list))
+            players.append((player.mana, player.maxMana, player.health, zones))
+            for zone in (zones[0], zones[1], zones[2], zones[4]):
+                for card in zone:
+                    state = card.get_state()
+                    if (state != None):
+                        cardStates.append((card, state))
+        return (flags, tuple(players), tuple(cardStates))
+
+    def restore(self, snapshot):
+        """
+        Puts the game back into the state saved by snapshot(). The observers are thrown
+        away, and rebuilt the next time something needs valid targets.
+
+        Parameters:
+            snapshot - A snapshot taken from this game object
+        """
+        flags, players, cardStates = snapshot
+        (self.numAttackers, self.passedTurn, self.attackToken, self.attackPhase, \
+         self.activePlayer, self.inactivePlayer, self.attackingPlayer, \
+         self.defendingPlayer) = flags
+
+        for i in range(len(self.players)):
+            player = self.players[i]
+            player.mana, player.maxMana, player.health, zones = players[i]
+            player.deck = list(zones[0])
+            player.hand.restore(zones[1])
+            player.bench.restore(zones[2])
+            player.frontline.restore(zones[3])
+            player.graveyard.restore(zones[4])
+
+        for card, state in cardStates:
+            card.set_state(state)
+        self.invalidate_observers()
+        if (self.hasher != None):
+            self.hasher.reset()
+
+        # The undo entries refer to the zone lists which have just been replaced
+        if (self.undoLog != None):
+            self.undoLog = []
+
+    def invalidate_observers(self):
+        """
+        Unsubscribes everything from the zones. The observers are rebuilt lazily by
+        ensure_observers()
+        """
+        for player in self.players:
+            for zone in (player.hand, player.bench, player.frontline, player.graveyard):
+                zone.targetObservers = []
+        self.targetViews = dict()
+        self.observersDirty = True
+        self.observerEpoch += 1
+
+    def ensure_observers(self):
+        if (self.observersDirty == True):
+            self.rebuild_observers()
+
+    def rebuild_observers(self):
+        """
+        Resubscribes every card in hand to the zones it targets, the same way drawing the
+        card did originally
+        """
+        self.invalidate_observers()
+        self.observersDirty = False
+        for player in self.players:
+            for card in player.hand.list:
+                card.reset_targets()
+                card.activate(self)
+
+# Undo log
+    def enable_undo(self):
+        """
+        Starts recording an inverse entry for every state change, so that search can roll
+        back moves instead of copying the game
+        """
+        self.undoLog = []
+
+    def disable_undo(self):
+        self.undoLog = None
+
+    def mark(self):
+        """
+        Returns a marker for the current position in the undo log. Passing it to undo()
+        rolls the game back to this point
+        """
+        return len(self.undoLog)
+
+    def record_undo(self, function, *arguments):
+        """
+        Records function(*arguments) as the inverse of the change which is about to happen.
+        Does nothing while undo is disabled
+        """
+        if (self.undoLog != None):
+            self.undoLog.append((function, arguments))
+
+    def record_attributes(self, target, *names):
+        """
+        Records the current value of the named attributes of target, before they change
+        """
+        if (self.undoLog != None):
+            for name in names:
+                self.undoLog.append((setattr, (target, name, getattr(target, name))))
+        if (self.hasher != None):
+            self.hasher.touch(target)
+
+    def undo(self, marker = 0):
+        """
+        Applies the inverse entries in reverse order until the log is back at the marker.
+        The zones are restored directly, so the observers are rebuilt lazily afterwards
+
+        Parameters:
+            marker - A value returned by mark(). Defaults to the start of the log
+        """
+        undoLog = self.undoLog
+        self.undoLog = None
+        hasher = self.hasher
+        while (len(undoLog) > marker):
+            function, arguments = undoLog.pop()
+            if (hasher != None):
+                hasher.touch_undo(function, arguments)
+            function(*arguments)
+        self.undoLog = undoLog
+        self.invalidate_observers()
+
+# State hashing
+    def enable_hashing(self):
+        """
+        Starts keeping an incremental 64-bit hash of the game state, see zobrist.py. The zones
+        report every card that moves, and the places which record undo entries report every
+        card whose stats change
+        """
+        self.hasher = zobrist.StateHasher(self)
+        self.set_zone_watchers(self.hasher)
+
+    def disable_hashing(self):
+        self.set_zone_watchers(None)
+        self.hasher = None
+
+    def set_zone_watchers(self, watcher):
+        for player in self.players:
+            for zone in (player.hand, player.bench, player.graveyard):
+                zone.list.watcher = watcher
+            player.frontline.watcher = watcher
+
+    def state_hash(self):
+        """
+        Returns the 64-bit hash of the current state. Hashing must be enabled
+        """
+        if (self.hasher == None):
+            raise ValueError("state hashing is not enabled, call enable_hashing() first")
+        return self.hasher.state_hash()
+
+    def compute_hash(self):
+        """
+        Returns the hash of the current state computed from scratch, to check state_hash()
+        """
+        if (self.hasher == None):
+            raise ValueError("state hashing is not enabled, call enable_hashing() first")
+        return self.hasher.compute_hash()
+
+# Action log
+    def record_action(self, function, *arguments):
+        """
+        Appends an action to the action log, if one is recording. Every action calls this
+        before it changes anything, with the Game method and the arguments it was called with
+        """
+        if (self.actionLog != None):
+            self.actionLog.append(self, function, arguments)
+
 # Observer management
+    def acquire_target_view(self, key, zones):
+        """
+        Returns the shared target view for the key, creating it and subscribing it to the
+        zones if nobody is using it yet
+
+        Parameters:
+            key - (player, zone, allegiance)
+            zones - The observable lists the view should follow
+
+        Returns:
+            The TargetView, with its reference count incremented
+        """
+        view = self.targetViews.get(key)
+        if (view == None):
+            view = targeting.TargetView(key, zones)
+            view.subscribe()
+            self.targetViews[key] = view
+        view.refCount += 1
+        return view
+
+    def count_observers(self):
+        """
+        Counts the live observers of every zone. A zone is observed by the shared target
+        views, and each view is read by one or more targeters, so this counts the targeters
+
+        Returns:
+            A dict mapping (playerNumber, zoneName) to the number of targeters watching it
+        """
+        counts = dict()
+        for player in self.players:
+            zones = {"hand": player.hand, "bench": player.bench, \
+                     "frontline": player.frontline, "graveyard": player.graveyard}
+            for zoneName, zone in zones.items():
+                count = 0
+                for observer in zone.targetObservers:
+                    count += observer.refCount
+                counts[(player.playerNumber, zoneName)] = count
+        return counts
+
+    def release_target_view(self, view):
+        """
+        Drops a reference to a target view. The last reference unsubscribes it from its zones
+        """
+        view.refCount -= 1
+        if (view.refCount == 0 and self.targetViews.get(view.key) is view):
+            view.unsubscribe()
+            del self.targetViews[view.key]
+
     def add_strike_subscriber(self, strikeObserver):
         """
         DEPRECATED
@@ -1,3 +1,5 @@
+import itertools
+
 def switch_zero_one(number):
     """
     switch_zero_one
@@ -11,3 +13,204 @@ def switch_zero_one(number):
     vice versa.
     """
     return 1 - number
+
+class IndexedList:
+    """
+    IndexedList
+    An ordered container of unique objects (cards). Membership tests, appending, and removing
+    an object (wherever it is) take constant time. The objects are stored in a dict keyed by a
+    handle. Dicts keep insertion order and delete in O(1), so removing a card from the middle
+    of a zone doesn't shift anything.
+
+    Reading by position is not always constant time. A plain list of the contents, and the
+    position of each object, are cached, and index() and [] read the caches. The first read
+    after a change in the middle of the list rebuilds them in O(n), and reads after that are
+    O(1) until the next such change. So positional reads are amortized O(1) when they
+    outnumber the changes, and O(n) each when every read follows a change.
+
+    It behaves like a list for reading (indexing, len, iteration, in, index, count), and
+    supports the list methods the zones use (append, insert, pop, remove, clear). Iterating
+    goes over a copy, so the list can be modified while it's being iterated.
+
+    Every object gets a handle when it's added. The handle stays the same for as long as the
+    object is in the list, no matter what else is added or removed.
+
+    Member variables:
+        entries - A dict of handle -> object, in list order
+        handles - A dict of object -> handle
+        nextHandle - The handle to give the next object
+        cache - A plain list of the objects, None when it needs to be rebuilt
+        positions - A dict of object -> position, None when it needs to be rebuilt
+        version - Goes up on every change to the list, so anything derived from the contents
+            can be cached and only recomputed when the version moves
+        watcher - An object whose moved(object) is called for every object added or removed,
+            or None. Used by the state hasher
+    """
+    def __init__(self, values = ()):
+        self.entries = dict()
+        self.handles = dict()
+        self.nextHandle = 0
+        self.version = 0
+        self.watcher = None
+        self.reset(values)
+
+    def append(self, newObject):
+        """
+        Adds an object to the end of the list, and returns its handle
+        """
+        if newObject in self.handles:
+            raise ValueError("object is already in the list")
+        handle = self.nextHandle
+        self.nextHandle += 1
+        self.entries[handle] = newObject
+        self.handles[newObject] = handle
+        self.version += 1
+        if self.watcher != None:
+            self.watcher.moved(newObject)
+        if self.cache != None:
+            self.cache.append(newObject)
+        if self.positions != None:
+            self.positions[newObject] = len(self.entries) - 1
+        return handle
+
+    def extend(self, newObjects):
+        for newObject in newObjects:
+            self.append(newObject)
+
+    def insert(self, index, newObject):
+        """
+        Inserts an object before the given position, and returns its handle. Inserting
+        anywhere but the end rebuilds the order, so it's O(n). Only undo does this
+        """
+        if index >= len(self.entries):
+            return self.append(newObject)
+        if newObject in self.handles:
+            raise ValueError("object is already in the list")
+        handle = self.nextHandle
+        self.nextHandle += 1
+        items = list(self.entries.items())
+        items.insert(index, (handle, newObject))
+        self.entries = dict(items)
+        self.handles[newObject] = handle
+        self.version += 1
+        if self.watcher != None:
+            self.watcher.moved(newObject)
+        self.cache = None
+        self.positions = None
+        return handle
+
+    def remove(self, delObject):
+        """
+        Removes an object from the list, and returns the handle it had
+        """
+        handle = self.handles.pop(delObject, None)
+        if handle == None:
+            raise ValueError("object is not in the list")
+        self.remove_handle(handle)
+        return handle
+
+    def remove_handle(self, handle):
+        """
+        Removes the object with the given handle, and returns it
+        """
+        delObject = self.entries.pop(handle)
+        self.handles.pop(delObject, None)
+        self.version += 1
+        if self.watcher != None:
+            self.watcher.moved(delObject)
+        if self.cache != None and len(self.cache) != 0 and self.cache[-1] is delObject:
+            self.cache.pop()
+            if self.positions != None:
+                del self.positions[delObject]
+        else:
+            self.cache = None
+            self.positions = None
+        return delObject
+
+    def pop(self, index = -1):
+        """
+        Removes and returns the object at the given position, the last one by default
+        """
+        if len(self.entries) == 0:
+            raise IndexError("pop from empty list")
+        if index == -1 or index == len(self.entries) - 1:
+            handle = next(reversed(self.entries))
+        else:
+            handle = self.handles[self.as_list()[index]]
+        return self.remove_handle(handle)
+
+    def clear(self):
+        if self.watcher != None:
+            for delObject in self.handles:
+                self.watcher.moved(delObject)
+        self.entries = dict()
+        self.handles = dict()
+        self.version += 1
+        self.cache = []
+        self.positions = dict()
+
+    def reset(self, values):
+        """
+        Replaces the contents of the list. Every object gets a new handle
+        """
+        values = list(values)
+        if self.watcher != None:
+            for changedObject in itertools.chain(self.handles, values):
+                self.watcher.moved(changedObject)
+        firstHandle = self.nextHandle
+        self.nextHandle += len(values)
+        self.entries = dict(zip(range(firstHandle, self.nextHandle), values))
+        self.handles = dict(zip(values, self.entries))
+        if len(self.handles) != len(values):
+            raise ValueError("objects in the list must be unique")
+        self.version += 1
+        self.cache = values
+        self.positions = None
+
+    def as_list(self):
+        """
+        Returns the contents as a plain list. It's a cached copy, so it must not be modified
+        """
+        if self.cache == None:
+            self.cache = list(self.entries.values())
+        return self.cache
+
+    def index(self, searchObject):
+        """
+        Returns the position of an object
+        """
+        if searchObject not in self.handles:
+            raise ValueError("object is not in the list")
+        if self.positions == None:
+            self.positions = dict()
+            position = 0
+            for value in self.entries.values():
+                self.positions[value] = position
+                position += 1
+        return self.positions[searchObject]
+
+    def handle(self, searchObject):
+        return self.handles[searchObject]
+
+    def get_by_handle(self, handle):
+        return self.entries[handle]
+
+    def count(self, searchObject):
+        if searchObject in self.handles:
+            return 1
+        return 0
+
+    def __contains__(self, searchObject):
+        return searchObject in self.handles
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        return self.as_list()[index]
+
+    def __iter__(self):
+        return iter(list(self.entries.values()))
+
+    def __repr__(self):
+        return repr(self.as_list())
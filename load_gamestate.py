@@ -1,8 +1,17 @@
 import pickle
 import pdb
+import savestate
+import simulator
 
 inFile = open("gamestate.dump", 'rb')
-gameObject = pickle.load(inFile)
+data = inFile.read()
+inFile.close()
+# Files saved by main.py's dump are in the binary format. Pickles of a game from this version
+# of the engine load too, but pickles from before card templates can't be read
+if (data.startswith(savestate.MAGIC)):
+    gameObject = savestate.new_game(data, simulator.Simulator().cardMap)
+else:
+    gameObject = pickle.loads(data)
 #pdb.set_trace()
 
 """
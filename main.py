@@ -64,15 +64,17 @@ debug
 quit
     Exits the program
 
-dump
-    Dumps the gamestate to a file, using pickle. Pickle can load the gamestate too. Cool tool
+dump file
+    file - The file to save to, gamestate.dump if it's left out
+    Saves the gamestate to a file, in the compact binary format of savestate.py
 
-load
-    Ideally would load a gamestate, but sadly we can't do that, because I'm dumb
+load file
+    file - The file to load from, gamestate.dump if it's left out
+    Loads a gamestate saved by dump. The cards are made again from the card database
 """
 import pdb
 import game
-import pickle
+import savestate
 
 CARD_DATABASE = "databases/carddb.json"
 EFFECT_DATABASE = "databases/effectdb.json"
@@ -160,14 +162,19 @@ def player_turn(gameObject):
             fileName = "gamestate.dump"
             if (len(command) > 1):
                 fileName = command[1]
-            outFile = open(fileName, 'wb')
-            pickle.dump(gameObject, outFile)
-            outFile.close()
+            savestate.save_file(gameObject, fileName)
             print("saved game state to ", fileName)
             pass
 
         if (command[0] == "load"):
-            #blank for now
+            fileName = "gamestate.dump"
+            if (len(command) > 1):
+                fileName = command[1]
+            try:
+                savestate.load_file(fileName, gameObject)
+                print("loaded game state from ", fileName)
+            except (OSError, savestate.SaveFormatError) as error:
+                print("could not load ", fileName, ": ", error)
             pass
 
         pass
@@ -0,0 +1,382 @@
+"""
+Monte Carlo tree search agent. Each iteration restores the root position, walks down the tree
+with UCT, adds one new node, plays a rollout from it with the rollout policy, and backs the
+result up the path. The most visited move at the root is played.
+
+Rollouts are cut off after a fixed number of moves, or when the decision's time limit is
+reached, and the position is then scored with agent.evaluate, so one iteration has a bounded
+cost. Values are stored from the point of view
+of the player who made the move into the node, on a 0 to 1 scale.
+
+Parallel search
+Both kinds of parallel search use a process pool, which is created once and kept by the agent.
+    root - every worker searches its own tree from the same position, and the root visit
+        counts are added up
+    leaf - one tree in this process, and every new node gets one rollout from each worker.
+        The workers stop their rollouts at the decision's deadline, so a batch of rollouts
+        can't run past the time limit
+
+MCTSNode
+A node of the search tree
+
+MCTSAgent
+Chooses moves within an iteration and/or time budget, and keeps agent.SearchStats
+
+Usage:
+    python mcts.py -n 20         plays games of MCTS against a random player
+"""
+import argparse
+import math
+import multiprocessing
+import pickle
+import random
+import time
+import agent
+import simulator
+
+# Leaves 10 ms of the 100 ms an AI opponent gets per decision for everything around the search
+DECISION_TIME = 0.09
+
+def random_policy(gameObject, moves, generator):
+    return generator.choice(moves)
+
+def aggressive_policy(gameObject, moves, generator):
+    """
+    Plays a card or attacks when it can, and only passes otherwise
+    """
+    if (len(moves) > 1 and moves[0][0] == "pass" and generator.random() < 0.8):
+        return moves[generator.randrange(1, len(moves))]
+    return generator.choice(moves)
+
+def rollout(gameObject, policy, depth, generator, deadline = None):
+    """
+    Plays the policy from the current position for up to depth moves, or until the
+    time.perf_counter() deadline if there is one. The clock is system wide, so the deadline
+    holds in the pool's workers too
+
+    Returns:
+        The value of the end position for player 0, between 0 and 1
+    """
+    for i in range(depth):
+        if (deadline != None and time.perf_counter() >= deadline):
+            break
+        moves = agent.list_moves(gameObject)
+        winner = agent.apply_move(gameObject, policy(gameObject, moves, generator))
+        if (winner != None):
+            return (agent.result_value(winner, 0) + 1) / 2
+    return (agent.evaluate(gameObject, 0) + 1) / 2
+
+class MCTSNode:
+    """
+    MCTSNode
+
+    Member variables:
+        move - The move which leads to this node from its parent
+        parent - The parent node, None for the root
+        player - The player who made the move, the node's value is from their point of view
+        children - The expanded child nodes
+        untriedMoves - The moves which haven't been expanded yet
+        winner - The result of the game if it ended at this node, otherwise None
+        visits - How many iterations went through the node
+        value - The sum of the values backed up through the node
+    """
+    def __init__(self, move, parent, player, moves, winner = None):
+        self.move = move
+        self.parent = parent
+        self.player = player
+        self.children = []
+        self.untriedMoves = moves
+        self.winner = winner
+        self.visits = 0
+        self.value = 0.0
+
+    def select_child(self, exploration):
+        """
+        Returns the child with the highest UCT score
+        """
+        logVisits = math.log(self.visits)
+        bestScore = -1.0
+        bestChild = None
+        for child in self.children:
+            score = child.value / child.visits + \
+                    exploration * math.sqrt(logVisits / child.visits)
+            if (score > bestScore):
+                bestScore = score
+                bestChild = child
+        return bestChild
+
+    def backup(self, valueForZero, visits = 1):
+        """
+        Adds the result of visits rollouts, worth valueForZero in total to player 0, to this
+        node and all of its ancestors
+        """
+        node = self
+        while (node != None):
+            node.visits += visits
+            if (node.player == 0):
+                node.value += valueForZero
+            else:
+                node.value += visits - valueForZero
+            node = node.parent
+
+    pass
+
+class MCTSAgent:
+    """
+    MCTSAgent
+    Monte Carlo tree search over agent.list_moves. The search stops at whichever budget runs
+    out first. The game it's given is searched in place, and put back as it was afterwards.
+
+    Member variables:
+        iterations - The most iterations per decision, None for no limit
+        timeLimit - The most seconds per decision, None for no limit
+        exploration - The UCT exploration constant
+        policy - The rollout policy, policy(gameObject, moves, generator) -> move
+        rolloutDepth - How many moves a rollout plays before the position is evaluated
+        workers - The size of the process pool, 0 searches in this process only
+        parallel - "root" or "leaf", see the module
+        generator - The random number generator
+        stats - agent.SearchStats of every decision
+        pool - The process pool, created on the first parallel search
+    """
+    def __init__(self, iterations = None, timeLimit = DECISION_TIME, exploration = 1.4, \
+                 policy = random_policy, rolloutDepth = 40, workers = 0, parallel = "root", \
+                 seed = None):
+        if (iterations == None and timeLimit == None):
+            raise ValueError("MCTSAgent needs an iteration or a time budget")
+        if (parallel not in ("root", "leaf")):
+            raise ValueError("parallel must be 'root' or 'leaf'")
+        self.iterations = iterations
+        self.timeLimit = timeLimit
+        self.exploration = exploration
+        self.policy = policy
+        self.rolloutDepth = rolloutDepth
+        self.workers = workers
+        self.parallel = parallel
+        self.generator = random.Random(seed)
+        self.stats = agent.SearchStats()
+        self.pool = None
+
+    def choose_move(self, gameObject):
+        """
+        Searches the position and returns the move to play, without playing it
+        """
+        start = time.perf_counter()
+        # The moves tried while searching aren't part of the game, so they aren't logged
+        actionLog = gameObject.actionLog
+        gameObject.actionLog = None
+        try:
+            if (self.workers > 0 and self.parallel == "root"):
+                move, rollouts = self.search_root_parallel(gameObject, start)
+            else:
+                root = self.search(gameObject, start)
+                move, rollouts = self.best_move(root), root.visits
+        finally:
+            gameObject.actionLog = actionLog
+        self.stats.record(time.perf_counter() - start, rollouts)
+        return move
+
+    def play_move(self, gameObject):
+        """
+        Chooses a move and plays it. Returns the result of the game, as agent.apply_move
+        """
+        return agent.apply_move(gameObject, self.choose_move(gameObject))
+
+    def out_of_budget(self, iteration, start):
+        """
+        Checks the budgets. The time budget stops the search when another iteration of the
+        average length would run past the limit, so a decision doesn't overshoot it
+        """
+        if (self.iterations != None and iteration >= self.iterations):
+            return True
+        if (self.timeLimit != None):
+            elapsed = time.perf_counter() - start
+            if (elapsed + elapsed / max(iteration, 1) >= self.timeLimit):
+                return True
+        return False
+
+    def search(self, gameObject, start):
+        """
+        Runs iterations until the budget is spent, and returns the root node
+        """
+        snapshot = gameObject.snapshot()
+        root = MCTSNode(None, None, None, agent.list_moves(gameObject))
+        leafParallel = self.workers > 0 and self.parallel == "leaf"
+        deadline = None
+        if (self.timeLimit != None):
+            deadline = start + self.timeLimit
+        iteration = 0
+        try:
+            # There's always at least one iteration, so there is a move to return
+            while (iteration == 0 or self.out_of_budget(iteration, start) == False):
+                iteration += 1
+                node = root
+
+                # Selection
+                while (len(node.untriedMoves) == 0 and len(node.children) != 0):
+                    node = node.select_child(self.exploration)
+                    agent.apply_move(gameObject, node.move)
+
+                # Expansion
+                if (node.winner == None and len(node.untriedMoves) != 0):
+                    move = node.untriedMoves.pop(self.generator.randrange( \
+                        len(node.untriedMoves)))
+                    player = gameObject.acting_player()
+                    winner = agent.apply_move(gameObject, move)
+                    moves = []
+                    if (winner == None):
+                        moves = agent.list_moves(gameObject)
+                    child = MCTSNode(move, node, player, moves, winner)
+                    node.children.append(child)
+                    node = child
+
+                # Rollout and backup
+                if (node.winner != None):
+                    node.backup((agent.result_value(node.winner, 0) + 1) / 2)
+                elif (leafParallel):
+                    values = self.leaf_rollouts(gameObject, deadline)
+                    node.backup(sum(values), len(values))
+                else:
+                    node.backup(rollout(gameObject, self.policy, self.rolloutDepth, \
+                                        self.generator, deadline))
+                gameObject.restore(snapshot)
+        finally:
+            gameObject.restore(snapshot)
+        return root
+
+    def best_move(self, root):
+        bestChild = max(root.children, key = lambda child: child.visits)
+        return bestChild.move
+
+# Parallel search
+    def get_pool(self):
+        if (self.pool == None):
+            self.pool = multiprocessing.Pool(self.workers)
+        return self.pool
+
+    def close(self):
+        if (self.pool != None):
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def leaf_rollouts(self, gameObject, deadline = None):
+        """
+        Plays one rollout from the current position on every worker, each stopped at the
+        deadline
+        """
+        state = pickle.dumps(gameObject)
+        seeds = [self.generator.getrandbits(32) for i in range(self.workers)]
+        tasks = [(state, self.policy, self.rolloutDepth, seed, deadline) for seed in seeds]
+        return self.get_pool().map(rollout_task, tasks)
+
+    def search_root_parallel(self, gameObject, start):
+        """
+        Every worker searches its own tree with the time left, and the root statistics are
+        added up. Returns (move, rollouts)
+        """
+        timeLimit = None
+        if (self.timeLimit != None):
+            # Leave time for sending the position and collecting the results
+            timeLimit = max(0.0, self.timeLimit - (time.perf_counter() - start)) * 0.8
+        iterations = None
+        if (self.iterations != None):
+            iterations = max(1, self.iterations // self.workers)
+        state = pickle.dumps(gameObject)
+        settings = (iterations, timeLimit, self.exploration, self.policy, self.rolloutDepth)
+        tasks = [(state, settings, self.generator.getrandbits(32)) \
+                 for i in range(self.workers)]
+
+        moves = agent.list_moves(gameObject)
+        visits = [0] * len(moves)
+        rollouts = 0
+        for rootVisits in self.get_pool().map(search_task, tasks):
+            for moveIndex, childVisits in rootVisits:
+                visits[moveIndex] += childVisits
+                rollouts += childVisits
+        return moves[visits.index(max(visits))], rollouts
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["pool"] = None
+        return state
+
+    pass
+
+def rollout_task(task):
+    """
+    Process pool task for leaf parallel search: one rollout from a pickled position
+    """
+    state, policy, depth, seed, deadline = task
+    return rollout(pickle.loads(state), policy, depth, random.Random(seed), deadline)
+
+def search_task(task):
+    """
+    Process pool task for root parallel search. Returns (root move index, visits) pairs. The
+    worker lists the root moves from the same position, so the indices match the caller's
+    """
+    state, settings, seed = task
+    iterations, timeLimit, exploration, policy, rolloutDepth = settings
+    gameObject = pickle.loads(state)
+    searcher = MCTSAgent(iterations, timeLimit, exploration, policy, rolloutDepth, seed = seed)
+    moves = agent.list_moves(gameObject)
+    root = searcher.search(gameObject, time.perf_counter())
+    return [(moves.index(child.move), child.visits) for child in root.children]
+
+def play_game(sim, players, decks, generator, maxMoves = 2000, firstAttacker = 0):
+    """
+    Plays one game between two agents. An agent is either an MCTSAgent or None for a random
+    player. Returns the winner, TIE, or None if the game ran past maxMoves
+    """
+    gameObject = sim.new_game(decks, firstAttacker)
+    for i in range(maxMoves):
+        player = players[gameObject.acting_player()]
+        if (player == None):
+            winner = agent.apply_move(gameObject, \
+                                      random_policy(gameObject, agent.list_moves(gameObject), \
+                                                    generator))
+        else:
+            winner = player.play_move(gameObject)
+        if (winner != None):
+            return winner
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description = "MCTS against a random player")
+    parser.add_argument("-n", "--games", type = int, default = 10)
+    parser.add_argument("-t", "--time", type = float, default = DECISION_TIME, \
+                        help = "seconds per decision")
+    parser.add_argument("-i", "--iterations", type = int, default = None)
+    parser.add_argument("-w", "--workers", type = int, default = 0)
+    parser.add_argument("--parallel", choices = ["root", "leaf"], default = "root")
+    parser.add_argument("--decks", nargs = 2, default = ["decks/spell_speeds.deck", \
+                                                         "decks/multi_burst.deck"])
+    parser.add_argument("--seed", type = int, default = 0)
+    arguments = parser.parse_args()
+
+    sim = simulator.Simulator()
+    generator = random.Random(arguments.seed)
+    searcher = MCTSAgent(arguments.iterations, arguments.time, workers = arguments.workers, \
+                         parallel = arguments.parallel, seed = arguments.seed)
+    results = {0: 0, 1: 0, agent.TIE: 0, None: 0}
+    try:
+        for i in range(arguments.games):
+            # MCTS alternates sides
+            side = i % 2
+            players = [None, None]
+            players[side] = searcher
+            winner = play_game(sim, players, arguments.decks, generator)
+            if (winner == side):
+                results[0] += 1
+            elif (winner == 1 - side):
+                results[1] += 1
+            else:
+                results[winner] += 1
+    finally:
+        searcher.close()
+    print("MCTS %d, random %d, ties %d, unfinished %d" % \
+          (results[0], results[1], results[agent.TIE], results[None]))
+    print(searcher.stats.format())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Fixed-size NumPy encodings of game states, for agents which learn a policy. Like batch.py, this
+module needs NumPy, which the rest of the engine doesn't.
+
+Everything is encoded from the point of view of the player who has to act next, so the same
+policy can play both sides. That is the active player, except right after an attack has been
+declared, when the defending player has to declare blockers.
+
+Observation
+Preallocated arrays for a batch of encoded states. They are allocated once, and the encoder
+writes into them in place, one element at a time straight from the zones, so encoding builds
+no lists, slices or tuples per call. The only objects it makes are Python's own temporaries,
+like the index of each element written.
+
+ObservationEncoder
+Fills an Observation from game objects. It holds the sizes of the fixed-size slots, and the
+card ids (positions in the card database, plus one, so 0 is an empty slot).
+
+The action mask follows the commands main.py understands:
+    commandMask - PASS, PLAY, ATTACK and DEFEND, whether each command can be used
+    playMask - [hand slot, target column], column 0 plays the card without a target and
+        column t + 1 plays it on target t of the card's target list
+    attackerMask - The bench slots which can be declared as attackers
+    blockerMask - The bench slots which can be declared as blockers
+"""
+import numpy as np
+import game
+import targeting
+
+PASS = 0
+PLAY = 1
+ATTACK = 2
+DEFEND = 3
+COMMAND_COUNT = 4
+
+# Columns of Observation.players
+HEALTH = 0
+MANA = 1
+MAX_MANA = 2
+DECK_SIZE = 3
+HAND_SIZE = 4
+BENCH_SIZE = 5
+GRAVEYARD_SIZE = 6
+PLAYER_FIELDS = 7
+
+# Columns of Observation.flags
+PASSED_TURN = 0
+ATTACK_TOKEN = 1
+ATTACK_PHASE = 2
+ATTACKING = 3
+AWAITING_DEFENSE = 4
+NUM_ATTACKERS = 5
+FLAG_FIELDS = 6
+
+# Columns of Observation.benchStats, the numbers from Minion.info()
+COST = 0
+ATTACK_STAT = 1
+DEFENSE_STAT = 2
+STAT_FIELDS = 3
+
+class Observation:
+    """
+    Observation
+    The encoded states of a batch of games. Every array is indexed by the row in the batch
+    first. Player axes are [acting player, opponent].
+
+    Member variables:
+        handCards - [row, hand slot], card ids of the acting player's hand
+        benchCards - [row, player, bench slot], card ids of both benches
+        benchStats - [row, player, bench slot, stat], cost, attack and defense
+        lanes - [row, player, lane], the bench slot + 1 of the card in each frontline lane
+        players - [row, player, field], health, mana, and the size of every zone
+        flags - [row, field], the turn flags
+        commandMask, playMask, attackerMask, blockerMask - The action mask, see the module
+    """
+    def __init__(self, encoder, batchSize = 1):
+        handSlots = encoder.handSlots
+        benchSlots = encoder.benchSlots
+        self.batchSize = batchSize
+        self.handCards = np.zeros((batchSize, handSlots), dtype = np.int32)
+        self.benchCards = np.zeros((batchSize, 2, benchSlots), dtype = np.int32)
+        self.benchStats = np.zeros((batchSize, 2, benchSlots, STAT_FIELDS), dtype = np.int32)
+        self.lanes = np.zeros((batchSize, 2, benchSlots), dtype = np.int32)
+        self.players = np.zeros((batchSize, 2, PLAYER_FIELDS), dtype = np.int32)
+        self.flags = np.zeros((batchSize, FLAG_FIELDS), dtype = np.int32)
+        self.commandMask = np.zeros((batchSize, COMMAND_COUNT), dtype = bool)
+        self.playMask = np.zeros((batchSize, handSlots, encoder.targetSlots + 1), dtype = bool)
+        self.attackerMask = np.zeros((batchSize, benchSlots), dtype = bool)
+        self.blockerMask = np.zeros((batchSize, benchSlots), dtype = bool)
+
+    pass
+
+class ObservationEncoder:
+    """
+    ObservationEncoder
+    Turns game objects into Observations. Cards past the end of a slot array are left out of
+    the encoding (and can't be chosen by the action mask), but still count in the zone sizes.
+
+    Member variables:
+        cardIds - A dict of card name -> card id. 0 means an empty slot
+        handSlots - How many cards of the hand are encoded
+        benchSlots - How many cards of each bench (and frontline lanes) are encoded
+        targetSlots - How many targets of each card are encoded in the play mask
+    """
+    def __init__(self, cardMap, handSlots = game.Player.MAX_CARDS_IN_HAND, benchSlots = 10, \
+                 targetSlots = None):
+        self.cardIds = dict()
+        for name in cardMap.cardDatabase:
+            self.cardIds[name] = len(self.cardIds) + 1
+        self.handSlots = handSlots
+        self.benchSlots = benchSlots
+        if (targetSlots == None):
+            targetSlots = 2 * benchSlots
+        self.targetSlots = targetSlots
+
+    def create_observation(self, batchSize = 1):
+        return Observation(self, batchSize)
+
+    def encode(self, gameObject, observation, row = 0):
+        """
+        Writes the state and the action mask of a game into one row of an observation
+
+        Parameters:
+            gameObject - The game to encode
+            observation - An Observation from create_observation
+            row - The row of the batch to write
+        """
+        gameObject.ensure_observers()
+        handSlots = self.handSlots
+        benchSlots = self.benchSlots
+        cardIds = self.cardIds
+        awaitingDefense = gameObject.awaiting_defense()
+        actingNumber = gameObject.acting_player()
+        acting = gameObject.players[actingNumber]
+        opponent = gameObject.players[1 - actingNumber]
+
+        # Zones. Values are written one element at a time, straight from the zones, so no
+        # lists, slices or tuples are built
+        handCards = observation.handCards
+        handCards[row] = 0
+        hand = acting.hand.list.as_list()
+        handCount = min(len(hand), handSlots)
+        for slot in range(handCount):
+            handCards[row, slot] = cardIds[hand[slot].name]
+
+        benchCards = observation.benchCards
+        benchStats = observation.benchStats
+        lanes = observation.lanes
+        players = observation.players
+        benchCards[row] = 0
+        benchStats[row] = 0
+        lanes[row] = 0
+        for side in range(2):
+            player = opponent if side else acting
+            bench = player.bench.list.as_list()
+            for slot in range(min(len(bench), benchSlots)):
+                benchCard = bench[slot]
+                benchCards[row, side, slot] = cardIds[benchCard.name]
+                benchStats[row, side, slot, COST] = benchCard.manaCost
+                benchStats[row, side, slot, ATTACK_STAT] = benchCard.attack
+                benchStats[row, side, slot, DEFENSE_STAT] = benchCard.defense
+            frontline = player.frontline.list
+            for lane in range(min(len(frontline), benchSlots)):
+                lanes[row, side, lane] = self.lane_value(player, frontline[lane])
+
+            players[row, side, HEALTH] = player.health
+            players[row, side, MANA] = player.mana
+            players[row, side, MAX_MANA] = player.maxMana
+            players[row, side, DECK_SIZE] = len(player.deck)
+            players[row, side, HAND_SIZE] = len(player.hand.list)
+            players[row, side, BENCH_SIZE] = len(bench)
+            players[row, side, GRAVEYARD_SIZE] = len(player.graveyard.list)
+
+        flags = observation.flags
+        flags[row, PASSED_TURN] = gameObject.passedTurn
+        flags[row, ATTACK_TOKEN] = gameObject.attackToken
+        flags[row, ATTACK_PHASE] = gameObject.attackPhase
+        flags[row, ATTACKING] = actingNumber == gameObject.attackingPlayer
+        flags[row, AWAITING_DEFENSE] = awaitingDefense
+        flags[row, NUM_ATTACKERS] = gameObject.numAttackers
+
+        # Action mask
+        commandMask = observation.commandMask
+        playMask = observation.playMask
+        attackerMask = observation.attackerMask
+        blockerMask = observation.blockerMask
+        commandMask[row] = False
+        playMask[row] = False
+        attackerMask[row] = False
+        blockerMask[row] = False
+        benchSize = min(len(acting.bench.list), benchSlots)
+        if (awaitingDefense):
+            commandMask[row, DEFEND] = True
+            for slot in range(benchSize):
+                blockerMask[row, slot] = True
+            return
+
+        commandMask[row, PASS] = True
+        playableCards = acting.playable_cards(gameObject.attackPhase)
+        for cardNumber in range(handCount):
+            if (playableCards[cardNumber] == False):
+                continue
+            self.mask_targets(hand[cardNumber], playMask, row, cardNumber)
+            commandMask[row, PLAY] = True
+
+        if (actingNumber == gameObject.attackingPlayer and gameObject.attackToken and \
+            not gameObject.attackPhase and benchSize > 0):
+            commandMask[row, ATTACK] = True
+            for slot in range(benchSize):
+                attackerMask[row, slot] = True
+
+    def encode_batch(self, games, observation):
+        """
+        Encodes a list of games into the first len(games) rows of an observation
+        """
+        for row in range(len(games)):
+            self.encode(games[row], observation, row)
+
+    def lane_value(self, player, card):
+        if (card == None):
+            return 0
+        position = player.bench.position(card)
+        if (position >= self.benchSlots):
+            return 0
+        return position + 1
+
+    def mask_targets(self, card, playMask, row, cardNumber):
+        """
+        Marks the ways a playable card can be played, in playMask[row, cardNumber]. Cards
+        whose player picks a target can be played on any of their targets, and fizzle
+        (column 0) only when there is none. Cards which don't take a target from the player
+        are played with column 0
+        """
+        playEffect = card.playEffect
+        if (playEffect == None or not isinstance(playEffect.selector, targeting.Player)):
+            playMask[row, cardNumber, 0] = True
+            return
+        targetCount = min(len(playEffect.targeter.targetArray), self.targetSlots)
+        if (targetCount == 0):
+            playMask[row, cardNumber, 0] = True
+        for target in range(targetCount):
+            playMask[row, cardNumber, target + 1] = True
+
+    pass
@@ -0,0 +1,228 @@
+"""
+Compact binary save files. Pickling a game walks the whole object graph, including the
+observers, the targeters and the card templates, so the file is large and slow to write. A
+save file only holds what snapshot() holds: the turn flags, each player's health and mana,
+the contents of every zone, and the stats of the cards whose stats changed. Loading makes the
+cards again from the card database. It doesn't subscribe anything: like after restore(), the
+observers are rebuilt when they're first needed, and a card binds its effect when the effect
+is first read, so most of a load is making the bare card objects. Saves are much smaller than
+pickles, and both saving and loading are faster (see benchmark.py saves).
+
+Cards are saved by name, through a table of the names used in the file, so a save can be
+loaded with any card database which has those cards.
+
+Format, version 1 (all numbers little endian):
+    header - b"LORS", uint16 version
+    names - uint16 count, then every name as a uint8 length and UTF-8 bytes, so a name can be
+        at most 255 bytes long
+    flags - uint8 numAttackers, uint8 bits (passedTurn, attackToken, attackPhase), then uint8
+        activePlayer, inactivePlayer, attackingPlayer, defendingPlayer
+    players - for each player, int16 mana, maxMana and health, then the deck, hand, bench and
+        graveyard (uint16 count, then the cards), then the frontline (uint8 lane count, then
+        the bench position + 1 of the card in each lane, 0 for an empty lane)
+    card - uint16 name index. The top bit is set when the card has a stats record
+    stats - one record for every card with the top bit set, in the order of the cards: int16
+        attack and defense, int32 total damage taken and dealt, uint16 strike, nexus strike
+        and kill counts, uint8 quickAttack
+The stats come after all of the zones, so every zone can be read in one go.
+
+SaveFormatError
+Raised for data which isn't a save file this version can read
+"""
+import struct
+import game
+
+MAGIC = b"LORS"
+VERSION = 1
+
+HEADER = struct.Struct("<4sH")
+COUNT = struct.Struct("<H")
+FLAGS = struct.Struct("<6B")
+PLAYER = struct.Struct("<3h")
+CARD = struct.Struct("<H")
+STATS = struct.Struct("<2h2i3HB")
+HAS_STATS = 0x8000
+# Names are saved with a uint8 length
+MAX_NAME_LENGTH = 255
+
+class SaveFormatError(ValueError):
+    pass
+
+# Card template -> the state of a card fresh from it, so unchanged cards are saved without stats
+freshStates = dict()
+
+def fresh_state(template):
+    state = freshStates.get(template)
+    if (state == None):
+        state = template.create_card().get_state()
+        freshStates[template] = state
+    return state
+
+def save_game(gameObject):
+    """
+    Encodes the state of a game
+
+    Returns:
+        The save file, as bytes
+    """
+    names = dict()
+    body = bytearray()
+    stats = bytearray()
+    body += FLAGS.pack(gameObject.numAttackers, \
+                       gameObject.passedTurn | gameObject.attackToken << 1 | \
+                       gameObject.attackPhase << 2, \
+                       gameObject.activePlayer, gameObject.inactivePlayer, \
+                       gameObject.attackingPlayer, gameObject.defendingPlayer)
+    for player in gameObject.players:
+        body += PLAYER.pack(player.mana, player.maxMana, player.health)
+        for zone in (player.deck, player.hand.list, player.bench.list, player.graveyard.list):
+            cards = []
+            for zoneCard in zone:
+                nameIndex = names.setdefault(zoneCard.name, len(names))
+                state = zoneCard.get_state()
+                if (state != None and state != fresh_state(zoneCard.template)):
+                    nameIndex |= HAS_STATS
+                    stats += STATS.pack(*state)
+                cards.append(nameIndex)
+            body += COUNT.pack(len(cards))
+            body += struct.pack("<%dH" % len(cards), *cards)
+
+        bench = player.bench.list
+        frontline = player.frontline.list
+        body.append(len(frontline))
+        for laneCard in frontline:
+            if (laneCard == None):
+                body.append(0)
+            elif (laneCard not in bench):
+                raise ValueError("a frontline card isn't on its player's bench")
+            else:
+                body.append(bench.index(laneCard) + 1)
+
+    data = bytearray(HEADER.pack(MAGIC, VERSION))
+    data += COUNT.pack(len(names))
+    for name in names:
+        encoded = name.encode("utf-8")
+        if (len(encoded) > MAX_NAME_LENGTH):
+            raise ValueError("the card name %r is longer than %d bytes" % \
+                             (name, MAX_NAME_LENGTH))
+        data.append(len(encoded))
+        data += encoded
+    return bytes(data + body + stats)
+
+def load_game(data, gameObject):
+    """
+    Replaces the state of a game with a save. The game's card map must have every card in
+    the save. The undo log is cleared, and the state hash (if enabled) is started over
+
+    Parameters:
+        data - A save from save_game
+        gameObject - The game to load into
+
+    Returns:
+        gameObject
+    """
+    if (len(data) < HEADER.size):
+        raise SaveFormatError("not a save file")
+    magic, version = HEADER.unpack_from(data, 0)
+    if (magic != MAGIC):
+        raise SaveFormatError("not a save file")
+    if (version != VERSION):
+        raise SaveFormatError("unsupported save file version %d" % version)
+
+    try:
+        offset = HEADER.size
+        names = []
+        nameCount, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        for i in range(nameCount):
+            length = data[offset]
+            names.append(bytes(data[offset + 1:offset + 1 + length]).decode("utf-8"))
+            offset += 1 + length
+        templates = []
+        for name in names:
+            if (name not in gameObject.cardMap.cardDatabase):
+                raise SaveFormatError("the card database has no card named %r" % name)
+            templates.append(gameObject.cardMap.cardDatabase[name])
+
+        numAttackers, bits, activePlayer, inactivePlayer, attackingPlayer, \
+            defendingPlayer = FLAGS.unpack_from(data, offset)
+        offset += FLAGS.size
+
+        players = []
+        changedCards = []
+        for playerNumber in range(len(gameObject.players)):
+            mana, maxMana, health = PLAYER.unpack_from(data, offset)
+            offset += PLAYER.size
+            zones = []
+            for zoneNumber in range(4):
+                count, = COUNT.unpack_from(data, offset)
+                offset += COUNT.size
+                zone = []
+                for nameIndex in struct.unpack_from("<%dH" % count, data, offset):
+                    newCard = templates[nameIndex & ~HAS_STATS].create_card()
+                    newCard.owner = playerNumber
+                    if (nameIndex & HAS_STATS):
+                        changedCards.append(newCard)
+                    zone.append(newCard)
+                offset += count * CARD.size
+                zones.append(zone)
+            laneCount = data[offset]
+            lanes = data[offset + 1:offset + 1 + laneCount]
+            offset += 1 + laneCount
+            bench = zones[2]
+            frontline = [None if lane == 0 else bench[lane - 1] for lane in lanes]
+            players.append((mana, maxMana, health, zones, frontline))
+
+        for changedCard in changedCards:
+            state = STATS.unpack_from(data, offset)
+            offset += STATS.size
+            # quickAttack is saved as a byte
+            changedCard.set_state(state[:-1] + (bool(state[-1]),))
+    except (struct.error, IndexError) as error:
+        raise SaveFormatError("truncated or corrupt save file") from error
+    if (offset != len(data)):
+        raise SaveFormatError("unexpected data at the end of the save file")
+
+    gameObject.numAttackers = numAttackers
+    gameObject.passedTurn = bool(bits & 1)
+    gameObject.attackToken = bool(bits & 2)
+    gameObject.attackPhase = bool(bits & 4)
+    gameObject.activePlayer = activePlayer
+    gameObject.inactivePlayer = inactivePlayer
+    gameObject.attackingPlayer = attackingPlayer
+    gameObject.defendingPlayer = defendingPlayer
+    for playerNumber in range(len(players)):
+        player = gameObject.players[playerNumber]
+        mana, maxMana, health, zones, frontline = players[playerNumber]
+        player.mana, player.maxMana, player.health = mana, maxMana, health
+        player.deck = zones[0]
+        player.hand.restore(zones[1])
+        player.bench.restore(zones[2])
+        player.graveyard.restore(zones[3])
+        player.frontline.restore(frontline)
+
+    gameObject.pendingDeaths = []
+    if (gameObject.undoLog != None):
+        gameObject.undoLog = []
+    if (gameObject.hasher != None):
+        gameObject.enable_hashing()
+    # Like restore(), the observers are rebuilt when they're first needed
+    gameObject.invalidate_observers()
+    return gameObject
+
+def save_file(gameObject, fileName):
+    with open(fileName, "wb") as outFile:
+        outFile.write(save_game(gameObject))
+
+def load_file(fileName, gameObject):
+    with open(fileName, "rb") as inFile:
+        return load_game(inFile.read(), gameObject)
+
+def new_game(data, cardMap):
+    """
+    Creates a silent game from a save, with cards from a filled card mapper
+    """
+    gameObject = game.Game()
+    gameObject.verbose = False
+    gameObject.cardMap = cardMap
+    return load_game(data, gameObject)
@@ -0,0 +1,288 @@
+"""
+A headless runner for the command scripts in testing/. The scripts are the same transcripts
+which get piped into main.py, but instead of going through input() and print(), they are parsed
+once into a list of calls on the game object, and then replayed as many times as we want.
+
+Script format (identical to what main.py reads from stdin):
+    line 1 - deck file for player 0 (blank means the default deck)
+    line 2 - deck file for player 1
+    the rest - commands, one per line. An "attack" line is always followed by the line which
+        declares the defenders, just like in the interactive loop.
+
+Only the commands which change the game state are kept (play, attack, pass, draw, switch), as
+well as "moves", since agents query it. Output commands (print, dump, debug, load) are dropped,
+and "quit" ends the script.
+
+Script
+Holds the parsed decks and commands of a single script file
+
+SimulationReport
+Throughput and per-command latency of a batch of simulated games
+
+Simulator
+Loads the databases once, and then plays scripts against fresh game objects
+
+Usage:
+    python simulator.py testing/basic_attack testing/buff_card -n 1000
+"""
+import argparse
+import os
+import time
+import card
+import game
+
+CARD_DATABASE = "databases/carddb.json"
+EFFECT_DATABASE = "databases/effectdb.json"
+DECK_DIRECTORY = "decks"
+DEFAULT_DECK = "default.deck"
+
+# Script command -> game method. The defender line after "attack" maps to prepare_defense
+COMMANDS = {
+    "play": game.Game.play_card,
+    "attack": game.Game.prepare_attack,
+    "pass": game.Game.pass_turn,
+    "draw": game.Game.draw_card,
+    "switch": game.Game.switch_active_player,
+    "moves": game.Game.list_all_moves,
+}
+OUTPUT_COMMANDS = ["print", "dump", "debug", "load"]
+
+class Script:
+    """
+    Script
+    A command script which has been parsed into calls on the game object
+
+    Member variables:
+        name - The file the script was read from
+        decks - The deck files for player 0 and player 1
+        commands - A list of (commandName, function, arguments) tuples. The function is the
+            unbound Game method, so running a command is just function(gameObject, *arguments)
+    """
+    def __init__(self, name = ""):
+        self.name = name
+        self.decks = []
+        self.commands = []
+
+    def add_command(self, commandName, arguments = ()):
+        if (commandName == "defend"):
+            function = game.Game.prepare_defense
+        else:
+            function = COMMANDS[commandName]
+        self.commands.append((commandName, function, arguments))
+
+    pass
+
+def resolve_deck(deckFile, directory = DECK_DIRECTORY):
+    """
+    Finds the deck file. Older scripts name the deck without the decks/ directory, so we
+    fall back to looking in there.
+    """
+    if (deckFile == ""):
+        deckFile = DEFAULT_DECK
+    if (os.path.exists(deckFile)):
+        return deckFile
+    return os.path.join(directory, deckFile)
+
+def parse_script(fileName):
+    """
+    Parses a command script into a Script object
+
+    Parameters:
+        fileName - The script file, in the same format main.py reads from stdin
+
+    Returns:
+        The parsed Script
+    """
+    script = Script(fileName)
+    with open(fileName, "r") as file:
+        lines = [line.strip() for line in file]
+
+    for i in range(2):
+        deckFile = ""
+        if (i < len(lines)):
+            deckFile = lines[i]
+        script.decks.append(resolve_deck(deckFile))
+
+    lineNumber = 2
+    while (lineNumber < len(lines)):
+        command = lines[lineNumber].split()
+        lineNumber += 1
+        if (len(command) == 0 or command[0] in OUTPUT_COMMANDS):
+            continue
+        if (command[0] == "quit"):
+            break
+
+        if (command[0] == "attack"):
+            attackers = [int(number) for number in command[1:]]
+            script.add_command("attack", (attackers,))
+            defenders = []
+            if (lineNumber < len(lines)):
+                defenders = [int(number) for number in lines[lineNumber].split()]
+                lineNumber += 1
+            script.add_command("defend", (defenders,))
+
+        elif (command[0] == "play"):
+            # Same as main.py, only the card and the first target are used
+            arguments = tuple(int(number) for number in command[1:3])
+            script.add_command("play", arguments)
+
+        elif (command[0] == "draw"):
+            script.add_command("draw", (int(command[1]),))
+
+        elif (command[0] in COMMANDS):
+            script.add_command(command[0])
+
+        else:
+            raise ValueError("Unknown command '" + command[0] + "' in " + fileName)
+
+    return script
+
+class SimulationReport:
+    """
+    SimulationReport
+    The results of running a script many times
+
+    Member variables:
+        name - The name of the script
+        games - How many games were played in the untimed pass
+        elapsed - Wall clock time of the untimed pass, in seconds
+        commandTimes - Total seconds spent in each command, from the timed pass
+        commandCounts - How many times each command ran in the timed pass
+    """
+    def __init__(self, name):
+        self.name = name
+        self.games = 0
+        self.elapsed = 0.0
+        self.commandTimes = dict()
+        self.commandCounts = dict()
+
+    def games_per_second(self):
+        if (self.elapsed == 0):
+            return 0.0
+        return self.games / self.elapsed
+
+    def command_latency(self, commandName):
+        """
+        Returns the mean latency of a command in seconds
+        """
+        return self.commandTimes[commandName] / self.commandCounts[commandName]
+
+    def format(self):
+        lines = []
+        lines.append("%s: %d games in %.3fs (%.1f games/sec)" % \
+                     (self.name, self.games, self.elapsed, self.games_per_second()))
+        for commandName in self.commandTimes:
+            lines.append("\t%-8s %8d calls %10.2f us/call" % \
+                         (commandName, self.commandCounts[commandName], \
+                          self.command_latency(commandName) * 1e6))
+        return "\n".join(lines)
+
+    pass
+
+class Simulator:
+    """
+    Simulator
+    Plays scripts headlessly. The card and effect databases are parsed once, and the card
+    mapper is shared between every game which the simulator creates.
+
+    Member variables:
+        cardMap - The filled card mapper which all games draw their cards from
+    """
+    def __init__(self, cardDatabase = CARD_DATABASE, effectDatabase = EFFECT_DATABASE):
+        self.cardMap = card.CardMapper()
+        self.cardMap.fill_effect_database(effectDatabase)
+        self.cardMap.fill_database(cardDatabase)
+
+    def new_game(self, decks, firstAttacker = 0):
+        """
+        Creates a silent game object with both decks built. firstAttacker is the player who
+        holds the attack token (and the initiative) when the game starts
+        """
+        gameObject = game.Game()
+        gameObject.verbose = False
+        gameObject.cardMap = self.cardMap
+        for i in range(2):
+            gameObject.create_deck(decks[i], i)
+        if (firstAttacker != gameObject.attackingPlayer):
+            gameObject.switch_attacking_player()
+            gameObject.activePlayer = gameObject.attackingPlayer
+            gameObject.inactivePlayer = gameObject.defendingPlayer
+        return gameObject
+
+    def run_script(self, script):
+        """
+        Plays a script on a fresh game, and returns the game object when it's done
+        """
+        gameObject = self.new_game(script.decks)
+        for commandName, function, arguments in script.commands:
+            function(gameObject, *arguments)
+        return gameObject
+
+    def time_script(self, script, report):
+        """
+        Plays a script on a fresh game, adding the time taken by every command to the report.
+        Game creation is included under "setup".
+        """
+        clock = time.perf_counter
+        commandTimes = report.commandTimes
+        commandCounts = report.commandCounts
+
+        start = clock()
+        gameObject = self.new_game(script.decks)
+        elapsed = clock() - start
+        commandTimes["setup"] = commandTimes.get("setup", 0.0) + elapsed
+        commandCounts["setup"] = commandCounts.get("setup", 0) + 1
+
+        for commandName, function, arguments in script.commands:
+            start = clock()
+            function(gameObject, *arguments)
+            elapsed = clock() - start
+            commandTimes[commandName] = commandTimes.get(commandName, 0.0) + elapsed
+            commandCounts[commandName] = commandCounts.get(commandName, 0) + 1
+        return gameObject
+
+    def benchmark(self, script, games = 1000):
+        """
+        Runs a script many times. The first pass is untimed per command, and is used for the
+        games/sec figure. The second pass times every command individually, so the timer
+        overhead does not skew the throughput.
+
+        Parameters:
+            script - The parsed script
+            games - How many games to play in each pass
+
+        Returns:
+            SimulationReport
+        """
+        report = SimulationReport(script.name)
+        start = time.perf_counter()
+        for i in range(games):
+            self.run_script(script)
+        report.elapsed = time.perf_counter() - start
+        report.games = games
+
+        for i in range(games):
+            self.time_script(script, report)
+        return report
+
+    pass
+
+def main():
+    parser = argparse.ArgumentParser(description = "Replays command scripts without stdin")
+    parser.add_argument("scripts", nargs = "+", help = "command scripts, i.e. testing/*")
+    parser.add_argument("-n", "--games", type = int, default = 1000, \
+                        help = "games to play per script")
+    arguments = parser.parse_args()
+
+    simulator = Simulator()
+    for fileName in arguments.scripts:
+        script = parse_script(fileName)
+        try:
+            report = simulator.benchmark(script, arguments.games)
+        except Exception as error:
+            print("%s: FAILED (%s: %s)" % (fileName, type(error).__name__, error))
+            continue
+        print(report.format())
+
+if __name__ == "__main__":
+    main()
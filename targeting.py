@@ -24,6 +24,9 @@ selection method. These can be (non-exhaustive):
     Random selection
     Strongest card
     Weakest card
+The selector also describes the ways a card can be played (its playable options). The options
+can be counted, iterated lazily, or fetched by index, so agents never have to build the whole
+list when a card has many targets to choose from.
 
 Creation Functions:
 These functions create the appropriate selector/ targeter. They are used because the effect/
@@ -31,6 +34,51 @@ trigger mapping tools need to create targeters/ selectors based on the informati
 JSON file. With the overlap between these two mapping tools, we moved the functions here.
 """
 import itertools
+import math
+import helper
+
+class TargetView():
+    """
+    TargetView
+    A live list of the cards in one or more zones. Every targeter which looks at the same place
+    (i.e. player 0's allied bench) shares a single view, instead of each card in hand keeping
+    its own copy. The view is what subscribes to the zones, so a change to the bench notifies
+    one view rather than every card in both hands.
+
+    Views are reference counted and handed out by the game object, see
+    Game.acquire_target_view and Game.release_target_view.
+
+    Member variables:
+        key - The (player, zone, allegiance) tuple which identifies the view
+        zones - The observable lists which the view is subscribed to
+        targetArray - The valid targets, as a helper.IndexedList so removals are O(1).
+            Targeters share this list, so it's only ever updated in place
+        refCount - How many targeters are currently reading the view
+    """
+    def __init__(self, key, zones):
+        self.key = key
+        self.zones = zones
+        self.targetArray = helper.IndexedList()
+        self.refCount = 0
+
+    def subscribe(self):
+        for zone in self.zones:
+            zone.add_target_observer(self)
+
+    def unsubscribe(self):
+        for zone in self.zones:
+            zone.remove_target_observer(self)
+
+    def receive_list(self, inputList):
+        self.targetArray.extend(inputList)
+
+    def remove_object(self, delObject):
+        self.targetArray.remove(delObject)
+
+    def add_object(self, newObject):
+        self.targetArray.append(newObject)
+
+    pass
 
 class BaseTargeter():
     """
@@ -45,11 +93,16 @@ class BaseTargeter():
 
     Member variables:
         locationTargeter - The bench, battlefield, hand, deck, etc.
-        targetArray - List of all valid targets
+        targetArray - List of all valid targets. While subscribed, this is the shared list of
+            the target view
+        targetView - The shared view the targeter reads from, None while unsubscribed
     """
+    allegiance = "allied"
+
     def __init__(self, locationTargeter = None):
         self.locationTargeter = locationTargeter
         self.targetArray = []
+        self.targetView = None
         self.parentEffect = None
         if self.locationTargeter == None:
             self.locationTargeter = LocationTargeter()
@@ -57,29 +110,80 @@ class BaseTargeter():
     def set_parent(self, parent):
         self.parentEffect = parent
 
+    def __getstate__(self):
+        """
+        The targets and the effect back-pointer are left out of pickles. The targets come back
+        when the game rebuilds its observers, and the effect sets itself as the parent again
+        """
+        state = self.__dict__.copy()
+        for name in ("targetArray", "targetView", "parentEffect"):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.targetArray = []
+        self.targetView = None
+        self.parentEffect = None
+
+    def create_instance(self):
+        """
+        Returns a targeter with the same allegiance and location, but its own empty list
+        of targets
+        """
+        instance = object.__new__(self.__class__)
+        instance.__dict__.update(self.__dict__)
+        instance.targetArray = []
+        instance.targetView = None
+        return instance
+
+    def get_players(self, cardOwner):
+        """
+        Returns the players whose cards we are targeting
+        """
+        return [cardOwner]
+
     def subscribe(self, gameObject, cardOwner):
-        self.locationTargeter.subscribe(gameObject, self, cardOwner)
+        """
+        Starts reading the shared view of our targets. Effects without a location (i.e. summon)
+        have no targets, so they don't need a view
+        """
+        zoneName = self.locationTargeter.zoneName
+        if (zoneName == None):
+            return
+        key = (cardOwner, zoneName, self.allegiance)
+        zones = []
+        for playerNumber in self.get_players(cardOwner):
+            zones.append(self.locationTargeter.get_zone(gameObject, playerNumber))
+        self.targetView = gameObject.acquire_target_view(key, zones)
+        self.targetArray = self.targetView.targetArray
+
+    def unsubscribe(self, gameObject):
+        if (self.targetView == None):
+            return
+        gameObject.release_target_view(self.targetView)
+        self.reset()
 
     def trigger_subscribe(self, gameObject):
         pass
 
-    def receive_list(self, inputList):
-        self.targetArray.extend(inputList)
-
-    def remove_object(self, delObject):
-        self.targetArray.remove(delObject)
-
-    def add_object(self, newObject):
-        self.targetArray.append(newObject)
+    def reset(self):
+        """
+        Forgets the targets without releasing the view. Only used once the game has thrown
+        all of its views away
+        """
+        self.targetView = None
+        self.targetArray = []
 
 
 class Enemy(BaseTargeter):
     """
     Specifies that we are looking at the enemy.
     """
-    def subscribe(self, gameObject, cardOwner):
-        enemy = helper.switch_zero_one(cardOwner)
-        super().subscribe(gameObject, self, enemy)
+    allegiance = "enemy"
+
+    def get_players(self, cardOwner):
+        return [helper.switch_zero_one(cardOwner)]
     pass
 
 class Allied(BaseTargeter):
@@ -96,10 +200,10 @@ class Any(BaseTargeter):
     """
     We can target either the enemy's cards or ours
     """
-    def subscribe(self, gameObject, cardOwner):
-        enemy = helper.switch_zero_one(cardOwner)
-        super().subscribe(gameObject, self, cardOwner)
-        super().subscribe(gameObject, self, enemy)
+    allegiance = "any"
+
+    def get_players(self, cardOwner):
+        return [cardOwner, helper.switch_zero_one(cardOwner)]
 
     pass
 
@@ -112,35 +216,39 @@ class LocationTargeter():
 
     If a target does not need targets, it gets the default behaviour which is to return an empty
     targetArray.
+
+    Class variables:
+        zoneName - The name of the zone, part of the key of the shared target views. None means
+            that there is nothing to target
     """
+    zoneName = None
+
     def __init__(self):
         pass
     
-    def subscribe(self, gameObject, baseTargeter, playerNumber):
-        pass
+    def get_zone(self, gameObject, playerNumber):
+        return None
 
 class Bench(LocationTargeter):
     """
     Targeting the bench/ field. The cards that have been played are on the bench. Those in
     combat are the battlefield. Those in the battlefield are also in the bench.
     """
-    def subscribe(self, gameObject, baseTargeter, playerNumber):
+    zoneName = "bench"
+
+    def get_zone(self, gameObject, playerNumber):
         """ 
-        Subscribes to the correct bench based on the allegiance
+        Returns the bench of the given player
         """
-        gameObject.players[playerNumber].bench.add_target_observer(baseTargeter)
-        pass
+        return gameObject.players[playerNumber].bench
 
     pass
 
 class Self(LocationTargeter):
     """
-    I don't know if this should be here, or if the selector should deal with this
+    I don't know if this should be here, or if the selector should deal with this. The card
+    itself isn't in a zone we can watch, so for now there is nothing to target
     """
-    def subscribe(self, gameObject, baseTargeter, playerNumber):
-        """
-        """
-        targetArray.append(self.parent.parent)
     pass
 
 class Selector():
@@ -161,6 +269,15 @@ class Selector():
         ret = []
         return ret
 
+    def count_playable_options(self, targetArray):
+        return 0
+
+    def iter_playable_options(self, targetArray):
+        return iter(())
+
+    def get_playable_option(self, targetArray, optionIndex):
+        raise IndexError("option index out of range")
+
     def select_target(self, target):
         pass
     pass
@@ -186,9 +303,57 @@ class Player(Selector):
             An array detailing the different ways the card can be played. It tells us the
             parameters we can use to play the card
         """
-        targetIndices = list(range(len(targetArray)))
-        ret = list(itertools.combinations(targetIndices, self.choices))
+        ret = list(self.iter_playable_options(targetArray))
         return ret
+
+    def count_playable_options(self, targetArray):
+        """
+        Returns how many options list_playable_options would return, without building them
+        """
+        return math.comb(len(targetArray), self.choices)
+
+    def iter_playable_options(self, targetArray):
+        """
+        Iterates over the same options as list_playable_options, in the same order, one at a
+        time
+        """
+        return itertools.combinations(range(len(targetArray)), self.choices)
+
+    def get_playable_option(self, targetArray, optionIndex):
+        """
+        Returns list_playable_options(targetArray)[optionIndex] without building the list.
+        The options are the combinations of target indices in lexicographic order, so the
+        combination can be worked out one position at a time: each candidate for the next
+        position accounts for a block of comb(remaining, still to choose) options, and we skip
+        whole blocks until the index falls inside one
+
+        Parameters:
+            targetArray - The list of all valid targets
+            optionIndex - The index of the option, negative indices count from the end
+
+        Returns:
+            A tuple of target indices
+        """
+        targetCount = len(targetArray)
+        optionCount = math.comb(targetCount, self.choices)
+        if (optionIndex < 0):
+            optionIndex += optionCount
+        if (optionIndex < 0 or optionIndex >= optionCount):
+            raise IndexError("option index out of range")
+
+        ret = []
+        candidate = 0
+        for position in range(self.choices):
+            toChoose = self.choices - position - 1
+            while True:
+                blockSize = math.comb(targetCount - candidate - 1, toChoose)
+                if (optionIndex < blockSize):
+                    break
+                optionIndex -= blockSize
+                candidate += 1
+            ret.append(candidate)
+            candidate += 1
+        return tuple(ret)
     
     def select_target(self, targetArray, target):
         """
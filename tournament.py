@@ -0,0 +1,530 @@
+"""
+Round-robin deck tournaments. Every pair of decks plays the same number of games, and the
+player who holds the attack token when the game starts (Game.attackingPlayer) alternates from
+one game to the next, so neither deck gets the first attack more often. The first deck of a
+pair is always player 0.
+
+Games are played in blocks on a process pool. Each worker parses the card and effect databases
+once, when it starts, and plays every block it's given with the same Simulator. Every block has
+a seed of its own, made from the tournament seed, the pair and the first game of the block, so
+a tournament plays the same games whatever the number of workers.
+
+Win rates count a tie as half a win, and leave out games which ran past the move limit.
+A binomial interval of the win rate would treat every game as a coin flip, but a tie is half a
+win every time, so a pair with many ties is known much sooner than the binomial variance says.
+The confidence intervals are normal intervals with the variance of the score of one game,
+estimated from the wins, losses and ties (MatchupResult.score_variance).
+
+Early stopping
+With a stop rule, the game count of a pair is only a cap. Blocks are handed out one at a time,
+to the undecided pair with the fewest games, and after every block the rule is asked whether
+the pair is decided. A decided pair gets no more blocks, so the workers move on to the pairs
+which are still close. The blocks already running when a pair is decided still count.
+    ConfidenceStop - the confidence interval no longer contains 50% (one deck is favoured),
+        or it fits within the margin around 50% (the decks are even)
+    SPRTStop - two sequential probability ratio tests, of 50% against 50% + margin and of
+        50% against 50% - margin. One deck is favoured when its test accepts the higher win
+        rate, and the decks are even when both tests accept 50%
+Both rules use the score variance, so the more ties a pair has, the sooner it is decided.
+Which blocks a pair gets depends on when the other pairs' blocks finish, so with a stop rule
+and more than one worker, the results can differ from run to run.
+
+MatchupResult
+The results of one pair of decks
+
+ConfidenceStop, SPRTStop
+Stop rules
+
+Tournament
+Plays every pair, and builds the win-rate matrix
+
+Usage:
+    python tournament.py -n 200 -w 4               every deck in decks/ against every other
+    python tournament.py -n 50 --agent mcts --iterations 100 --decks decks/buff.deck ...
+    python tournament.py -n 100000 --stop sprt      stops every pair once it's decided
+"""
+import argparse
+import csv
+import glob
+import math
+import multiprocessing
+import os
+import queue
+import random
+import time
+import agent
+import mcts
+import simulator
+
+# z of a 95% confidence interval
+Z_95 = 1.96
+
+# z of the interval ConfidenceStop checks after every block. It's wider than Z_95, since the
+# interval is looked at many times
+Z_99 = 2.576
+
+RANDOM = "random"
+MCTS = "mcts"
+
+# Decisions of the stop rules, from the point of view of the first deck of the pair
+FIRST = "first"
+SECOND = "second"
+EVEN = "even"
+
+class MatchupResult:
+    """
+    MatchupResult
+    Game counts from the point of view of the first deck of the pair. Workers return one for
+    every block, and the tournament adds them up.
+
+    Member variables:
+        pair - The index of the pair in Tournament.pairs
+        games - The number of games played
+        wins, losses, ties - The results of the games which finished
+        unfinished - The games which ran past the move limit
+        elapsed - Seconds spent playing the games
+    """
+    def __init__(self, pair):
+        self.pair = pair
+        self.games = 0
+        self.wins = 0
+        self.losses = 0
+        self.ties = 0
+        self.unfinished = 0
+        self.elapsed = 0.0
+
+    def record(self, winner):
+        self.games += 1
+        if (winner == 0):
+            self.wins += 1
+        elif (winner == 1):
+            self.losses += 1
+        elif (winner == agent.TIE):
+            self.ties += 1
+        else:
+            self.unfinished += 1
+
+    def merge(self, other):
+        self.games += other.games
+        self.wins += other.wins
+        self.losses += other.losses
+        self.ties += other.ties
+        self.unfinished += other.unfinished
+        self.elapsed += other.elapsed
+
+    def finished(self):
+        return self.games - self.unfinished
+
+    def score(self):
+        return self.wins + 0.5 * self.ties
+
+    def win_rate(self):
+        """
+        The first deck's win rate, None before any game finished
+        """
+        if (self.finished() == 0):
+            return None
+        return self.score() / self.finished()
+
+    def score_variance(self):
+        """
+        The variance of the score of one game (1, 0.5 or 0), with one more win and one more
+        loss than were played, so it isn't 0 before the first game which isn't a tie
+        """
+        games = self.finished() + 2
+        mean = (self.score() + 1) / games
+        return (self.wins + 1 + 0.25 * self.ties) / games - mean * mean
+
+    def confidence_interval(self, z = Z_95):
+        """
+        The normal confidence interval of the win rate, with the variance of score_variance
+
+        Returns:
+            (low, high), or (0.0, 1.0) for no finished games
+        """
+        if (self.finished() == 0):
+            return 0.0, 1.0
+        spread = z * math.sqrt(self.score_variance() / self.finished())
+        winRate = self.win_rate()
+        return max(0.0, winRate - spread), min(1.0, winRate + spread)
+
+    pass
+
+class ConfidenceStop:
+    """
+    ConfidenceStop
+    Decides a pair once its confidence interval no longer contains 50%, or fits within
+    50% +- margin.
+
+    Member variables:
+        margin - The distance from 50% which counts as even
+        z - The z of the interval
+        minGames - The finished games needed before a pair can be decided
+    """
+    def __init__(self, margin = 0.05, z = Z_99, minGames = 100):
+        self.margin = margin
+        self.z = z
+        self.minGames = minGames
+
+    def decide(self, result):
+        """
+        Returns:
+            FIRST, SECOND, EVEN, or None if the pair isn't decided yet
+        """
+        if (result.finished() < self.minGames):
+            return None
+        low, high = result.confidence_interval(self.z)
+        if (low > 0.5):
+            return FIRST
+        if (high < 0.5):
+            return SECOND
+        if (low >= 0.5 - self.margin and high <= 0.5 + self.margin):
+            return EVEN
+        return None
+
+    pass
+
+class SPRTStop:
+    """
+    SPRTStop
+    Two sequential probability ratio tests of the first deck's win rate: 50% against
+    50% + margin, which decides FIRST, and 50% against 50% - margin, which decides SECOND.
+    When both tests accept 50%, the pair is EVEN. A pair whose true win rate is about half
+    the margin from 50% takes the longest to decide, and can end either way.
+
+    The scores of the games aren't coin flips, since a tie scores 0.5, so the tests are
+    generalized SPRTs: the log likelihood ratios are those of normally distributed scores,
+    with the variance of MatchupResult.score_variance. Without ties this is close to Wald's
+    test of a binomial win rate, and ties shrink the variance so the tests end sooner.
+
+    Member variables:
+        margin - The distance from 50% of the win rates tested
+        alpha - The chance of one test deciding a deck is favoured when the win rate is 50%
+        beta - The chance of deciding EVEN when the win rate is 50% +- margin
+        minGames - The finished games needed before a pair can be decided
+        lower, upper - The log likelihood ratio bounds which accept 50% and 50% +- margin
+    """
+    def __init__(self, margin = 0.05, alpha = 0.05, beta = 0.05, minGames = 0):
+        if (margin <= 0 or margin >= 0.5):
+            raise ValueError("margin must be between 0 and 0.5")
+        self.margin = margin
+        self.alpha = alpha
+        self.beta = beta
+        self.minGames = minGames
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+
+    def log_likelihood_ratio(self, result, winRate0, winRate1):
+        """
+        The log likelihood ratio of a win rate of winRate1 against winRate0, for normally
+        distributed scores with the pair's score variance
+        """
+        games = result.finished()
+        if (games == 0):
+            return 0.0
+        return games * (winRate1 - winRate0) * (2 * result.win_rate() - winRate0 - \
+                                                winRate1) / (2 * result.score_variance())
+
+    def decide(self, result):
+        """
+        Returns:
+            FIRST, SECOND, EVEN, or None if the pair isn't decided yet
+        """
+        if (result.finished() < self.minGames):
+            return None
+        first = self.log_likelihood_ratio(result, 0.5, 0.5 + self.margin)
+        second = self.log_likelihood_ratio(result, 0.5, 0.5 - self.margin)
+        if (first >= self.upper):
+            return FIRST
+        if (second >= self.upper):
+            return SECOND
+        if (first <= self.lower and second <= self.lower):
+            return EVEN
+        return None
+
+    pass
+
+# The simulator of a worker process, created once by init_worker
+workerSimulator = None
+
+def init_worker(cardDatabase, effectDatabase):
+    """
+    Loads the databases, once per worker process
+    """
+    global workerSimulator
+    workerSimulator = simulator.Simulator(cardDatabase, effectDatabase)
+
+def play_block(task):
+    """
+    Plays a block of games of one pair, in a worker
+
+    Parameters:
+        task - (pair, decks, first game, game count, seed, agent name, MCTS iterations)
+
+    Returns:
+        A MatchupResult of the block
+    """
+    pair, decks, firstGame, count, seed, agentName, iterations = task
+    generator = random.Random(seed)
+    players = [None, None]
+    if (agentName == MCTS):
+        players = [mcts.MCTSAgent(iterations, None, seed = generator.getrandbits(32)) \
+                   for i in range(2)]
+    result = MatchupResult(pair)
+    start = time.perf_counter()
+    for gameNumber in range(firstGame, firstGame + count):
+        result.record(mcts.play_game(workerSimulator, players, decks, generator, \
+                                     firstAttacker = gameNumber % 2))
+    result.elapsed = time.perf_counter() - start
+    return result
+
+class Tournament:
+    """
+    Tournament
+    A round robin between decks.
+
+    Member variables:
+        decks - The deck files
+        games - The number of games every pair plays
+        workers - The size of the process pool, 0 plays every game in this process
+        blockSize - The number of games sent to a worker at a time
+        seed - The tournament seed
+        agentName - RANDOM or MCTS, the agent both players use
+        iterations - The MCTS iterations per decision
+        cardDatabase, effectDatabase - The database files the workers load
+        stopRule - ConfidenceStop, SPRTStop, or None to play every game
+        pairs - (deck index, deck index) of every pair, the first deck is player 0
+        results - The MatchupResult of every pair
+        scheduled - The number of games of every pair which have been handed out
+        decisions - The decision of every pair, None while it's undecided
+        decidedAt - The games every pair had finished when it was decided
+        elapsed - The wall clock seconds of run()
+    """
+    def __init__(self, decks, games, workers = 0, blockSize = 20, seed = 0, \
+                 agentName = RANDOM, iterations = 100, \
+                 cardDatabase = simulator.CARD_DATABASE, \
+                 effectDatabase = simulator.EFFECT_DATABASE, stopRule = None):
+        if (agentName not in (RANDOM, MCTS)):
+            raise ValueError("agentName must be '%s' or '%s'" % (RANDOM, MCTS))
+        self.decks = list(decks)
+        self.games = games
+        self.workers = workers
+        self.blockSize = blockSize
+        self.seed = seed
+        self.agentName = agentName
+        self.iterations = iterations
+        self.cardDatabase = cardDatabase
+        self.effectDatabase = effectDatabase
+        self.stopRule = stopRule
+        self.pairs = [(i, j) for i in range(len(self.decks)) \
+                      for j in range(i + 1, len(self.decks))]
+        self.results = [MatchupResult(pair) for pair in range(len(self.pairs))]
+        self.scheduled = [0] * len(self.pairs)
+        self.decisions = [None] * len(self.pairs)
+        self.decidedAt = [None] * len(self.pairs)
+        self.elapsed = 0.0
+
+    def make_task(self, pair, firstGame, count):
+        i, j = self.pairs[pair]
+        seed = "%d:%d:%d" % (self.seed, pair, firstGame)
+        return (pair, [self.decks[i], self.decks[j]], firstGame, count, seed, \
+                self.agentName, self.iterations)
+
+    def next_task(self):
+        """
+        Hands out the next block of the undecided pair with the fewest games handed out, so
+        every pair moves forward together
+
+        Returns:
+            The task, or None when every pair is decided or has all of its games
+        """
+        pair = None
+        for candidate in range(len(self.pairs)):
+            if (self.decisions[candidate] != None or self.scheduled[candidate] >= self.games):
+                continue
+            if (pair == None or self.scheduled[candidate] < self.scheduled[pair]):
+                pair = candidate
+        if (pair == None):
+            return None
+        firstGame = self.scheduled[pair]
+        count = min(self.blockSize, self.games - firstGame)
+        self.scheduled[pair] += count
+        return self.make_task(pair, firstGame, count)
+
+    def run(self):
+        """
+        Plays every game, or with a stop rule, every game until each pair is decided, and
+        returns the results
+        """
+        start = time.perf_counter()
+        if (self.workers == 0):
+            init_worker(self.cardDatabase, self.effectDatabase)
+            task = self.next_task()
+            while (task != None):
+                self.add_result(play_block(task))
+                task = self.next_task()
+        else:
+            pool = multiprocessing.Pool(self.workers, init_worker, \
+                                        (self.cardDatabase, self.effectDatabase))
+            # Results (or errors) of the blocks, put there by the pool's result thread
+            finished = queue.Queue()
+            running = 0
+            try:
+                while (True):
+                    # One block queued behind the one every worker is playing, so no worker
+                    # waits for the next block to be chosen
+                    while (running < self.workers * 2):
+                        task = self.next_task()
+                        if (task == None):
+                            break
+                        pool.apply_async(play_block, (task,), callback = finished.put, \
+                                         error_callback = finished.put)
+                        running += 1
+                    if (running == 0):
+                        break
+                    result = finished.get()
+                    running -= 1
+                    if (isinstance(result, BaseException)):
+                        raise result
+                    self.add_result(result)
+            finally:
+                pool.terminate()
+                pool.join()
+        self.elapsed += time.perf_counter() - start
+        return self.results
+
+    def add_result(self, result):
+        pair = result.pair
+        self.results[pair].merge(result)
+        if (self.stopRule != None and self.decisions[pair] == None):
+            self.decisions[pair] = self.stopRule.decide(self.results[pair])
+            if (self.decisions[pair] != None):
+                self.decidedAt[pair] = self.results[pair].finished()
+
+    def games_saved(self):
+        """
+        The games of the full schedule which early stopping didn't play
+        """
+        return self.games * len(self.pairs) - self.total_games()
+
+    def total_games(self):
+        return sum(result.games for result in self.results)
+
+    def win_rate_matrix(self, z = Z_95):
+        """
+        Returns:
+            (rates, lows, highs), lists of rows where [i][j] is the win rate of deck i against
+            deck j and its confidence interval. The diagonal, and pairs without finished
+            games, are None
+        """
+        size = len(self.decks)
+        rates = [[None] * size for i in range(size)]
+        lows = [[None] * size for i in range(size)]
+        highs = [[None] * size for i in range(size)]
+        for pair in range(len(self.pairs)):
+            i, j = self.pairs[pair]
+            result = self.results[pair]
+            if (result.finished() == 0):
+                continue
+            low, high = result.confidence_interval(z)
+            rates[i][j], lows[i][j], highs[i][j] = result.win_rate(), low, high
+            rates[j][i], lows[j][i], highs[j][i] = 1 - result.win_rate(), 1 - high, 1 - low
+        return rates, lows, highs
+
+    def format(self):
+        names = [os.path.splitext(os.path.basename(deck))[0] for deck in self.decks]
+        width = max(20, max(len(name) for name in names) + 2)
+        rates, lows, highs = self.win_rate_matrix()
+        lines = ["%d games in %.1f s (%.1f games/sec), win rate of the row deck, 95%% interval" % \
+                 (self.total_games(), self.elapsed, self.total_games() / max(self.elapsed, 1e-9))]
+        lines.append(" " * width + "".join("%20s" % name for name in names))
+        for i in range(len(names)):
+            cells = []
+            for j in range(len(names)):
+                if (rates[i][j] == None):
+                    cells.append("%20s" % "-")
+                else:
+                    cells.append("%20s" % ("%.3f [%.3f,%.3f]" % \
+                                           (rates[i][j], lows[i][j], highs[i][j])))
+            lines.append(("%-" + str(width) + "s") % names[i] + "".join(cells))
+
+        if (self.stopRule != None):
+            fullSchedule = self.games * len(self.pairs)
+            lines.append("%d of %d games played, %d saved (%.1f%%) by early stopping" % \
+                         (self.total_games(), fullSchedule, self.games_saved(), \
+                          100.0 * self.games_saved() / max(fullSchedule, 1)))
+            for pair in range(len(self.pairs)):
+                i, j = self.pairs[pair]
+                if (self.decisions[pair] == None):
+                    verdict = "undecided after %d games" % self.results[pair].games
+                else:
+                    verdict = "%s after %d games" % ({FIRST: names[i] + " favoured", \
+                        SECOND: names[j] + " favoured", EVEN: "even"}[self.decisions[pair]], \
+                        self.decidedAt[pair])
+                lines.append("\t%s vs %s: %s" % (names[i], names[j], verdict))
+        return "\n".join(lines)
+
+    def save_csv(self, fileName):
+        """
+        Writes one row per pair
+        """
+        with open(fileName, "w", newline = "") as outFile:
+            writer = csv.writer(outFile)
+            writer.writerow(("deck", "opponent", "games", "wins", "losses", "ties", \
+                             "unfinished", "winRate", "low", "high", "decision", "decidedAt"))
+            for pair in range(len(self.pairs)):
+                i, j = self.pairs[pair]
+                result = self.results[pair]
+                low, high = result.confidence_interval()
+                winRate = result.win_rate()
+                writer.writerow((self.decks[i], self.decks[j], result.games, result.wins, \
+                                 result.losses, result.ties, result.unfinished, \
+                                 "" if winRate == None else "%.4f" % winRate, \
+                                 "%.4f" % low, "%.4f" % high, self.decisions[pair] or "", \
+                                 self.decidedAt[pair] or ""))
+
+    pass
+
+def main():
+    parser = argparse.ArgumentParser(description = "Round robin between decks")
+    parser.add_argument("--decks", nargs = "+", default = None, \
+                        help = "deck files, every deck in %s/ by default" % \
+                        simulator.DECK_DIRECTORY)
+    parser.add_argument("-n", "--games", type = int, default = 100, \
+                        help = "games per pair, the most per pair with --stop")
+    parser.add_argument("-w", "--workers", type = int, default = os.cpu_count(), \
+                        help = "worker processes, 0 plays in this process")
+    parser.add_argument("--block", type = int, default = 20, help = "games per task")
+    parser.add_argument("--agent", choices = (RANDOM, MCTS), default = RANDOM)
+    parser.add_argument("--iterations", type = int, default = 100, \
+                        help = "MCTS iterations per decision")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--csv", help = "write the results to a CSV file")
+    parser.add_argument("--stop", choices = ("none", "ci", "sprt"), default = "none", \
+                        help = "stop each pair once a confidence interval or SPRT decides it")
+    parser.add_argument("--margin", type = float, default = 0.05, \
+                        help = "win rates within this of 50%% count as even")
+    parser.add_argument("--alpha", type = float, default = 0.05, help = "SPRT error rates")
+    parser.add_argument("--min-games", type = int, default = 100, \
+                        help = "games before a pair can be stopped")
+    arguments = parser.parse_args()
+
+    decks = arguments.decks
+    if (decks == None):
+        decks = sorted(glob.glob(os.path.join(simulator.DECK_DIRECTORY, "*.deck")))
+    stopRule = None
+    if (arguments.stop == "ci"):
+        stopRule = ConfidenceStop(arguments.margin, minGames = arguments.min_games)
+    elif (arguments.stop == "sprt"):
+        stopRule = SPRTStop(arguments.margin, arguments.alpha, arguments.alpha, \
+                            arguments.min_games)
+    tournament = Tournament(decks, arguments.games, arguments.workers, arguments.block, \
+                            arguments.seed, arguments.agent, arguments.iterations, \
+                            stopRule = stopRule)
+    tournament.run()
+    print(tournament.format())
+    if (arguments.csv != None):
+        tournament.save_csv(arguments.csv)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Incremental 64-bit fingerprints of game states, with Zobrist hashing: the hash of a state is
+the XOR of one random 64-bit key per card and per number that isn't per-card, so when a card
+moves or its stats change, only that card's key is taken out and put back in.
+
+Every combination of a card, its zone, lane, attack and defense has its own key, and so does
+every value of each other number. A key is the 64-bit BLAKE2b digest of the repr of the
+combination, made when the combination is first seen and kept in KEYS. So the keys are as
+good as independent random numbers, like the table of a classic Zobrist hash, without a table
+of every combination up front, and they don't depend on PYTHONHASHSEED. Drawing them from a
+random.Random seeded with the combination would do the same, at six times the cost.
+
+A key only depends on its combination, so KEYS is shared by every hasher, and a new game
+doesn't make its keys again. The same goes for SCALAR_HASHES, the hashes of the numbers which
+aren't per-card. Each is emptied when it's full, so they stay bounded over a long run of games,
+and the values made after that are the same ones again.
+
+What is hashed:
+    every card in a hand, on a bench or in a graveyard - which zone it's in, its frontline
+        lane (if any), its attack and its defense
+    the deck sizes - decks are only ever drawn from the end, so the size of a deck says which
+        cards are still in it
+    each player's mana, max mana and health, and the turn flags of the game
+The order of the cards within a zone is not hashed. Cards are numbered in the order the hasher
+first sees them (the decks, then the other zones), so two games set up the same way and hashed
+from the same point give the same hashes, even in different processes, since the keys only
+depend on the combinations.
+
+The per-card values only need updating when a card changes, and the game tells the hasher
+about every change through the zones' watchers and the places which record undo entries. The
+handful of numbers which aren't per-card are rehashed when the hash is asked for. Nothing is
+hooked in while hashing is disabled, apart from one None check in each of those places.
+
+StateHasher
+Keeps the hash of one game up to date
+"""
+import hashlib
+import card
+
+# The keys made so far, by combination. Emptied when it has MAX_KEYS of them
+KEYS = dict()
+MAX_KEYS = 1 << 15
+# The values of scalar_hash, by the numbers it hashes. Emptied when it has MAX_SCALAR_HASHES
+SCALAR_HASHES = dict()
+MAX_SCALAR_HASHES = 1 << 12
+
+# Zone codes
+NO_ZONE = 0
+HAND = 1
+BENCH = 2
+GRAVEYARD = 3
+
+def random_key(combination):
+    """
+    The random 64-bit key of a tuple of numbers
+    """
+    key = KEYS.get(combination)
+    if (key == None):
+        key = int.from_bytes(hashlib.blake2b(repr(combination).encode(), \
+                                             digest_size = 8).digest(), "little")
+        if (len(KEYS) >= MAX_KEYS):
+            KEYS.clear()
+        KEYS[combination] = key
+    return key
+
+class StateHasher:
+    """
+    StateHasher
+
+    Member variables:
+        gameObject - The game being hashed
+        cardKeys - A dict of card -> the number the card is hashed under
+        cardHashes - A dict of card -> the value the card currently adds to cardsHash
+        cardsHash - The XOR of every value in cardHashes
+        dirty - The cards which changed since cardsHash was last brought up to date
+    """
+    def __init__(self, gameObject):
+        self.gameObject = gameObject
+        self.cardKeys = dict()
+        self.cardHashes = dict()
+        self.cardsHash = 0
+        self.dirty = set()
+        for player in gameObject.players:
+            for zone in (player.deck, player.hand.list, player.bench.list, \
+                         player.graveyard.list):
+                for zoneCard in zone:
+                    self.card_key(zoneCard)
+        self.reset()
+
+    def card_key(self, hashedCard):
+        key = self.cardKeys.get(hashedCard)
+        if (key == None):
+            key = len(self.cardKeys) + 1
+            self.cardKeys[hashedCard] = key
+        return key
+
+    def moved(self, changedCard):
+        """
+        Called by the zones whenever a card is added or removed
+        """
+        self.dirty.add(changedCard)
+
+    def touch(self, target):
+        """
+        Called before attributes of target change. Only cards are hashed incrementally, the
+        players and the game are rehashed on every state_hash()
+        """
+        if (isinstance(target, card.Card)):
+            self.dirty.add(target)
+
+    def touch_undo(self, function, arguments):
+        """
+        Called for every undo entry, before it's applied. Zone changes reach the hasher through
+        the watchers, so only attribute and card state changes need looking at here
+        """
+        if (len(arguments) != 0):
+            self.touch(arguments[0])
+        self.touch(getattr(function, "__self__", None))
+
+    def reset(self):
+        """
+        Recomputes every card's value, i.e. after a snapshot is restored
+        """
+        self.dirty.clear()
+        self.cardHashes = dict()
+        self.cardsHash = 0
+        for hashedCard in self.cardKeys:
+            value = self.card_hash(hashedCard)
+            self.cardHashes[hashedCard] = value
+            self.cardsHash ^= value
+
+    def card_hash(self, hashedCard):
+        """
+        The value a card adds to the hash. Cards in the deck, or which have left the game,
+        add nothing
+        """
+        player = self.gameObject.players[hashedCard.owner]
+        if (hashedCard in player.bench.list):
+            zone = BENCH
+        elif (hashedCard in player.hand.list):
+            zone = HAND
+        elif (hashedCard in player.graveyard.list):
+            zone = GRAVEYARD
+        else:
+            return 0
+        lane = player.frontline.lanes.get(hashedCard, -1)
+        attack = getattr(hashedCard, "attack", 0)
+        defense = getattr(hashedCard, "defense", 0)
+        return random_key((self.card_key(hashedCard), zone, lane, attack, defense))
+
+    def scalar_hash(self):
+        """
+        The value the players and the turn flags add to the hash
+        """
+        g = self.gameObject
+        numbers = (g.numAttackers, g.passedTurn, g.attackToken, g.attackPhase, \
+                   g.activePlayer, g.attackingPlayer)
+        for player in g.players:
+            numbers += (player.mana, player.maxMana, player.health, len(player.deck))
+        value = SCALAR_HASHES.get(numbers)
+        if (value == None):
+            # Each number is keyed by its own negative index. They're turned into ints, as
+            # True and 1 are the same dict key but have different digests
+            value = 0
+            for index in range(len(numbers)):
+                value ^= random_key((-1 - index, int(numbers[index])))
+            if (len(SCALAR_HASHES) >= MAX_SCALAR_HASHES):
+                SCALAR_HASHES.clear()
+            SCALAR_HASHES[numbers] = value
+        return value
+
+    def state_hash(self):
+        """
+        Brings the hash up to date with the cards which changed, and returns it
+        """
+        for changedCard in self.dirty:
+            value = self.card_hash(changedCard)
+            self.cardsHash ^= self.cardHashes.get(changedCard, 0) ^ value
+            self.cardHashes[changedCard] = value
+        self.dirty.clear()
+        return self.cardsHash ^ self.scalar_hash()
+
+    def compute_hash(self):
+        """
+        Hashes the game from scratch, without using or changing the incremental state. It
+        should always equal state_hash()
+        """
+        cardsHash = 0
+        for player in self.gameObject.players:
+            for zone in (player.hand.list, player.bench.list, player.graveyard.list):
+                for zoneCard in zone:
+                    cardsHash ^= self.card_hash(zoneCard)
+        return cardsHash ^ self.scalar_hash()
+
+    pass